@@ -2,16 +2,119 @@
 """CLI for DSP."""
 
 import argparse
+import cProfile
+import os
 from os import path
-from sys import exit
+import sys
 
-import numpy as np
+# NOTE: Modules that depend on pandas, NumPy or engarde are imported where they are used, so that
+# the CLI starts quickly (e.g., for --help) and each command only pays for what it needs.
+from proforma import benchmark
+from proforma.checkpoint import Checkpoint, file_digest
+from proforma.profiling import StageRecorder
 
-import proforma.prototypes as ptypes
-from proforma.conversions import ConversionRates
-from proforma.parcels import Parcel
-from proforma.run import ModelRun
-from proforma.validators import conversions as cv, parcels as pav, prototypes as pov, screen as sv
+
+COMMANDS = ('run', 'bench', 'merge', 'serve', 'compile', 'query', 'diff')
+ENGINES = ('objects', 'vector')
+
+INPUT_FILES = (
+    'parcels.csv',
+    'entitlement_screen.xlsx',
+    'conversion_rates.xlsx',
+    'prototypes/flex.xlsx',
+    'prototypes/office.xlsx',
+    'prototypes/residential_ownership.xlsx',
+    'prototypes/residential_rental.xlsx',
+    'prototypes/retail.xlsx',
+    'prototypes/wd.xlsx',
+)
+
+
+def _shard(value):
+    """Argparse type for shard specifications."""
+    from proforma import shards
+
+    try:
+        return shards.parse_shard(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def _add_model_arguments(parser):
+    """Add arguments shared by all commands that run the model."""
+    parser.add_argument(
+        '-d', '--data-dir',
+        default='./data',
+        help='Data directory, defaults to ./data'
+    )
+    parser.add_argument(
+        '-l', '--iteration-length',
+        default=5, type=int, help='Iteration length, defaults to 1'
+    )
+    parser.add_argument(
+        '-n', '--n-iterations',
+        default=5, type=int, help='Number of iterations, defaults to 1'
+    )
+    parser.add_argument(
+        '-b', '--bundle',
+        help='Load prototypes, screen and conversion rates from a compiled bundle (see compile)'
+    )
+    parser.add_argument(
+        '--engine',
+        choices=ENGINES,
+        default='objects',
+        help='Evaluate Parcel and Prototype objects (default) or arrays of (parcel, prototype) '
+             'pairs (vector; no checkpoints, counts or progress)',
+    )
+    parser.add_argument(
+        '--tile-size',
+        type=int,
+        metavar='PAIRS',
+        help='(Parcel, prototype) pairs per tile of the vector engine, which bounds its memory '
+             '(about 160 bytes per pair), defaults to 65536',
+    )
+    parser.add_argument(
+        '-w', '--workers',
+        type=int,
+        help='Worker processes (objects engine) or threads (vector engine), defaults to the '
+             'number of CPUs',
+    )
+    parser.add_argument(
+        '--precision',
+        choices=('float64', 'float32'),
+        default='float64',
+        help='Float type of the yields and rates kept in memory until output, defaults to float64 '
+             '(float32 halves their size; vector engine only)',
+    )
+    _add_load_workers_argument(parser)
+
+
+def _add_load_workers_argument(parser):
+    """Add the argument controlling concurrent input loading."""
+    parser.add_argument(
+        '--load-workers',
+        type=int,
+        help='Number of processes reading the input files, defaults to the number of CPUs'
+    )
+
+
+def _references(value):
+    """Argparse type for comma-separated parcel references."""
+    references = [x.strip() for x in value.split(',') if x.strip()]
+    if not references:
+        raise argparse.ArgumentTypeError('Expected comma-separated references: {0}'.format(value))
+    return references
+
+
+def _worker_counts(value):
+    """Argparse type for a comma-separated list of positive worker counts."""
+    try:
+        counts = [int(x) for x in value.split(',')]
+    except ValueError:
+        raise argparse.ArgumentTypeError('Expected comma-separated integers: {0}'.format(value))
+    if not counts or min(counts) < 1:
+        raise argparse.ArgumentTypeError('Worker counts must be positive: {0}'.format(value))
+    return counts
 
 
 def parser_factory():
@@ -28,113 +131,549 @@ def parser_factory():
             '\t* prototypes/residential_ownership.xlsx\n'
             '\t* prototypes/residential_rental.xlsx\n'
             '\t* prototypes/retail.xlsx\n'
-            '\t* prototypes/wd.xlsx\n'
+            '\t* prototypes/wd.xlsx\n\n'
+            'The command defaults to "run" when omitted.'
         ),
         formatter_class=argparse.RawDescriptionHelpFormatter,
     )
-    parser.add_argument(
-        '-d', '--data-dir',
-        default='./data',
-        help='Data directory, defaults to ./data'
+    subparsers = parser.add_subparsers(dest='command')
+
+    run_parser = subparsers.add_parser('run', help='Run the model (default)')
+    _add_model_arguments(run_parser)
+    run_parser.add_argument(
+        '-o', '--output-file',
+        default='./output.csv',
+        help='Output file location, defaults to ./output.csv',
     )
-    parser.add_argument(
+    run_parser.add_argument(
+        '--shard',
+        metavar='i/N',
+        type=_shard,
+        help=(
+            'Only run shard i of N (parcels are partitioned by a hash of reference) and save a '
+            'partial result set to --partial-dir instead of the output file'
+        ),
+    )
+    run_parser.add_argument(
+        '--partial-dir',
+        default='./partials',
+        help='Directory for partial result sets of sharded runs, defaults to ./partials',
+    )
+    run_parser.add_argument(
+        '--rollup',
+        metavar='FILE',
+        help='Also save a CSV cube of parcel counts and yields summed by tract, jurisdiction, '
+             'prototype class and iteration, with subtotals',
+    )
+    run_parser.add_argument(
+        '--store',
+        metavar='FILE',
+        help='Also save the output to an SQLite result store indexed by reference, tract and '
+             'jurisdiction (see query)',
+    )
+    run_parser.add_argument(
+        '--report',
+        metavar='FILE',
+        help='Save a JSON report of per-stage wall time, CPU time, peak RSS and item counts',
+    )
+    run_parser.add_argument(
+        '--checkpoint-dir',
+        metavar='DIR',
+        help='Save completed parcel chunks to DIR so that an interrupted run can be resumed',
+    )
+    run_parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Resume from the chunks in --checkpoint-dir (the inputs and parameters must match)',
+    )
+    run_parser.add_argument(
+        '--count',
+        action='store_true',
+        help='Count property evaluations, conversion rate lookups and deepcopies (adds overhead)',
+    )
+    run_parser.add_argument(
+        '--verify-pruning',
+        action='store_true',
+        help='Also run every parcel without dominance pruning and fail if the HBUs differ (slow)',
+    )
+    run_parser.add_argument(
+        '--explain',
+        type=_references,
+        metavar='REFERENCES',
+        help='Save the pro forma of every allowed prototype, iteration by iteration, for these '
+             'comma-separated parcel references to --explain-file (other parcels run as usual)',
+    )
+    run_parser.add_argument(
+        '--explain-file',
+        default='./explain.csv',
+        help='Explain trace location, defaults to ./explain.csv',
+    )
+    run_parser.add_argument(
+        '--profile',
+        metavar='FILE',
+        help='Run under cProfile and dump the stats to FILE (readable with pstats)',
+    )
+
+    bench_parser = subparsers.add_parser(
+        'bench', help='Benchmark the model and compare against a stored baseline'
+    )
+    _add_model_arguments(bench_parser)
+    bench_parser.add_argument(
+        '-r', '--repeat',
+        default=5, type=int, help='Number of repetitions, defaults to 5'
+    )
+    bench_parser.add_argument(
+        '--save', metavar='BASELINE', help='Save the results to a baseline file'
+    )
+    bench_parser.add_argument(
+        '--scaling',
+        type=_worker_counts,
+        metavar='COUNTS',
+        help='Compare process-pool (objects) and thread (vector) throughput at each of these '
+             'comma-separated worker counts, e.g. 4,8,16,32,64',
+    )
+    bench_parser.add_argument(
+        '--compare', metavar='BASELINE', help='Compare the results against a baseline file'
+    )
+    bench_parser.add_argument(
+        '--alpha',
+        default=0.05, type=float,
+        help='Significance level for flagging regressions, defaults to 0.05'
+    )
+    bench_parser.add_argument(
+        '--min-change',
+        default=0.05, type=float,
+        help='Minimum relative slowdown flagged as a regression, defaults to 0.05'
+    )
+    bench_parser.add_argument(
+        '--min-seconds',
+        default=0.005, type=float,
+        help='Stages faster than this in the baseline are never flagged, defaults to 0.005'
+    )
+
+    merge_parser = subparsers.add_parser(
+        'merge', help='Merge the partial result sets of a sharded run'
+    )
+    merge_parser.add_argument('partials', nargs='+', help='Partial result sets, one per shard')
+    merge_parser.add_argument(
         '-o', '--output-file',
-        default=open('./output.csv', 'w'),
-        type=argparse.FileType('w'),
+        default='./output.csv',
         help='Output file location, defaults to ./output.csv',
     )
-    parser.add_argument(
+
+    merge_parser.add_argument(
+        '--rollup',
+        metavar='FILE',
+        help='Also save a CSV cube of parcel counts and yields summed by tract, jurisdiction, '
+             'prototype class and iteration, with subtotals',
+    )
+    merge_parser.add_argument(
+        '--store',
+        metavar='FILE',
+        help='Also save the output to an SQLite result store indexed by reference, tract and '
+             'jurisdiction (see query)',
+    )
+
+    serve_parser = subparsers.add_parser(
+        'serve', help='Serve on-demand parcel evaluations over local HTTP'
+    )
+    serve_parser.add_argument(
+        '-d', '--data-dir',
+        default='./data',
+        help='Data directory (parcels.csv is not needed), defaults to ./data'
+    )
+    serve_parser.add_argument(
         '-l', '--iteration-length',
-        default=5, type=int, help='Iteration length, defaults to 1'
+        default=5, type=int, help='Iteration length, defaults to 5'
     )
-    parser.add_argument(
+    serve_parser.add_argument(
         '-n', '--n-iterations',
-        default=5, type=int, help='Number of iterations, defaults to 1'
+        default=1, type=int, help='Default number of iterations per request, defaults to 1'
+    )
+    serve_parser.add_argument(
+        '-b', '--bundle',
+        help='Load prototypes, screen and conversion rates from a compiled bundle (see compile)'
+    )
+    _add_load_workers_argument(serve_parser)
+    serve_parser.add_argument(
+        '--host', default='127.0.0.1', help='Host to bind, defaults to 127.0.0.1'
+    )
+    serve_parser.add_argument(
+        '--port', default=8000, type=int, help='Port to bind, defaults to 8000'
+    )
+    serve_parser.add_argument(
+        '--socket', metavar='PATH', help='Serve on a Unix socket instead of a TCP port'
+    )
+    serve_parser.add_argument(
+        '--batch-window',
+        default=5, type=float,
+        help='Milliseconds to wait for concurrent requests to batch together, defaults to 5'
+    )
+
+    compile_parser = subparsers.add_parser(
+        'compile',
+        help='Compile the prototypes, screen and conversion rates into a bundle that loads quickly',
+    )
+    compile_parser.add_argument(
+        '-d', '--data-dir',
+        default='./data',
+        help='Data directory (parcels.csv is not needed), defaults to ./data'
+    )
+    compile_parser.add_argument(
+        '-o', '--output-file',
+        default='./model.bundle',
+        help='Bundle location, defaults to ./model.bundle',
+    )
+    _add_load_workers_argument(compile_parser)
+
+    query_parser = subparsers.add_parser(
+        'query', help='Print the rows of a parcel or area from a result store as CSV'
+    )
+    query_parser.add_argument('store', help='Result store (see run --store)')
+    query_parser.add_argument('-r', '--reference', help='Parcel reference')
+    query_parser.add_argument('-t', '--tract', help='Tract')
+    query_parser.add_argument('-j', '--jurisdiction', help='Jurisdiction')
+
+    diff_parser = subparsers.add_parser(
+        'diff', help='Compare two result sets (output CSVs or result stores) parcel by parcel'
+    )
+    diff_parser.add_argument('old', help='Previous output CSV or result store')
+    diff_parser.add_argument('new', help='New output CSV or result store')
+    diff_parser.add_argument(
+        '-o', '--output-file',
+        default='./changes.csv',
+        help='Location of the changed rows, defaults to ./changes.csv',
+    )
+    diff_parser.add_argument(
+        '--tolerance',
+        default=1e-6, type=float,
+        help='Relative change in n_sf or n_units (absolute below 1) reported as a change, '
+             'defaults to 1e-6',
+    )
+    diff_parser.add_argument(
+        '--chunksize',
+        default=100000, type=int,
+        help='Rows read at a time from each result set, which bounds memory, defaults to 100000',
     )
     return parser
 
 
-def build_parcels(data_dir):
-    """Convert parcels from DataFrame to list of Parcel objects."""
-    filename = path.join(data_dir, 'parcels.csv')
-    df = pav.ParcelReader().read(filename)
-    return [Parcel(**row.to_dict()) for _, row in df.iterrows()]
-
-
-def build_prototypes(data_dir):
-    """Convert and combine prototypes from DataFrames to list of Prototype objects."""
-    directory = path.join(data_dir, 'prototypes')
-    data = {
-        ptypes.FlexPrototype: pov.FlexReader().read(path.join(directory, 'flex.xlsx')),
-        ptypes.OfficePrototype: pov.OfficeReader().read(path.join(directory, 'office.xlsx')),
-        ptypes.ResidentialOwnershipPrototype: (
-            pov.ResOwnReader().read(path.join(directory, 'residential_ownership.xlsx'))
+def parse_args(argv=None):
+    """Parse arguments, defaulting to the "run" command."""
+    parser = parser_factory()
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or (argv[0] not in COMMANDS and argv[0] not in ('-h', '--help')):
+        argv = ['run'] + list(argv)
+    args = parser.parse_args(argv)
+
+    if getattr(args, 'scaling', None) and (args.save or args.compare):
+        parser.error('--scaling cannot be used with --save or --compare')
+    for option in ('rollup', 'store'):
+        if getattr(args, option, None) and getattr(args, 'shard', None):
+            parser.error(
+                '--{0} cannot be used with --shard (pass it to merge instead)'.format(option)
+            )
+    if args.command == 'query':
+        if args.reference is not None and (args.tract is not None or args.jurisdiction is not None):
+            parser.error('--reference cannot be used with --tract or --jurisdiction')
+        if args.reference is None and args.tract is None and args.jurisdiction is None:
+            parser.error('query needs --reference, --tract or --jurisdiction')
+    if getattr(args, 'engine', None) == 'vector':
+        unsupported = [
+            option
+            for option, name in (
+                ('--checkpoint-dir', 'checkpoint_dir'),
+                ('--count', 'count'),
+                ('--verify-pruning', 'verify_pruning'),
+                ('--explain', 'explain'),
+            )
+            if getattr(args, name, None)
+        ]
+        if unsupported:
+            parser.error('{0} cannot be used with --engine vector'.format(', '.join(unsupported)))
+    elif getattr(args, 'precision', 'float64') != 'float64':
+        # The objects engine holds every ParcelRun until the end, so compacting then saves nothing
+        parser.error('--precision {0} requires --engine vector'.format(args.precision))
+    return args
+
+
+def _prototype_sources():
+    """Prototype workbooks (relative to the data directory), with their classes and readers."""
+    import proforma.prototypes as ptypes
+    from proforma.validators import prototypes as pov
+
+    return (
+        ('prototypes/flex.xlsx', ptypes.FlexPrototype, pov.FlexReader()),
+        ('prototypes/office.xlsx', ptypes.OfficePrototype, pov.OfficeReader()),
+        (
+            'prototypes/residential_ownership.xlsx',
+            ptypes.ResidentialOwnershipPrototype,
+            pov.ResOwnReader(),
         ),
-        ptypes.ResidentialRentalPrototype: (
-            pov.ResRentReader().read(path.join(directory, 'residential_rental.xlsx'))
+        (
+            'prototypes/residential_rental.xlsx',
+            ptypes.ResidentialRentalPrototype,
+            pov.ResRentReader(),
         ),
-        ptypes.RetailPrototype: pov.RetailReader().read(path.join(directory, 'retail.xlsx')),
-        ptypes.WDPrototype: pov.WDReader().read(path.join(directory, 'wd.xlsx')),
+        ('prototypes/retail.xlsx', ptypes.RetailPrototype, pov.RetailReader()),
+        ('prototypes/wd.xlsx', ptypes.WDPrototype, pov.WDReader()),
+    )
+
+
+def read_inputs(data_dir, names=INPUT_FILES, workers=None):
+    """Read and validate input files concurrently in a process pool.
+
+    Returns a dict of DataFrames and a dict of seconds spent reading each file, both keyed by the
+    names in INPUT_FILES. The entitlement screen is only parsed, since its checks need the parcels
+    (see build_screen). Raises InputErrors listing every file that failed.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    from proforma.validators import conversions as cv, parcels as pav, screen as sv, utils
+
+    readers = {
+        'parcels.csv': pav.ParcelReader(),
+        'conversion_rates.xlsx': cv.ConversionRatesReader(),
     }
+    readers.update({filename: reader for filename, _, reader in _prototype_sources()})
 
-    return [
-        cls(**row.to_dict())
-        for cls, df in data.items()
-        for _, row in df.iterrows()
-    ]
+    dfs, seconds, errors = {}, {}, {}
 
+    def collect(name, future):
+        try:
+            dfs[name], seconds[name] = future.result()
+        except Exception as e:
+            errors[name] = e
 
-def build_screen(data_dir, parcels, prototypes):
-    """Prepare entitlement screen."""
-    filename = path.join(data_dir, 'entitlement_screen.xlsx')
-    return sv.ScreenReader(parcels, prototypes).read(filename)
+    with ProcessPoolExecutor(workers) as executor:
+        futures = {
+            name: executor.submit(utils.timed_read, reader, path.join(data_dir, name))
+            for name, reader in readers.items()
+            if name in names
+        }
+        if 'entitlement_screen.xlsx' in names:
+            # The screen's columns are the prototype names, so wait for the prototypes first
+            for filename, _, _ in _prototype_sources():
+                collect(filename, futures.pop(filename))
+            if not errors:
+                futures['entitlement_screen.xlsx'] = executor.submit(
+                    utils.timed_read,
+                    sv.ScreenReader([], build_prototypes(dfs)),
+                    path.join(data_dir, 'entitlement_screen.xlsx'),
+                    False,
+                )
+        for name, future in futures.items():
+            collect(name, future)
 
+    if errors:
+        raise utils.InputErrors(errors)
+    return dfs, seconds
+
+
+def build_parcels(dfs):
+    """Convert parcels from DataFrame to list of Parcel objects."""
+    from proforma import parcels
+    from proforma.validators.parcels import ParcelReader
 
-def build_conversion_rates(data_dir):
+    if set(parcels.FIELDS) != set(ParcelReader.DTYPES):
+        raise ValueError('Parcel fields do not match the parcel reader columns.')
+    return parcels.from_df(dfs['parcels.csv'])
+
+
+def build_prototypes(dfs):
+    """Convert and combine prototypes from DataFrames into a PrototypeCatalog."""
+    from collections import OrderedDict
+    from proforma.catalog import PrototypeCatalog
+
+    return PrototypeCatalog.from_frames(OrderedDict(
+        (cls, dfs[filename]) for filename, cls, _ in _prototype_sources()
+    ))
+
+
+def build_screen(dfs, parcels, prototypes):
+    """Validate the entitlement screen against the parcels and prototypes."""
+    from proforma.validators import screen as sv, utils
+
+    try:
+        return sv.ScreenReader(parcels, prototypes).validate(dfs['entitlement_screen.xlsx'])
+    except Exception as e:
+        raise utils.InputErrors({'entitlement_screen.xlsx': e})
+
+
+def build_conversion_rates(dfs):
     """Prepare the conversion rates."""
-    filename = path.join(data_dir, 'conversion_rates.xlsx')
-    df = cv.ConversionRatesReader().read(filename)
-    return ConversionRates(df)
+    from proforma.conversions import ConversionRates
 
+    return ConversionRates(dfs['conversion_rates.xlsx'])
+
+
+def load_bundle(filename, parcels):
+    """Load prototypes, screen and conversion rates from a compiled bundle."""
+    from proforma.bundle import check_codes, read_bundle
+
+    bundle = read_bundle(filename)
+    check_codes(bundle['screen'], parcels)
+    return bundle['prototypes'], bundle['screen'], bundle['conversion_rates']
+
+
+def build_checkpoint(data_dir, checkpoint_dir, resume, bundle=None):
+    """Prepare the checkpoint, recording the digests of the input files in its manifest."""
+    if checkpoint_dir is None:
+        return None
+    if bundle is None:
+        inputs = {name: file_digest(path.join(data_dir, name)) for name in INPUT_FILES}
+    else:
+        inputs = {
+            'parcels.csv': file_digest(path.join(data_dir, 'parcels.csv')),
+            'bundle': file_digest(bundle),
+        }
+    return Checkpoint(checkpoint_dir, inputs, resume)
+
+
+def _silent(*args, **kwargs):
+    """Discard progress messages."""
+
+
+def _format_seconds(seconds):
+    """Format seconds as H:MM:SS."""
+    if seconds is None:
+        return '?'
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return '{0}:{1:02d}:{2:02d}'.format(hours, minutes, seconds)
+
+
+def show_progress(progress):
+    """Show a live progress line for a ModelRun on stderr."""
+    sys.stderr.write(
+        '\r{0}/{1} parcels\t{2:.1f} parcels/s\tETA {3}\tworker utilization {4:.0%}'.format(
+            progress.done,
+            progress.total,
+            progress.rate,
+            _format_seconds(progress.eta),
+            progress.utilization,
+        )
+    )
+    if progress.done == progress.total:
+        sys.stderr.write('\n')
+    sys.stderr.flush()
+
+
+def run_model(args, recorder, echo=print, progress=None):
+    """Build the inputs and run the model, recording each stage.
+
+    Returns the list of parcels and the output DataFrame.
+    """
+    from proforma import shards
+    from proforma.run import ModelRun
 
-def main():
-    """Run CLI."""
-    parser = parser_factory()
-    args = parser.parse_args()
     data_dir = path.abspath(args.data_dir)
 
-    print('Gathering parcels...')
-    parcels = build_parcels(data_dir)
-    print('Gathering prototypes...')
-    prototypes = build_prototypes(data_dir)
-    print('Gathering screen...')
-    screen = build_screen(data_dir, parcels, prototypes)
-    print('Gathering conversion rates...')
-    conversion_rates = build_conversion_rates(data_dir)
+    echo('Reading inputs...')
+    with recorder.stage('read_inputs') as stage:
+        dfs, stage['files'] = read_inputs(
+            data_dir, ('parcels.csv',) if args.bundle else INPUT_FILES, args.load_workers
+        )
+        stage['items'] = len(dfs)
+    echo('Gathering parcels...')
+    with recorder.stage('build_parcels') as stage:
+        parcels = build_parcels(dfs)
+        stage['items'] = len(parcels)
+    if args.bundle:
+        echo('Loading bundle...')
+        with recorder.stage('load_bundle') as stage:
+            prototypes, screen, conversion_rates = load_bundle(args.bundle, parcels)
+            stage['items'] = len(prototypes)
+    else:
+        echo('Gathering prototypes...')
+        with recorder.stage('build_prototypes') as stage:
+            prototypes = build_prototypes(dfs)
+            stage['items'] = len(prototypes)
+        echo('Gathering screen...')
+        with recorder.stage('build_screen') as stage:
+            screen = build_screen(dfs, parcels, prototypes)
+            stage['items'] = len(screen)
+        echo('Gathering conversion rates...')
+        with recorder.stage('build_conversion_rates') as stage:
+            conversion_rates = build_conversion_rates(dfs)
+            stage['items'] = len(conversion_rates)
+    explain = getattr(args, 'explain', None)
+    if explain:
+        unknown = set(explain) - set(parcel.reference for parcel in parcels)
+        if unknown:
+            sys.exit('References to explain not found in the parcels: {0}'.format(
+                ', '.join(sorted(unknown))
+            ))
+    shard = getattr(args, 'shard', None)
+    if shard is not None:
+        parcels = shards.select(parcels, *shard)
+        echo('Running shard {0}/{1} ({2} parcels)...'.format(shard[0], shard[1], len(parcels)))
 
-    # Model run
-    print('Starting run...')
-    model_run = ModelRun(
-        parcels, prototypes, conversion_rates, screen, args.n_iterations, args.iteration_length
+    checkpoint = build_checkpoint(
+        data_dir,
+        getattr(args, 'checkpoint_dir', None),
+        getattr(args, 'resume', False),
+        args.bundle,
     )
-    print('Compiling data...')
-    df = model_run.to_df()
 
-    # To CSV
-    print('Saving data...')
-    df.to_csv(args.output_file)
+    # Model run
+    echo('Starting run...')
+    if getattr(args, 'engine', 'objects') == 'vector':
+        from proforma.engine import VectorEngine
+
+        with recorder.stage('VectorEngine') as stage:
+            options = {'tile_size': args.tile_size} if args.tile_size else {}
+            engine = VectorEngine(
+                prototypes, conversion_rates, screen, args.iteration_length,
+                threads=args.workers, **options
+            )
+            results = engine.run_compact(parcels, args.n_iterations, args.precision)
+            stage['items'] = len(parcels)
+            stage['bytes'] = results.nbytes
+        echo('Compiling data...')
+        with recorder.stage('to_df') as stage:
+            df = results.to_df()
+            stage['items'] = len(df)
+        return parcels, df
+
+    with recorder.stage('ModelRun') as stage:
+        model_run = ModelRun(
+            parcels, prototypes, conversion_rates, screen, args.n_iterations, args.iteration_length,
+            count=getattr(args, 'count', False),
+            verify_pruning=getattr(args, 'verify_pruning', False),
+            explain=explain,
+            processes=args.workers,
+            progress=progress,
+            checkpoint=checkpoint,
+        )
+        stage['items'] = len(model_run.runs)
+        if model_run.count:
+            stage['counts'] = dict(model_run.counts)
+    if explain:
+        with recorder.stage('explain') as stage:
+            traces = model_run.traces
+            # A shard may hold none of the parcels to explain
+            if len(traces):
+                traces.to_csv(args.explain_file, index=False)
+                echo('Saved explain traces to {0}'.format(args.explain_file))
+            stage['items'] = len(traces)
+    echo('Compiling data...')
+    with recorder.stage('to_df') as stage:
+        df = model_run.to_df()
+        stage['items'] = len(df)
+
+    return parcels, df
 
-    # Summary stats
+
+def print_summary(summary):
+    """Print summary statistics."""
     print('\nCalculating summary statistics...', end='\n\n')
-    print('Number of parcels\t{0}'.format(len(parcels)))
-    print('Total commercial square footage yielded\t{0}'.format(df.n_sf.sum()))
-    print('Total residential units yielded\t{0}'.format(df.n_units.sum()), end='\n\n')
+    print('Number of parcels\t{0}'.format(summary['n_parcels']))
+    print('Total commercial square footage yielded\t{0}'.format(summary['n_sf']))
+    print('Total residential units yielded\t{0}'.format(summary['n_units']), end='\n\n')
     print(
         (
-            df
-            .groupby('prototype')
-            .n_sf
-            .sum()
+            summary['n_sf_by_prototype']
             .sort_values(ascending=False)
             .rename_axis('Commercial square footage by prototype:')
             .to_string()
@@ -143,10 +682,7 @@ def main():
     )
     print(
         (
-            df
-            .groupby('prototype')
-            .n_units
-            .sum()
+            summary['n_units_by_prototype']
             .sort_values(ascending=False)
             .rename_axis('Residential units by prototype:')
             .to_string()
@@ -154,11 +690,279 @@ def main():
         end='\n\n'
     )
 
+
+def run(args):
+    """Run the model and save the output."""
+    from proforma import rollup, shards
+    from proforma.store import write_store
+
+    recorder = StageRecorder()
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler is not None:
+        profiler.enable()
+
+    progress = show_progress if sys.stderr.isatty() else None
+    parcels, df = run_model(args, recorder, progress=progress)
+    with recorder.stage('summarize') as stage:
+        summary = shards.summarize(df, len(parcels))
+        stage['items'] = len(df)
+
+    print('Saving data...')
+    with recorder.stage('write') as stage:
+        if args.shard is None:
+            df.to_csv(args.output_file)
+        else:
+            index, n_shards = args.shard
+            filename = path.join(args.partial_dir, shards.partial_filename(index, n_shards))
+            os.makedirs(args.partial_dir, exist_ok=True)
+            shards.write_partial(filename, df, summary, index, n_shards)
+            print('Saved shard {0}/{1} to {2}'.format(index, n_shards, filename))
+        stage['items'] = len(df)
+    if args.rollup:
+        with recorder.stage('rollup') as stage:
+            cube = rollup.cube(df)
+            cube.to_csv(args.rollup, index=False)
+            stage['items'] = len(cube)
+    if args.store:
+        with recorder.stage('store') as stage:
+            write_store(args.store, df)
+            stage['items'] = len(df)
+
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+
+    print_summary(summary)
+    print(recorder.to_string(), end='\n\n')
+    if args.report:
+        recorder.save(args.report)
+        print('Saved stage report to {0}'.format(args.report))
+    if profiler is not None:
+        print('Saved profile stats to {0}'.format(args.profile))
+
+    print('Done!')
+
+
+def merge(args):
+    """Merge the partial outputs of a sharded run."""
+    from proforma import rollup, shards
+    from proforma.store import write_store
+
+    print('Merging {0} partial outputs...'.format(len(args.partials)))
+    try:
+        df, summary = shards.merge(args.partials)
+    except ValueError as e:
+        sys.exit(str(e))
+
+    print('Saving data...')
+    df.to_csv(args.output_file)
+    if args.rollup:
+        rollup.cube(df).to_csv(args.rollup, index=False)
+    if args.store:
+        write_store(args.store, df)
+    print_summary(summary)
     print('Done!')
 
 
+def bench_scaling(args):
+    """Benchmark model throughput of both engines at several worker counts."""
+    from collections import OrderedDict
+    from copy import copy
+
+    throughput = OrderedDict()
+    for engine in ENGINES:
+        for workers in args.scaling:
+            print('Benchmarking the {0} engine with {1} workers ({2} repetitions)...'.format(
+                engine, workers, args.repeat
+            ))
+            run_args = copy(args)
+            run_args.engine, run_args.workers = engine, workers
+
+            def pipeline(recorder):
+                parcels, _ = run_model(run_args, recorder, echo=_silent)
+                return len(parcels)
+
+            results = benchmark.run_benchmark(pipeline, args.repeat)
+            throughput.setdefault(engine, OrderedDict())[workers] = (
+                benchmark.model_throughput(results)
+            )
+    print()
+    print(benchmark.format_scaling(throughput))
+
+
+def bench(args):
+    """Benchmark the model, optionally saving a baseline or comparing against one."""
+    from proforma import shards
+
+    if args.scaling:
+        return bench_scaling(args)
+
+    def pipeline(recorder):
+        parcels, df = run_model(args, recorder, echo=_silent)
+        with recorder.stage('summarize') as stage:
+            shards.summarize(df, len(parcels))
+            stage['items'] = len(df)
+        return len(parcels)
+
+    print('Benchmarking ({0} repetitions)...'.format(args.repeat))
+    results = benchmark.run_benchmark(pipeline, args.repeat)
+    for name, samples in results['stages'].items():
+        print('{0}\t{1:.3f}s'.format(name, min(samples)))
+    print('parcels/s\t{0:.1f}'.format(max(results['parcels_per_second'])))
+
+    if args.save:
+        benchmark.save_baseline(results, args.save)
+        print('Saved baseline to {0}'.format(args.save))
+
+    if args.compare:
+        baseline = benchmark.load_baseline(args.compare)
+        comparison = benchmark.compare(
+            baseline, results, args.alpha, args.min_change, args.min_seconds
+        )
+        print('\nComparison against {0}:\n'.format(args.compare))
+        print(benchmark.format_comparison(comparison))
+        if comparison['min_pvalue'] >= args.alpha:
+            print(
+                '\nWarning: with {0} baseline and {1} current repetitions the smallest possible '
+                'p-value is {2:.3f}, so nothing can be flagged at alpha {3}; increase --repeat.'
+                .format(
+                    len(baseline['parcels_per_second']), args.repeat, comparison['min_pvalue'],
+                    args.alpha,
+                )
+            )
+        flagged = benchmark.regressions(comparison)
+        if flagged:
+            sys.exit('\nRegressions: {0}'.format(', '.join(flagged)))
+        print('\nNo regressions.')
+
+
+def serve(args):
+    """Load the model inputs once and serve parcel evaluations."""
+    from proforma import server
+
+    # Zone codes are checked per request instead of against parcels.csv
+    if args.bundle:
+        print('Loading bundle...')
+        prototypes, screen, conversion_rates = load_bundle(args.bundle, [])
+    else:
+        prototypes, screen, conversion_rates = build_static_inputs(
+            path.abspath(args.data_dir), args.load_workers
+        )
+
+    model = server.ModelServer(
+        prototypes,
+        conversion_rates,
+        screen,
+        args.iteration_length,
+        n_iterations=args.n_iterations,
+        batch_window=args.batch_window / 1000,
+    )
+    httpd = server.make_server(model, args.host, args.port, args.socket)
+    print('Serving on {0}...'.format(
+        args.socket or 'http://{0}:{1}'.format(args.host, args.port)
+    ))
+    try:
+        httpd.serve_forever()
+    finally:
+        httpd.server_close()
+
+
+def build_static_inputs(data_dir, workers=None):
+    """Build the prototypes, screen and conversion rates without parcels.
+
+    The screen's zone codes are not checked against the parcels; see proforma.bundle.check_codes.
+    """
+    print('Reading inputs...')
+    dfs, _ = read_inputs(data_dir, INPUT_FILES[1:], workers)
+    prototypes = build_prototypes(dfs)
+    screen = build_screen(dfs, [], prototypes)
+    conversion_rates = build_conversion_rates(dfs)
+    return prototypes, screen, conversion_rates
+
+
+def compile_bundle(args):
+    """Compile the validated prototypes, screen and conversion rates into a bundle."""
+    from proforma.bundle import write_bundle
+
+    data_dir = path.abspath(args.data_dir)
+    prototypes, screen, conversion_rates = build_static_inputs(data_dir, args.load_workers)
+    inputs = {
+        name: file_digest(path.join(data_dir, name))
+        for name in INPUT_FILES
+        if name != 'parcels.csv'
+    }
+    write_bundle(args.output_file, prototypes, screen, conversion_rates, inputs)
+    print('Saved bundle to {0} ({1:.1f} kB)'.format(
+        args.output_file, path.getsize(args.output_file) / 1024
+    ))
+
+
+def query(args):
+    """Print the rows of a parcel or area from a result store."""
+    from proforma.store import ResultStore
+
+    try:
+        with ResultStore(args.store) as store:
+            if args.reference is not None:
+                df = store.parcel(args.reference)
+            else:
+                df = store.area(args.tract, args.jurisdiction)
+    except ValueError as e:
+        sys.exit(str(e))
+    df.to_csv(sys.stdout)
+
+
+def diff_results(args):
+    """Compare two result sets, saving the changed rows and printing a summary."""
+    from proforma import diff
+
+    summary = diff.DiffSummary()
+    print('Comparing {0} with {1}...'.format(args.old, args.new))
+    n_changes = 0
+    try:
+        with open(args.output_file, 'w') as f:
+            for changes in diff.diff(
+                args.old, args.new, summary, tolerance=args.tolerance, chunksize=args.chunksize
+            ):
+                changes.to_csv(f, index=False, header=not n_changes)
+                n_changes += len(changes)
+            if not n_changes:
+                f.write(','.join(diff.change_columns()) + '\n')
+    except ValueError as e:
+        sys.exit(str(e))
+
+    print('Saved {0} changed rows to {1}'.format(n_changes, args.output_file), end='\n\n')
+    print(summary.to_string())
+
+
+def main():
+    """Run CLI."""
+    args = parse_args()
+    # Imported after parsing so that --help stays fast
+    from proforma.validators.utils import InputErrors
+
+    if getattr(args, 'resume', False) and args.checkpoint_dir is None:
+        sys.exit('--resume requires --checkpoint-dir')
+    commands = {
+        'run': run,
+        'bench': bench,
+        'merge': merge,
+        'serve': serve,
+        'compile': compile_bundle,
+        'query': query,
+        'diff': diff_results,
+    }
+    try:
+        commands[args.command](args)
+    except InputErrors as e:
+        sys.exit('Invalid inputs:\n{0}'.format(e))
+    except ValueError as e:
+        # E.g. a checkpoint that does not match the run, a stale bundle or invalid engine options
+        sys.exit(str(e))
+
+
 if __name__ == '__main__':
     try:
         main()
     except KeyboardInterrupt:
-        exit('Quitting')
+        sys.exit('Quitting')
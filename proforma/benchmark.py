@@ -0,0 +1,242 @@
+"""Benchmark harness with stored baselines and regression comparison."""
+from itertools import combinations
+import json
+from math import factorial
+import platform
+import random
+from statistics import mean
+
+from .profiling import StageRecorder
+
+
+def run_benchmark(pipeline, repeat=5):
+    """Run `pipeline` `repeat` times and collect per-stage seconds, throughput and peak RSS.
+
+    `pipeline` is called with a fresh StageRecorder for every repetition and returns the number of
+    parcels it processed. 'peak_rss' holds the process peak so far after each repetition, which
+    never drops, so its values are not independent samples (see compare).
+    """
+    results = {
+        'meta': {
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'n_parcels': None,
+            'repeat': repeat,
+        },
+        'stages': {},
+        'parcels_per_second': [],
+        'peak_rss': [],
+    }
+    for _ in range(repeat):
+        recorder = StageRecorder()
+        n_parcels = pipeline(recorder)
+        results['meta']['n_parcels'] = n_parcels
+        for name, stage in recorder.stages.items():
+            results['stages'].setdefault(name, []).append(stage['seconds'])
+        results['parcels_per_second'].append(n_parcels / recorder.seconds)
+        results['peak_rss'].append(max(
+            (stage['peak_rss'] or 0) for stage in recorder.stages.values()
+        ))
+    return results
+
+
+# Stages that run the model itself (rather than reading and building its inputs)
+MODEL_STAGES = ('ModelRun', 'to_df', 'VectorEngine')
+
+
+def model_throughput(results, stages=MODEL_STAGES):
+    """Best parcels per second of benchmark results, counting only the model stages."""
+    samples = [results['stages'][name] for name in stages if name in results['stages']]
+    seconds = min(sum(repetition) for repetition in zip(*samples))
+    return results['meta']['n_parcels'] / seconds if seconds else float('inf')
+
+
+def format_scaling(throughput):
+    """Format {engine: {workers: parcels per second}} as a table.
+
+    Speedups are relative to the engine's smallest worker count; the last column compares the last
+    engine against the first at the same worker count.
+    """
+    engines = list(throughput)
+    counts = sorted(set(count for by_count in throughput.values() for count in by_count))
+    header = ['workers']
+    for engine in engines:
+        header += ['{0} parcels/s'.format(engine), 'speedup']
+    if len(engines) > 1:
+        header.append('{0}/{1}'.format(engines[-1], engines[0]))
+
+    rows = [header]
+    for count in counts:
+        row = [str(count)]
+        for engine in engines:
+            by_count = throughput[engine]
+            base = by_count[min(by_count)]
+            row += ['{0:.1f}'.format(by_count[count]), '{0:.2f}x'.format(by_count[count] / base)]
+        if len(engines) > 1:
+            row.append('{0:.2f}x'.format(
+                throughput[engines[-1]][count] / throughput[engines[0]][count]
+            ))
+        rows.append(row)
+
+    widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+    return '\n'.join(
+        '  '.join(value.ljust(width) for value, width in zip(row, widths)).rstrip()
+        for row in rows
+    )
+
+
+def save_baseline(results, filename):
+    """Save benchmark results to a baseline file."""
+    with open(filename, 'w') as f:
+        json.dump(results, f, indent=2)
+
+
+def load_baseline(filename):
+    """Load benchmark results from a baseline file."""
+    with open(filename) as f:
+        return json.load(f)
+
+
+def permutation_pvalue(baseline, current, n_resamples=10000, seed=0):
+    """One-sided p-value that the mean of `current` is larger than the mean of `baseline`.
+
+    Exact when the number of possible splits is at most `n_resamples`, otherwise estimated from
+    `n_resamples` random splits.
+    """
+    pooled = list(baseline) + list(current)
+    n = len(current)
+    observed = mean(current) - mean(baseline)
+    total = sum(pooled)
+
+    def diff(indices):
+        selected = sum(pooled[i] for i in indices)
+        return selected / n - (total - selected) / (len(pooled) - n)
+
+    n_splits = factorial(len(pooled)) // (factorial(n) * factorial(len(pooled) - n))
+    if n_splits <= n_resamples:
+        splits = list(combinations(range(len(pooled)), n))
+    else:
+        rng = random.Random(seed)
+        splits = [rng.sample(range(len(pooled)), n) for _ in range(n_resamples)]
+
+    # Small epsilon guards against float noise on the observed split itself
+    hits = sum(1 for split in splits if diff(split) >= observed - 1e-12)
+    return hits / len(splits)
+
+
+def min_pvalue(n_baseline, n_current):
+    """Smallest p-value permutation_pvalue can return for exact tests of samples of these sizes.
+
+    With 3 repetitions on each side it is 0.05, so nothing is significant at alpha = 0.05.
+    """
+    n = n_baseline + n_current
+    return factorial(n_baseline) * factorial(n_current) / factorial(n)
+
+
+def _compare_samples(baseline, current, higher_is_worse, alpha, min_change, floor=0):
+    """Compare two samples of one metric.
+
+    Metrics whose baseline mean is below `floor` are never flagged.
+    """
+    negligible = mean(baseline) < floor
+    if not higher_is_worse:
+        # Compare the reciprocal (e.g., seconds per parcel instead of parcels per second)
+        baseline = [1 / x for x in baseline]
+        current = [1 / x for x in current]
+
+    # Relative slowdown (positive is worse)
+    change = mean(current) / mean(baseline) - 1
+    pvalue = permutation_pvalue(baseline, current)
+    return {
+        'baseline': mean(baseline) if higher_is_worse else 1 / mean(baseline),
+        'current': mean(current) if higher_is_worse else 1 / mean(current),
+        'change': change,
+        'pvalue': pvalue,
+        'negligible': negligible,
+        'regression': pvalue < alpha and change > min_change and not negligible,
+    }
+
+
+# Stages faster than this (baseline mean, in seconds) are not flagged: their relative changes are
+# mostly timer and scheduling noise
+MIN_SECONDS = 0.005
+
+
+def compare(baseline, current, alpha=0.05, min_change=0.05, min_seconds=MIN_SECONDS):
+    """Compare benchmark results against a baseline.
+
+    A metric is flagged as a regression when it is slower by more than `min_change` and the
+    slowdown is significant at level `alpha` under a permutation test; the process peak RSS when
+    it grew by more than `min_change`. Stages taking less than `min_seconds` in the baseline are
+    reported but not flagged. `min_pvalue` is the smallest p-value the repetitions allow; when it
+    is not below alpha, nothing can be flagged.
+    """
+    comparison = {
+        'stages': {},
+        'min_pvalue': min_pvalue(
+            len(baseline['parcels_per_second']), len(current['parcels_per_second'])
+        ),
+    }
+    for name, samples in current['stages'].items():
+        if name in baseline['stages']:
+            comparison['stages'][name] = _compare_samples(
+                baseline['stages'][name], samples, True, alpha, min_change, min_seconds
+            )
+    comparison['parcels_per_second'] = _compare_samples(
+        baseline['parcels_per_second'], current['parcels_per_second'], False, alpha, min_change
+    )
+    if all(baseline['peak_rss']) and all(current['peak_rss']):
+        comparison['peak_rss'] = _compare_peaks(
+            max(baseline['peak_rss']), max(current['peak_rss']), min_change
+        )
+    return comparison
+
+
+def _compare_peaks(baseline, current, min_change):
+    """Compare process peak RSS, a single high-water mark per run (there is no p-value)."""
+    change = current / baseline - 1
+    return {
+        'baseline': baseline,
+        'current': current,
+        'change': change,
+        'pvalue': None,
+        'negligible': False,
+        'regression': change > min_change,
+    }
+
+
+def regressions(comparison):
+    """List the names of the metrics flagged as regressions."""
+    flagged = [name for name, c in comparison['stages'].items() if c['regression']]
+    flagged += [
+        name
+        for name in ('parcels_per_second', 'peak_rss')
+        if name in comparison and comparison[name]['regression']
+    ]
+    return flagged
+
+
+def format_comparison(comparison):
+    """Format a comparison as a table."""
+    rows = [('metric', 'baseline', 'current', 'change', 'p-value', '')]
+    metrics = [('stage ' + name, c) for name, c in comparison['stages'].items()]
+    metrics += [
+        (name, comparison[name])
+        for name in ('parcels_per_second', 'peak_rss')
+        if name in comparison
+    ]
+    for name, c in metrics:
+        rows.append((
+            name,
+            '{0:.4g}'.format(c['baseline']),
+            '{0:.4g}'.format(c['current']),
+            '{0:+.1%}'.format(c['change']),
+            '-' if c['pvalue'] is None else '{0:.3f}'.format(c['pvalue']),
+            'REGRESSION' if c['regression'] else 'negligible' if c['negligible'] else '',
+        ))
+
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    return '\n'.join(
+        '  '.join(value.ljust(width) for value, width in zip(row, widths)).rstrip()
+        for row in rows
+    )
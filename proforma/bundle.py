@@ -0,0 +1,49 @@
+"""Compiled model bundles: validated prototypes, screen and conversion rates in one file."""
+import pickle
+
+
+MAGIC = b'DSPBUNDLE'
+VERSION = 1
+
+
+def write_bundle(filename, prototypes, screen, conversion_rates, inputs=None):
+    """Pack validated model inputs into a bundle.
+
+    `inputs` optionally records where the bundle came from (e.g., digests of the source files).
+    """
+    payload = {
+        'version': VERSION,
+        'inputs': inputs or {},
+        'prototypes': prototypes,
+        'screen': screen,
+        'conversion_rates': conversion_rates,
+    }
+    with open(filename, 'wb') as f:
+        f.write(MAGIC)
+        pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def read_bundle(filename):
+    """Load a bundle written by write_bundle, returning its contents as a dict."""
+    with open(filename, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError('{0} is not a DSP model bundle.'.format(filename))
+        payload = pickle.load(f)
+
+    if payload['version'] != VERSION:
+        raise ValueError('{0} was compiled with bundle version {1}, expected {2}.'.format(
+            filename, payload['version'], VERSION
+        ))
+    return payload
+
+
+def check_codes(screen, parcels):
+    """Verify that every parcel zone code is in the entitlement screen.
+
+    The bundle is compiled without parcels, so this part of the screen validation happens at load.
+    """
+    missing = set(parcel.code for parcel in parcels) - set(screen.index)
+    if missing:
+        raise ValueError('Zone codes missing from the entitlement screen: {0}'.format(
+            ', '.join(sorted(str(code) for code in missing))
+        ))
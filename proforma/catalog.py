@@ -0,0 +1,109 @@
+"""Prototype catalog: every prototype in one table with stable ids and per-class column blocks."""
+from collections import OrderedDict
+from copy import copy
+import inspect
+
+import numpy as np
+
+
+def _fields(cls):
+    """Constructor arguments of a prototype class, in order."""
+    return [
+        name
+        for name, parameter in inspect.signature(cls).parameters.items()
+        if parameter.kind == parameter.POSITIONAL_OR_KEYWORD
+    ]
+
+
+class PrototypeCatalog:
+    """Catalog of prototypes across all prototype classes.
+
+    Prototypes are grouped by class (classes in order of first appearance, prototypes in their
+    original order within a class) and numbered with a stable integer id, which is also set as `id`
+    on the catalog's copies of the prototypes (the prototypes passed in are left unchanged). For
+    each class, the numeric constructor arguments are kept as a block of float64 columns covering
+    the contiguous id range of that class.
+
+    The catalog iterates like a list of its prototypes, in id order.
+    """
+
+    def __init__(self, prototypes):
+        """init."""
+        classes = []
+        for prototype in prototypes:
+            if type(prototype) not in classes:
+                classes.append(type(prototype))
+        self.classes = tuple(classes)
+
+        # Ids are set on copies, never on the caller's prototypes (which may be in other catalogs)
+        self.prototypes = [
+            copy(p) for p in sorted(prototypes, key=lambda p: self.classes.index(type(p)))
+        ]
+        for prototype_id, prototype in enumerate(self.prototypes):
+            prototype.id = prototype_id
+
+        self.names = np.array([p.name for p in self.prototypes], dtype=object)
+        if len(set(self.names)) != len(self.names):
+            raise ValueError('Prototype names must be unique across all prototype classes.')
+        self._ids = {name: prototype_id for prototype_id, name in enumerate(self.names)}
+
+        # Class tags: index into self.classes, per prototype
+        self.class_index = np.array(
+            [self.classes.index(type(p)) for p in self.prototypes], dtype=np.int8
+        )
+        # First id of each class (the classes' id ranges are contiguous)
+        self.class_starts = np.searchsorted(self.class_index, np.arange(len(self.classes)))
+        self.limiting_factors = np.array([cls.LIMITING_FACTOR for cls in self.classes], dtype=float)
+
+        self.blocks = OrderedDict()
+        for index, cls in enumerate(self.classes):
+            members = [p for p in self.prototypes if type(p) is cls]
+            self.blocks[cls] = OrderedDict(
+                (field, np.array([getattr(p, field) for p in members], dtype=float))
+                for field in _fields(cls)
+                if field != 'name'
+            )
+
+    @classmethod
+    def from_frames(cls, frames):
+        """Build a catalog from a mapping of prototype class to DataFrame of prototype rows."""
+        prototypes = []
+        for prototype_cls, df in frames.items():
+            fields = _fields(prototype_cls)
+            columns = [df[field].tolist() for field in fields]
+            prototypes.extend(prototype_cls(*values) for values in zip(*columns))
+        return cls(prototypes)
+
+    def __iter__(self):
+        return iter(self.prototypes)
+
+    def __len__(self):
+        return len(self.prototypes)
+
+    def __getitem__(self, prototype_id):
+        return self.prototypes[prototype_id]
+
+    @property
+    def class_names(self):
+        """Prototype class names, in catalog order."""
+        return tuple(cls.__name__ for cls in self.classes)
+
+    def ids(self, names):
+        """Ids of the prototypes with the given names."""
+        return np.array([self._ids[name] for name in names], dtype=np.int64)
+
+    def allowed(self, screen):
+        """Map the zone codes of the screen to the sorted ids of their allowed prototypes."""
+        # Prototypes missing from the screen are not allowed anywhere
+        mask = screen.reindex(columns=list(self.names)).values == 1
+        return OrderedDict(
+            (code, np.flatnonzero(row))
+            for code, row in zip(screen.index, mask)
+        )
+
+    def screened(self, screen):
+        """Map each zone code of the entitlement screen to the list of its allowed prototypes."""
+        return OrderedDict(
+            (code, [self.prototypes[i] for i in ids])
+            for code, ids in self.allowed(screen).items()
+        )
@@ -0,0 +1,100 @@
+"""Checkpointing of completed parcel chunks for resuming model runs."""
+import glob
+import hashlib
+import json
+import os
+import pickle
+
+
+def file_digest(filename):
+    """SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(2 ** 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def parcels_digest(parcels):
+    """SHA-256 hex digest of the parcel references, in order."""
+    digest = hashlib.sha256()
+    for parcel in parcels:
+        digest.update(str(parcel.reference).encode())
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class Checkpoint:
+    """Run directory holding completed parcel chunks and a manifest of the run's inputs.
+
+    `inputs` describes everything the run depends on that ModelRun cannot see itself (e.g., the
+    digests of the input files). When `resume` is True, chunks already in the directory are reused
+    as long as the manifest matches; otherwise the directory is cleared.
+    """
+
+    MANIFEST = 'manifest.json'
+
+    def __init__(self, directory, inputs=None, resume=False):
+        """init."""
+        self.directory = directory
+        self.inputs = inputs or {}
+        self.resume = resume
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _chunk_path(self, index):
+        return self._path('chunk-{0:06d}.pkl'.format(index))
+
+    def open(self, parameters, chunksize):
+        """Verify or write the manifest for a run and return the chunk size to use.
+
+        On resume, the stored chunk size wins so that chunks line up with the ones on disk.
+        Raises ValueError if the inputs or parameters changed since the checkpoint was written.
+        """
+        manifest = {'inputs': self.inputs, 'parameters': parameters, 'chunksize': chunksize}
+        manifest_path = self._path(self.MANIFEST)
+
+        if self.resume and os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                stored = json.load(f)
+            changed = [
+                key
+                for section in ('inputs', 'parameters')
+                for key in sorted(set(manifest[section]) | set(stored[section]))
+                if manifest[section].get(key) != stored[section].get(key)
+            ]
+            if changed:
+                raise ValueError(
+                    'Cannot resume from {0}, these inputs or parameters changed: {1}'.format(
+                        self.directory, ', '.join(changed)
+                    )
+                )
+            return stored['chunksize']
+
+        for filename in glob.glob(self._path('chunk-*.pkl')):
+            os.remove(filename)
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        return chunksize
+
+    def completed(self):
+        """Indices of the completed chunks."""
+        return sorted(
+            int(os.path.basename(filename)[len('chunk-'):-len('.pkl')])
+            for filename in glob.glob(self._path('chunk-*.pkl'))
+        )
+
+    def load(self, index):
+        """Load the parcel runs of a completed chunk."""
+        with open(self._chunk_path(index), 'rb') as f:
+            return pickle.load(f)
+
+    def save(self, index, runs):
+        """Save the parcel runs of a completed chunk."""
+        # Write then rename so that a killed run never leaves a partial chunk behind
+        path = self._chunk_path(index)
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump(runs, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + '.tmp', path)
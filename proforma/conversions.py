@@ -24,6 +24,10 @@ class ConversionRates:
         """Initialize."""
         self._df = df
 
+    def __len__(self):
+        """Number of regions."""
+        return len(self._df)
+
     def _ratio_to_column(self, ratio):
         """Convert ratio to appropriate column name."""
         for cutoff, column in self.RATIO_LOOKUP:
@@ -35,6 +39,11 @@ class ConversionRates:
         column = self._ratio_to_column(ratio)
         return self._df.at[region, column]
 
+    def to_array(self):
+        """Return the regions and an array of rates (one column per RATIO_LOOKUP bucket)."""
+        columns = [column for _, column in self.RATIO_LOOKUP]
+        return self._df.index, self._df.loc[:, columns].values
+
     def compound(self, n):
         """Return a new ConversionRates instance, compounding the rates for n periods."""
         df = self._df.apply(compound_rate, axis=1, args=(n,))
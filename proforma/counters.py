@@ -0,0 +1,103 @@
+"""Opt-in hot-path counters.
+
+When enabled, every pro forma property computation (cache misses only), ConversionRates.get call
+and deepcopy made by the run classes is counted. Counting is installed by wrapping the class
+attributes in place, so it costs nothing while disabled.
+"""
+from collections import Counter
+from contextlib import contextmanager
+import copy
+from functools import wraps
+
+from . import conversions, prototypes
+
+
+_counts = Counter()
+_originals = {}
+
+
+def _counted(key, func):
+    """Wrap func so that every call increments the counter for key."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        _counts[key] += 1
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def _prototype_classes():
+    """The shared prototype base class and all of its subclasses."""
+    classes = [prototypes._SharedPrototype]
+    for cls in classes:
+        classes.extend(cls.__subclasses__())
+    return classes
+
+
+def enabled():
+    """Whether counting is installed."""
+    return bool(_originals)
+
+
+def enable():
+    """Install the counters (no-op if already enabled)."""
+    if enabled():
+        return
+
+    # Imported here since the run module depends on this one
+    from . import run
+
+    for cls in _prototype_classes():
+        for name, attr in list(vars(cls).items()):
+            if isinstance(attr, prototypes.cached_property):
+                # Count computations, not cache hits
+                _originals[(cls, name)] = attr
+                setattr(cls, name, prototypes.cached_property(
+                    _counted('property.' + name, attr.func)
+                ))
+
+    _originals[(conversions.ConversionRates, 'get')] = conversions.ConversionRates.get
+    conversions.ConversionRates.get = _counted(
+        'ConversionRates.get', conversions.ConversionRates.get
+    )
+
+    _originals[(run, 'deepcopy')] = run.deepcopy
+    run.deepcopy = _counted('deepcopy', copy.deepcopy)
+
+
+def disable():
+    """Remove the counters, restoring the original attributes."""
+    for (owner, name), attr in _originals.items():
+        setattr(owner, name, attr)
+    _originals.clear()
+
+
+@contextmanager
+def counting(count=True):
+    """Enable the counters within a block if count is true, then restore their previous state.
+
+    Pool workers outlive a run, so a chunk that enabled the counters must not leave them enabled
+    for the chunks of later runs.
+    """
+    was_counting = enabled()
+    if count:
+        enable()
+    try:
+        yield
+    finally:
+        if count and not was_counting:
+            disable()
+
+
+def snapshot():
+    """Copy of the current counts."""
+    return Counter(_counts)
+
+
+def since(before):
+    """Counts accumulated since the snapshot `before`."""
+    return _counts - before
+
+
+def reset():
+    """Reset all counts to zero."""
+    _counts.clear()
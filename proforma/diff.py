@@ -0,0 +1,252 @@
+"""Run-to-run diff of model results in bounded memory.
+
+Both result sets are read in (reference, iteration, hbu) order, chunk by chunk: output CSVs are
+written sorted that way by ModelRun.to_df, and result stores are read in primary key order. Chunks
+of the two sides are aligned on whole parcels and compared one range of parcels at a time, so
+memory depends on the chunk size rather than on the size of the result sets.
+"""
+from collections import Counter, OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from .store import ResultStore
+
+
+KEY = ['reference', 'iteration', 'hbu']
+YIELDS = ('n_sf', 'n_units')
+COLUMNS = ('prototype', 'prototype_class') + YIELDS
+
+# Relative change in a yield (or absolute, below 1) reported as a change
+TOLERANCE = 1e-6
+# Rows read at a time from each result set
+CHUNKSIZE = 100000
+
+_SQLITE_HEADER = b'SQLite format 3\x00'
+
+
+def is_store(filename):
+    """Whether a file is a result store (SQLite) rather than an output CSV."""
+    with open(filename, 'rb') as f:
+        return f.read(len(_SQLITE_HEADER)) == _SQLITE_HEADER
+
+
+def read_chunks(filename, columns=COLUMNS, chunksize=CHUNKSIZE):
+    """Yield the rows of an output CSV or result store in order, chunksize rows at a time.
+
+    Raises ValueError if the rows are not sorted by reference.
+    """
+    if is_store(filename):
+        with ResultStore(filename) as store:
+            chunks = store.chunks(chunksize, columns)
+            for chunk in _checked(chunks, filename):
+                yield chunk
+    else:
+        chunks = pd.read_csv(
+            filename,
+            usecols=KEY + list(columns),
+            dtype={name: str for name in ('reference', 'prototype', 'prototype_class')},
+            chunksize=chunksize,
+        )
+        for chunk in _checked(chunks, filename):
+            yield chunk
+
+
+def _checked(chunks, filename):
+    """Pass chunks through, checking that references never decrease."""
+    last = None
+    for chunk in chunks:
+        references = chunk['reference'].values.astype(object)
+        if len(references) and (
+            (last is not None and references[0] < last)
+            or (references[1:] < references[:-1]).any()
+        ):
+            raise ValueError('{0} is not sorted by reference.'.format(filename))
+        if len(references):
+            last = references[-1]
+        yield chunk
+
+
+def aligned(left, right):
+    """Pair up chunks of two reference-sorted result sets so that each pair covers the same parcels.
+
+    Yields (left, right) DataFrames; a parcel's rows are never split across pairs.
+    """
+    sources = [iter(left), iter(right)]
+    buffers = [None, None]
+    open_ = [True, True]
+
+    def fill(side):
+        chunk = next(sources[side], None)
+        if chunk is None:
+            open_[side] = False
+        elif buffers[side] is None or not len(buffers[side]):
+            buffers[side] = chunk
+        else:
+            buffers[side] = pd.concat([buffers[side], chunk], ignore_index=True)
+
+    def references(side):
+        return buffers[side]['reference'].values.astype(object)
+
+    while True:
+        for side in (0, 1):
+            while open_[side] and (buffers[side] is None or not len(buffers[side])):
+                fill(side)
+        if buffers[0] is None and buffers[1] is None:
+            return
+        # An empty side still needs the other's columns
+        empty = (buffers[0] if buffers[0] is not None else buffers[1]).iloc[:0]
+        buffers = [empty if buffer is None else buffer for buffer in buffers]
+        if not any(open_):
+            if any(len(buffer) for buffer in buffers):
+                yield tuple(buffers)
+            return
+
+        # Parcels before the last reference read from each open side are complete on both sides
+        frontier = min(references(side)[-1] for side in (0, 1) if open_[side])
+        splits = [np.searchsorted(references(side), frontier) for side in (0, 1)]
+        if any(splits):
+            yield tuple(buffers[side].iloc[:splits[side]] for side in (0, 1))
+            buffers = [buffers[side].iloc[splits[side]:] for side in (0, 1)]
+        else:
+            # The frontier parcel may continue in the next chunk of the sides that reached it
+            for side in (0, 1):
+                if open_[side] and references(side)[-1] == frontier:
+                    fill(side)
+
+
+def compare(old, new, yields=YIELDS, tolerance=TOLERANCE):
+    """Compare aligned chunks of two result sets.
+
+    Returns the outer join of the two on (reference, iteration, hbu), with columns suffixed _old and
+    _new, a `_merge` indicator (left_only, right_only or both), a boolean `hbu_changed`, for each
+    yield a delta (`<yield>_delta`) and a boolean `<yield>_changed`, and a boolean `changed` for
+    rows that were added, removed or changed in any of these.
+    """
+    columns = KEY + ['prototype', 'prototype_class'] + list(yields)
+    merged = pd.merge(
+        old[columns], new[columns], on=KEY, how='outer', suffixes=('_old', '_new'), indicator=True
+    ).sort_values(KEY)
+    both = (merged['_merge'] == 'both').values
+    prototypes = [merged['prototype' + suffix].values.astype(object) for suffix in ('_old', '_new')]
+    merged['hbu_changed'] = both & (prototypes[0] != prototypes[1])
+    changed = ~both | merged['hbu_changed'].values
+    for name in yields:
+        a = merged[name + '_old'].values.astype(float)
+        b = merged[name + '_new'].values.astype(float)
+        delta = b - a
+        with np.errstate(invalid='ignore'):
+            differs = np.abs(delta) > tolerance * np.maximum(1, np.maximum(np.abs(a), np.abs(b)))
+        merged[name + '_delta'] = delta
+        merged[name + '_changed'] = both & (differs | (np.isnan(a) != np.isnan(b)))
+        changed = changed | merged[name + '_changed'].values
+    merged['changed'] = changed
+    return merged
+
+
+class DiffSummary:
+    """Aggregate shifts between two result sets, accumulated chunk by chunk."""
+
+    def __init__(self, yields=YIELDS):
+        """init."""
+        self.yields = tuple(yields)
+        self.counts = Counter()
+        self.totals = OrderedDict((name, [0.0, 0.0]) for name in self.yields)
+        # Sums of each yield by prototype class, in the old and the new result set
+        self.by_class = [pd.DataFrame(columns=list(self.yields), dtype=float) for _ in range(2)]
+        # Counts of (old prototype, new prototype) among changed HBUs
+        self.transitions = Counter()
+
+    def update(self, merged):
+        """Add a compared chunk (see compare)."""
+        indicator = merged['_merge'].values.astype(object)
+        changed = merged['changed'].values
+        for name in self.yields:
+            self.counts[name + '_changed'] += int(merged[name + '_changed'].sum())
+            self.totals[name][0] += merged[name + '_old'].sum()
+            self.totals[name][1] += merged[name + '_new'].sum()
+        self.counts['rows_old'] += int((indicator != 'right_only').sum())
+        self.counts['rows_new'] += int((indicator != 'left_only').sum())
+        self.counts['rows_removed'] += int((indicator == 'left_only').sum())
+        self.counts['rows_added'] += int((indicator == 'right_only').sum())
+        self.counts['hbus_changed'] += int(merged['hbu_changed'].sum())
+        self.counts['rows_changed'] += int(changed.sum())
+        # Chunks never split a parcel, so distinct counts add up across chunks
+        self.counts['parcels'] += merged['reference'].nunique()
+        self.counts['parcels_changed'] += merged['reference'][changed].nunique()
+
+        for side, suffix in enumerate(('_old', '_new')):
+            sums = merged.groupby('prototype_class' + suffix)[
+                [name + suffix for name in self.yields]
+            ].sum()
+            sums.columns = self.yields
+            self.by_class[side] = self.by_class[side].add(sums, fill_value=0)
+
+        hbus = merged[merged['hbu_changed']]
+        self.transitions.update(zip(hbus['prototype_old'], hbus['prototype_new']))
+
+    @property
+    def shift(self):
+        """Net change of each yield by prototype class."""
+        old, new = self.by_class
+        return new.subtract(old, fill_value=0).sort_index().rename_axis('prototype_class')
+
+    def to_string(self, n_transitions=10):
+        """Format the summary."""
+        lines = ['{0}\t{1}'.format(name, self.counts[name]) for name in (
+            'parcels', 'parcels_changed', 'rows_old', 'rows_new', 'rows_removed', 'rows_added',
+            'rows_changed', 'hbus_changed',
+        ) + tuple(name + '_changed' for name in self.yields)]
+        lines += ['', 'Yield\told\tnew\tdelta']
+        lines += [
+            '{0}\t{1}\t{2}\t{3}'.format(name, old, new, new - old)
+            for name, (old, new) in self.totals.items()
+        ]
+        lines += ['', 'Net change by prototype class:', self.shift.to_string()]
+        if self.transitions:
+            lines += ['', 'Most common HBU changes:']
+            lines += [
+                '{0} -> {1}\t{2}'.format(old, new, count)
+                for (old, new), count in self.transitions.most_common(n_transitions)
+            ]
+        return '\n'.join(lines)
+
+
+def diff(old, new, summary, yields=YIELDS, tolerance=TOLERANCE, chunksize=CHUNKSIZE):
+    """Compare two result sets (output CSVs or result stores), accumulating into `summary`.
+
+    Yields DataFrames of the rows that were added, removed, or whose HBU or yields changed.
+    """
+    columns = ('prototype', 'prototype_class') + tuple(yields)
+    for old_chunk, new_chunk in aligned(
+        read_chunks(old, columns, chunksize), read_chunks(new, columns, chunksize)
+    ):
+        merged = compare(old_chunk, new_chunk, yields, tolerance)
+        summary.update(merged)
+        if merged['changed'].any():
+            yield _changes(merged[merged['changed']], yields)
+
+
+def _changes(merged, yields):
+    """Report layout of changed rows: keys, old and new values and a description of the change."""
+    status = np.where(
+        merged['_merge'] == 'left_only', 'removed',
+        np.where(merged['_merge'] == 'right_only', 'added', '')
+    ).astype(object)
+    for flag, name in [('hbu_changed', 'hbu')] + [(y + '_changed', y) for y in yields]:
+        status = np.where(
+            merged[flag].values, np.where(status == '', name, status + ',' + name), status
+        ).astype(object)
+
+    return pd.DataFrame(OrderedDict(
+        (name, status if name == 'change' else merged[name].values)
+        for name in change_columns(yields)
+    ))
+
+
+def change_columns(yields=YIELDS):
+    """Columns of the changed rows yielded by diff."""
+    columns = KEY + ['change']
+    for name in ('prototype', 'prototype_class') + tuple(yields):
+        columns += [name + '_old', name + '_new']
+    return columns + [name + '_delta' for name in yields]
@@ -0,0 +1,83 @@
+"""Dominance pruning of screened prototypes.
+
+rpv_per_sf is affine in a prototype's income attribute (rent or sale price) and parking charge, so
+the difference between two prototypes of the same class is smallest at a corner of the box spanned
+by the parcels' income and parking values. A prototype that a sibling beats at every corner of that
+box can never be the best of its class, and so can never be a high and best use.
+"""
+from collections import OrderedDict
+from copy import deepcopy
+from itertools import product
+from types import SimpleNamespace
+
+
+# Relative margin a sibling must win by at every corner (well above floating-point error)
+TOLERANCE = 1e-9
+
+
+def attributes(cls):
+    """Parcel attributes rpv_per_sf depends on for a prototype class."""
+    return tuple(x for x in (cls._INCOME_ATTRIBUTE, cls._PARKING_ATTRIBUTE) if x is not None)
+
+
+def ranges(parcels, names):
+    """Map each zone code to the (min, max) of the named parcel attributes across its parcels."""
+    bounds = {}
+    for parcel in parcels:
+        code_bounds = bounds.setdefault(parcel.code, {})
+        for name in names:
+            value = getattr(parcel, name)
+            low, high = code_bounds.get(name, (value, value))
+            code_bounds[name] = (min(low, value), max(high, value))
+    return bounds
+
+
+def corner_values(prototype, bounds):
+    """rpv_per_sf of a prototype at every corner of the attribute box."""
+    names = attributes(type(prototype))
+    values = []
+    for corner in product(*(bounds[name] for name in names)):
+        prototype = deepcopy(prototype)
+        prototype.fit(SimpleNamespace(**dict(zip(names, corner))), None)
+        values.append(prototype.rpv_per_sf)
+    return values
+
+
+def undominated(prototypes, bounds, tolerance=TOLERANCE):
+    """Drop the prototypes that a sibling of the same class beats at every corner of the box.
+
+    The order of the remaining prototypes is kept.
+    """
+    corners = [corner_values(p, bounds) for p in prototypes]
+
+    def beats(j, i):
+        return all(
+            b - a > tolerance * max(1, abs(a), abs(b))
+            for a, b in zip(corners[i], corners[j])
+        )
+
+    return [
+        p
+        for i, p in enumerate(prototypes)
+        if not any(
+            type(other) is type(p) and beats(j, i)
+            for j, other in enumerate(prototypes)
+        )
+    ]
+
+
+def prune(screened, parcels, tolerance=TOLERANCE):
+    """Drop dominated prototypes from a screened mapping, given the parcels to run.
+
+    Returns a mapping of zone code to prototypes covering the zone codes of the parcels.
+    """
+    names = set(
+        name
+        for code in set(parcel.code for parcel in parcels)
+        for p in screened[code]
+        for name in attributes(type(p))
+    )
+    return OrderedDict(
+        (code, undominated(screened[code], bounds, tolerance))
+        for code, bounds in ranges(parcels, sorted(names)).items()
+    )
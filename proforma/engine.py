@@ -0,0 +1,517 @@
+"""Vectorized model engine over sparse (parcel, allowed prototype) pairs.
+
+The entitlement screen is compiled into a CSR-style structure: the pairs of every parcel are stored
+contiguously (parcels in order, prototypes in catalog order) and `indptr` marks where each parcel's
+pairs start. The pro forma is evaluated once per pair, HBUs are selected with segmented reductions
+per (parcel, prototype class), and the redevelopment rates and yields are computed for the HBUs
+only, so the cost scales with the number of allowed pairs.
+
+Every formula follows the operation order of the corresponding Prototype properties, so results
+match the object model (ModelRun) exactly.
+"""
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from . import dominance, results, selection
+from .catalog import PrototypeCatalog
+from .prototypes import Prototype, ResidentialOwnershipPrototype, ResidentialRentalPrototype
+
+
+RESIDENTIAL = (ResidentialOwnershipPrototype, ResidentialRentalPrototype)
+
+# Default number of (parcel, prototype) pairs evaluated per tile
+TILE_SIZE = 2 ** 16
+# Approximate bytes per pair of a tile: workspace buffers plus the tile's pair and selection arrays
+BYTES_PER_PAIR = 160
+
+
+def _residential_building(block):
+    """Unit count and building square feet of residential prototypes."""
+    unit_count = np.floor(block['site_size'] / 43560 * block['density'])
+    building_sf = unit_count * block['avg_unit_size'] / block['efficiency_ratio']
+    return unit_count, building_sf
+
+
+def _project_cost(building_sf, construction_cost_per_sf, parking_spaces_structured, block):
+    """Project cost (construction plus structured parking)."""
+    structured_parking_cost_per_space = (
+        block['base_parking_cost_per_space'] * (1 + block['parking_adjustment_factor'])
+    )
+    cost_per_construct_without_parking = building_sf * construction_cost_per_sf
+    parking_costs = parking_spaces_structured * structured_parking_cost_per_space
+    return cost_per_construct_without_parking + parking_costs
+
+
+def prototype_terms(cls, block):
+    """Per-prototype terms of the pro forma that do not depend on the parcel."""
+    terms = OrderedDict(site_size=block['site_size'])
+    if issubclass(cls, Prototype):
+        building_sf = block['building_sf']
+        leasable_area = building_sf * block['efficiency_ratio']
+        parking_per_sf = block['parking_ratio_per_1000_sf'] / 1000
+        parking_spaces = np.floor(leasable_area * parking_per_sf)
+        construction_cost_per_sf = (
+            (block['base_construction_cost_per_sf'] + block['tenant_improvement_allowance'])
+            * (1 + block['construction_adjustment_factor'])
+        )
+        terms['leasable_area'] = leasable_area
+        terms['density'] = np.zeros(len(building_sf))
+    else:
+        unit_count, building_sf = _residential_building(block)
+        parking_spaces = np.ceil(unit_count * block['parking_ratio_per_unit'])
+        construction_cost_per_sf = (
+            block['base_construction_cost_per_sf'] * (1 + block['construction_adjustment_factor'])
+        )
+        terms['density'] = block['density']
+
+    parking_spaces_structured = parking_spaces * block['pct_structured_parking']
+    terms['far'] = building_sf / block['site_size']
+    terms['building_sf'] = building_sf
+    terms['parking_spaces_structured'] = parking_spaces_structured
+    terms['project_cost'] = _project_cost(
+        building_sf, construction_cost_per_sf, parking_spaces_structured, block
+    )
+    terms['income_factor'] = 1 + block['income_adjustment_factor']
+
+    if issubclass(cls, ResidentialOwnershipPrototype):
+        terms['sales_commission'] = block['sales_commission']
+        terms['return_factor'] = 1 + block['threshold_return']
+    else:
+        terms['efficiency_ratio'] = block['efficiency_ratio']
+        terms['vacancy_factor'] = 1 - block['vacancy_collection_loss']
+        terms['expense_factor'] = 1 - (
+            block['base_operating_expenses'] * (1 + block['operating_adjustment_factor'])
+        )
+        terms['threshold_return_on_cost'] = block['threshold_return_on_cost']
+    return terms
+
+
+def rpv_per_sf(cls, terms, local, income, parking, out, scratch):
+    """Residual property value per square foot of pairs, written to `out`.
+
+    `local` holds the index of each pair's prototype within `terms` (the class's prototype_terms),
+    `income` and `parking` the parcel's income attribute and parking charge. `scratch` holds two
+    buffers the length of `out`; nothing else is allocated.
+    """
+    term, monthly_parking_income = scratch
+
+    def gathered(name):
+        return np.take(terms[name], local, out=term, mode='clip')
+
+    # Achievable pricing and monthly parking income
+    np.multiply(income, gathered('income_factor'), out=out)
+    np.multiply(gathered('parking_spaces_structured'), parking, out=monthly_parking_income)
+
+    if issubclass(cls, ResidentialOwnershipPrototype):
+        # Gross sales income, less commission
+        np.multiply(gathered('building_sf'), out, out=out)
+        np.multiply(out, 0.9, out=out)
+        np.add(out, monthly_parking_income, out=out)
+        commission = np.multiply(out, gathered('sales_commission'), out=monthly_parking_income)
+        np.subtract(out, commission, out=out)
+        # Residual property value
+        np.divide(out, gathered('return_factor'), out=out)
+        np.subtract(out, gathered('project_cost'), out=out)
+        return np.divide(out, gathered('site_size'), out=out)
+
+    # Annual base income
+    if issubclass(cls, ResidentialRentalPrototype):
+        np.multiply(gathered('building_sf'), out, out=out)
+        np.multiply(out, gathered('efficiency_ratio'), out=out)
+        np.multiply(out, 12, out=out)
+    else:
+        np.multiply(gathered('leasable_area'), out, out=out)
+    # Gross, effective gross and net operating income
+    np.multiply(monthly_parking_income, 12, out=monthly_parking_income)
+    np.add(out, monthly_parking_income, out=out)
+    np.multiply(out, gathered('vacancy_factor'), out=out)
+    np.multiply(out, gathered('expense_factor'), out=out)
+    # Residual property value
+    np.divide(out, gathered('threshold_return_on_cost'), out=out)
+    np.subtract(out, gathered('project_cost'), out=out)
+    return np.divide(out, gathered('site_size'), out=out)
+
+
+class Workspace:
+    """Preallocated buffers for evaluating tiles of up to `capacity` pairs."""
+
+    BUFFERS = ('values', 'result', 'income', 'parking', 'term', 'scratch')
+    INDICES = ('local', 'parcel')
+
+    def __init__(self, capacity):
+        """init."""
+        self.capacity = capacity
+        self._floats = np.empty((len(self.BUFFERS), capacity))
+        self._ints = np.empty((len(self.INDICES), capacity), dtype=np.int64)
+
+    def __call__(self, name, n):
+        """View of the first n elements of a buffer."""
+        if name in self.INDICES:
+            return self._ints[self.INDICES.index(name), :n]
+        return self._floats[self.BUFFERS.index(name), :n]
+
+
+class PairIndex:
+    """CSR index of the prototype ids allowed for every zone code."""
+
+    def __init__(self, allowed):
+        """init.
+
+        `allowed` maps zone codes to sorted prototype ids.
+        """
+        self.codes = {code: i for i, code in enumerate(allowed)}
+        ids = list(allowed.values())
+        self.counts = np.array([len(x) for x in ids], dtype=np.int64)
+        self.indptr = np.concatenate([[0], np.cumsum(self.counts)]).astype(np.int64)
+        self.indices = np.concatenate(ids).astype(np.int64) if ids else np.empty(0, np.int64)
+
+    def code_index(self, codes):
+        """Index of each zone code (raises ValueError for codes that are not in the index)."""
+        missing = sorted(set(codes) - set(self.codes), key=str)
+        if missing:
+            raise ValueError('Zone codes missing from the entitlement screen: {0}'.format(
+                ', '.join(str(code) for code in missing)
+            ))
+        return np.array([self.codes[code] for code in codes], dtype=np.int64)
+
+    def pairs(self, code_index):
+        """Pairs of parcels with the given zone code indices."""
+        return Pairs(self, code_index)
+
+
+class Pairs:
+    """CSR structure of the (parcel, allowed prototype) pairs of a list of parcels.
+
+    `parcel` and `prototype` give the parcel index and prototype id of every pair; the pairs of
+    parcel i are pairs[indptr[i]:indptr[i + 1]], in catalog order.
+    """
+
+    def __init__(self, index, code_index):
+        """init."""
+        counts = index.counts[code_index]
+        self.indptr = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        self.parcel = np.repeat(np.arange(len(code_index)), counts)
+        offsets = np.arange(len(self.parcel)) - self.indptr[self.parcel]
+        self.prototype = index.indices[index.indptr[code_index[self.parcel]] + offsets]
+
+    def __len__(self):
+        return len(self.parcel)
+
+
+def tiles(counts, tile_size):
+    """Split parcels into consecutive (start, stop) tiles of at most tile_size pairs.
+
+    `counts` holds the number of pairs of every parcel; a parcel with more pairs than tile_size
+    gets a tile of its own.
+    """
+    ends = np.cumsum(counts)
+    start = 0
+    while start < len(counts):
+        offset = ends[start - 1] if start else 0
+        stop = max(start + 1, int(np.searchsorted(ends, offset + tile_size, side='right')))
+        yield start, stop
+        start = stop
+
+
+class VectorEngine:
+    """Run the model on arrays rather than Parcel and Prototype objects.
+
+    Takes the same inputs as ModelRun and produces the same to_df() output. With prune, the
+    dominated prototypes of each zone code (see proforma.dominance) are dropped before evaluation.
+
+    Pairs are evaluated in tiles of consecutive parcels with at most `tile_size` pairs, in
+    preallocated buffers, so pair-level memory is about tile_size * BYTES_PER_PAIR whatever the
+    number of parcels. Smaller tiles stay in cache; larger ones amortize the per-tile overhead.
+
+    With several `threads` (defaults to the number of CPUs), tiles are evaluated concurrently in
+    one process: the NumPy kernels release the GIL, every thread has its own workspace, and the
+    prototype, screen and rate arrays are shared rather than copied to workers.
+    """
+
+    def __init__(
+        self, prototypes, conversion_rates, screen, iteration_length, prune=True,
+        tile_size=TILE_SIZE, threads=None,
+    ):
+        """init."""
+        if tile_size < 1:
+            raise ValueError('tile_size must be positive: {0}'.format(tile_size))
+        self.tile_size = tile_size
+        self.threads = threads or os.cpu_count() or 1
+        if not isinstance(prototypes, PrototypeCatalog):
+            prototypes = PrototypeCatalog(prototypes)
+        self.catalog = prototypes
+        self.screen = screen
+        # Screened once: a long-lived engine (e.g. the model server) runs many batches
+        self.screened = self.catalog.screened(screen)
+        self.prune = prune
+        self.conversion_rates = conversion_rates.compound(iteration_length)
+        self.regions, self.rates = self.conversion_rates.to_array()
+        self.cutoffs = np.array([cutoff for cutoff, _ in self.conversion_rates.RATIO_LOOKUP])
+
+        self.terms = [prototype_terms(cls, block) for cls, block in self.catalog.blocks.items()]
+        self.residential = np.array([issubclass(cls, RESIDENTIAL) for cls in self.catalog.classes])
+        self.far = np.concatenate([terms['far'] for terms in self.terms])
+        self.density = np.concatenate([terms['density'] for terms in self.terms])
+
+    def _allowed(self, parcels):
+        """Map zone codes to the ids of the prototypes to evaluate."""
+        screened = self.screened
+        if self.prune:
+            screened = dominance.prune(screened, parcels)
+        return OrderedDict(
+            (code, np.array([p.id for p in prototypes], dtype=np.int64))
+            for code, prototypes in screened.items()
+        )
+
+    def evaluate(self, pairs, attributes, workspace):
+        """rpv_per_sf of every pair (a view of the workspace).
+
+        `attributes` maps the income and parking attribute names to arrays over the pairs' parcels.
+        """
+        values = workspace('values', len(pairs))
+        pair_class = self.catalog.class_index[pairs.prototype]
+        for index, (cls, terms) in enumerate(zip(self.catalog.classes, self.terms)):
+            members = np.flatnonzero(pair_class == index)
+            n = len(members)
+            local = np.take(pairs.prototype, members, out=workspace('local', n), mode='clip')
+            np.subtract(local, self.catalog.class_starts[index], out=local)
+            pair_parcels = np.take(pairs.parcel, members, out=workspace('parcel', n), mode='clip')
+            income = np.take(
+                attributes[cls._INCOME_ATTRIBUTE], pair_parcels, out=workspace('income', n),
+                mode='clip',
+            )
+            parking = workspace('parking', n)
+            if cls._PARKING_ATTRIBUTE is None:
+                parking.fill(0)
+            else:
+                np.take(attributes[cls._PARKING_ATTRIBUTE], pair_parcels, out=parking, mode='clip')
+            values[members] = rpv_per_sf(
+                cls, terms, local, income, parking, workspace('result', n),
+                (workspace('term', n), workspace('scratch', n)),
+            )
+        if np.isnan(values).any():
+            raise ValueError('rpv_per_sf is NaN for some prototypes; check the prototype inputs.')
+        return values
+
+    def select(self, pairs, values, n_parcels):
+        """Select the HBUs of every parcel.
+
+        Returns the pair index of each HBU and the compounded LIMITING_FACTORs as (parcels x 3)
+        arrays, with -1 (and NaN) where a parcel has fewer HBUs.
+        """
+        n_classes = len(self.catalog.classes)
+        pair_class = self.catalog.class_index[pairs.prototype]
+
+        # Segments of pairs with the same parcel and class (contiguous, as ids follow classes)
+        boundary = np.ones(len(pairs), dtype=bool)
+        boundary[1:] = (pairs.parcel[1:] != pairs.parcel[:-1]) | (pair_class[1:] != pair_class[:-1])
+        starts = np.flatnonzero(boundary)
+        segment_max = np.maximum.reduceat(values, starts) if len(starts) else values[:0]
+        # First pair of each segment reaching the maximum
+        sizes = np.diff(np.append(starts, len(pairs)))
+        positions = np.where(
+            values == np.repeat(segment_max, sizes), np.arange(len(pairs)), len(pairs)
+        )
+        segment_best = np.minimum.reduceat(positions, starts) if len(starts) else positions
+
+        class_max = np.full((n_parcels, n_classes), -np.inf)
+        class_has = np.zeros((n_parcels, n_classes), dtype=bool)
+        class_best = np.full((n_parcels, n_classes), -1, dtype=np.int64)
+        segment_parcel, segment_class = pairs.parcel[starts], pair_class[starts]
+        class_max[segment_parcel, segment_class] = segment_max
+        class_has[segment_parcel, segment_class] = True
+        class_best[segment_parcel, segment_class] = segment_best
+
+        _, classes = selection.top_hbus_batch(class_max, class_has, np.arange(n_classes))
+        rows = np.arange(n_parcels)[:, np.newaxis]
+        best = np.where(classes >= 0, class_best[rows, classes], -1)
+        limiting_factors = selection.batch_limiting_factors(classes, self.catalog.limiting_factors)
+        return best, limiting_factors
+
+    def hbus(self, parcels):
+        """Select the HBUs of every parcel, tile by tile.
+
+        Returns the prototype ids, rpv_per_sf and compounded LIMITING_FACTORs of the HBUs as
+        (parcels x 3) arrays, with -1 (and NaN) where a parcel has fewer HBUs.
+        """
+        index = PairIndex(self._allowed(parcels))
+        code_index = index.code_index([parcel.code for parcel in parcels])
+        names = set(
+            name
+            for cls in self.catalog.classes
+            for name in (cls._INCOME_ATTRIBUTE, cls._PARKING_ATTRIBUTE)
+            if name is not None
+        )
+        attributes = {name: _attribute(parcels, name) for name in names}
+
+        shape = (len(parcels), selection.N_HBUS)
+        prototypes = np.full(shape, -1, dtype=np.int64)
+        rpv = np.full(shape, np.nan)
+        limiting_factors = np.full(shape, np.nan)
+        counts = index.counts[code_index]
+        capacity = max(self.tile_size, counts.max() if len(counts) else 0)
+        local = threading.local()
+
+        def run_tile(tile):
+            # Tiles write to disjoint rows of the outputs, so threads need no locking
+            start, stop = tile
+            if not hasattr(local, 'workspace'):
+                local.workspace = Workspace(capacity)
+            pairs = index.pairs(code_index[start:stop])
+            values = self.evaluate(
+                pairs,
+                {name: values[start:stop] for name, values in attributes.items()},
+                local.workspace,
+            )
+            best, tile_limiting_factors = self.select(pairs, values, stop - start)
+            k = best.shape[1]
+            found = best >= 0
+            # Only index the found entries: a tile may have no allowed pairs at all
+            prototypes[start:stop, :k][found] = pairs.prototype[best[found]]
+            rpv[start:stop, :k][found] = values[best[found]]
+            limiting_factors[start:stop, :k] = tile_limiting_factors
+
+        if self.threads > 1:
+            with ThreadPoolExecutor(self.threads) as executor:
+                # list() re-raises the first exception of any tile
+                list(executor.map(run_tile, tiles(counts, self.tile_size)))
+        else:
+            for tile in tiles(counts, self.tile_size):
+                run_tile(tile)
+        return prototypes, rpv, limiting_factors
+
+    def run(self, parcels, n_iterations):
+        """Run the model, returning the same DataFrame as ModelRun.to_df()."""
+        return self.run_compact(parcels, n_iterations).to_df()
+
+    def run_compact(self, parcels, n_iterations, precision='float64'):
+        """Run the model, returning CompactResults."""
+        prototypes, rpv, limiting_factors = self.hbus(parcels)
+        parcel_index, hbu_index = np.nonzero(prototypes >= 0)
+        prototype = prototypes[parcel_index, hbu_index]
+
+        recurrence = Recurrence(
+            self,
+            parcels,
+            parcel_index,
+            prototype,
+            rpv[parcel_index, hbu_index],
+            limiting_factors[parcel_index, hbu_index],
+        )
+        frames = list(recurrence.run(n_iterations))
+
+        # Rows in ModelRun order: parcel, iteration, HBU
+        parcel_rows = np.tile(parcel_index, n_iterations)
+        iterations = np.repeat(np.arange(1, n_iterations + 1), len(parcel_index))
+        hbus = np.tile(hbu_index + 1, n_iterations)
+        order = np.lexsort((hbus, iterations, parcel_rows))
+        values = OrderedDict()
+        for name in results.VALUES:
+            if name in recurrence.constants:
+                column = np.tile(recurrence.constants[name], n_iterations)
+            else:
+                column = np.concatenate([columns[name] for columns in frames])
+            values[name] = column[order]
+
+        return results.CompactResults(
+            parcel_rows[order],
+            iterations[order],
+            hbus[order],
+            np.tile(prototype, n_iterations)[order],
+            values,
+            results.parcel_dimension(parcels),
+            results.prototype_dimension(self.catalog),
+            precision,
+        )
+
+
+class Recurrence:
+    """Iteration recurrence of the HBUs of a batch of parcels.
+
+    Each iteration adds the HBUs' yields to the parcels' sf and units, which changes rmv_per_sf and
+    so the conversion rate bucket. The HBUs themselves do not change, since rpv_per_sf depends on
+    neither sf nor units: everything else (ratio denominators, rate rows, maximum sf and units) is
+    computed once, and each step is a handful of array operations over all HBUs of the batch.
+    """
+
+    # Output columns that are the same in every iteration
+    CONSTANTS = ('max_sf', 'max_units')
+
+    def __init__(self, engine, parcels, parcel_index, prototype, rpv, limiting_factor):
+        """init.
+
+        `parcel_index`, `prototype`, `rpv` and `limiting_factor` describe every HBU (in order of
+        parcel, then selection).
+        """
+        region_index = pd.Index(engine.regions).get_indexer(
+            [parcel.conversion_rate_region for parcel in parcels]
+        )
+        if (region_index < 0).any():
+            raise ValueError('Conversion rate regions missing from the conversion rates.')
+
+        self.n_parcels = len(parcels)
+        self.parcel_index = parcel_index
+        self.limiting_factor = limiting_factor
+        self.cutoffs = engine.cutoffs
+        self.sf = _attribute(parcels, 'sf')
+        self.units = _attribute(parcels, 'units')
+        self.rmv = _attribute(parcels, 'rmv')[parcel_index]
+        self.valid = rpv > 0
+        self.rpv = np.where(self.valid, rpv, 1)
+        self.rates = engine.rates[region_index[parcel_index]]
+        self.residential = engine.residential[engine.catalog.class_index[prototype]]
+
+        net_no_row = _attribute(parcels, 'net_no_row')[parcel_index]
+        self.constants = OrderedDict([
+            ('max_sf', np.where(self.residential, 0.0, engine.far[prototype] * net_no_row)),
+            ('max_units', np.where(
+                self.residential, engine.density[prototype] / 43560 * net_no_row, 0.0
+            )),
+        ])
+
+    def step(self, sf, units):
+        """Redevelopment rates and yields of the HBUs, given the parcels' current sf and units."""
+        sf, units = sf[self.parcel_index], units[self.parcel_index]
+        rmv_per_sf = self.rmv / sf
+
+        ratio = np.where(self.valid, rmv_per_sf / self.rpv, np.nan)
+        bucket = np.searchsorted(self.cutoffs, ratio, side='right')
+        if (self.valid & (bucket >= len(self.cutoffs))).any():
+            raise ValueError('Some RMV to RPV ratios fall outside the conversion rate cut-offs.')
+        rate = self.rates[np.arange(len(bucket)), np.minimum(bucket, len(self.cutoffs) - 1)]
+        redevelopment_rate = np.where(self.valid, rate, 0.0)
+        net_redev_rate = redevelopment_rate * self.limiting_factor
+
+        max_sf, max_units = self.constants['max_sf'], self.constants['max_units']
+        return OrderedDict([
+            ('n_sf', np.where(
+                self.residential, 0.0, max_sf * net_redev_rate - sf * redevelopment_rate
+            )),
+            ('n_units', np.where(
+                self.residential, max_units * net_redev_rate - units * redevelopment_rate, 0.0
+            )),
+            ('n_sf_start', sf),
+            ('n_units_start', units),
+            ('redevelopment_rate', redevelopment_rate),
+            ('net_redev_rate', net_redev_rate),
+        ])
+
+    def run(self, n_iterations):
+        """Yield the step columns of every iteration."""
+        sf, units = self.sf, self.units
+        for _ in range(n_iterations):
+            columns = self.step(sf, units)
+            yield columns
+            # bincount adds each parcel's HBU yields in order, like the sum in ParcelIteration
+            sf = sf + np.bincount(self.parcel_index, columns['n_sf'], self.n_parcels)
+            units = units + np.bincount(self.parcel_index, columns['n_units'], self.n_parcels)
+
+
+def _attribute(parcels, name):
+    """Float array of a parcel attribute."""
+    return np.array([getattr(parcel, name) for parcel in parcels], dtype=float)
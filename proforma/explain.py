@@ -0,0 +1,100 @@
+"""Explain traces: the full pro forma chain of every allowed prototype for selected parcels.
+
+A trace has one row per iteration and allowed prototype, with the parcel inputs the prototype reads,
+every intermediate value of its pro forma (see the cached properties of the prototype classes), the
+conversion rate bucket and the limiting factor. Its status tells how the model used it:
+
+* hbu: selected as high and best use number `hbu` (with its compounded LIMITING_FACTOR)
+* evaluated: evaluated but not selected
+* pruned: dropped before evaluation, since a sibling beats it for the whole chunk (first iteration)
+* skipped: not evaluated, since only the HBUs are refit in later iterations
+
+Values of HBUs and evaluated prototypes are read from the objects the model used; the others are
+evaluated for the trace only, on copies.
+"""
+from collections import OrderedDict
+from copy import deepcopy
+
+import pandas as pd
+
+from .prototypes import cached_property
+
+
+def properties(cls):
+    """Names of the cached properties of a prototype class, pro forma first and yields last."""
+    names = []
+    for klass in cls.__mro__:
+        for name, value in vars(klass).items():
+            if isinstance(value, cached_property) and name not in names:
+                names.append(name)
+    return names
+
+
+def _row(run, iteration_number, parcel, prototype, status, hbu_number, conversion_rates):
+    """Trace row of one prototype fit to a parcel."""
+    row = OrderedDict([
+        ('reference', run.reference),
+        ('iteration', iteration_number),
+        ('prototype', prototype.name),
+        ('prototype_class', type(prototype).__name__),
+        ('status', status),
+        ('hbu', hbu_number),
+        ('rmv_per_sf', parcel.rmv_per_sf),
+    ])
+    for kind, name in (
+        ('income', prototype._INCOME_ATTRIBUTE), ('parking', prototype._PARKING_ATTRIBUTE)
+    ):
+        row[kind + '_attribute'] = name
+        row[kind] = None if name is None else getattr(parcel, name)
+    for name in properties(type(prototype)):
+        row[name] = getattr(prototype, name)
+    ratio = prototype.rmv_rpv_ratio
+    row['ratio_bucket'] = None if ratio is None else conversion_rates._ratio_to_column(ratio)
+    row['LIMITING_FACTOR'] = prototype.LIMITING_FACTOR
+    return row
+
+
+def trace(run, allowed, conversion_rates):
+    """Trace a ParcelRun over the prototypes allowed for its parcel (before pruning).
+
+    Returns a DataFrame with one row per iteration and allowed prototype, in the order of `allowed`.
+    """
+    rows = []
+    for iteration_number, iteration in enumerate(run.iterations, start=1):
+        hbus = {hbu.name: (number, hbu) for number, hbu in enumerate(iteration.hbus, start=1)}
+        evaluated = {p.name: p for p in iteration.prototypes}
+        for prototype in allowed:
+            hbu_number = None
+            if prototype.name in hbus:
+                hbu_number, fitted = hbus[prototype.name]
+                status = 'hbu'
+            elif prototype.name in evaluated:
+                fitted, status = evaluated[prototype.name], 'evaluated'
+            else:
+                fitted = deepcopy(prototype)
+                fitted.fit(iteration.parcel, conversion_rates)
+                status = 'pruned' if iteration_number == 1 else 'skipped'
+            rows.append(_row(
+                run, iteration_number, iteration.parcel, fitted, status, hbu_number,
+                conversion_rates,
+            ))
+    return pd.DataFrame(rows, columns=_union(row.keys() for row in rows))
+
+
+def _union(column_lists):
+    """Columns of several tables, in order of first appearance."""
+    columns = []
+    for names in column_lists:
+        for name in names:
+            if name not in columns:
+                columns.append(name)
+    return columns
+
+
+def combine(traces):
+    """Concatenate traces, keeping the columns of all prototype classes in their trace order."""
+    traces = list(traces)
+    if not traces:
+        return pd.DataFrame(columns=['reference', 'iteration', 'prototype'])
+    columns = _union(df.columns for df in traces)
+    return pd.concat([df.reindex(columns=columns) for df in traces], ignore_index=True)
@@ -1,4 +1,5 @@
 """Parcel operations."""
+import inspect
 
 
 class Parcel:
@@ -70,3 +71,20 @@ class Parcel:
     def rmv_per_sf(self):
         """Real market value per square foot."""
         return self.rmv / self.sf
+
+
+# Parcel constructor arguments, in order
+FIELDS = tuple(inspect.signature(Parcel).parameters)
+
+
+def from_df(df):
+    """Build Parcel objects from a DataFrame with one column per parcel field.
+
+    Values are taken column by column (keeping each column's type, e.g., bool for sfr_infill)
+    rather than row by row.
+    """
+    missing = [field for field in FIELDS if field not in df.columns]
+    if missing:
+        raise ValueError('Parcel columns missing: {0}'.format(', '.join(missing)))
+    columns = [df[field].tolist() for field in FIELDS]
+    return [Parcel(*values) for values in zip(*columns)]
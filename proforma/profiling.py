@@ -0,0 +1,112 @@
+"""Stage timing and memory instrumentation."""
+from collections import OrderedDict
+from contextlib import contextmanager
+import json
+import os
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # pragma: no cover (Windows)
+    resource = None
+
+
+def peak_rss():
+    """Peak resident set size in bytes of this process and its children (None if unavailable).
+
+    This is the high-water mark since the process started: it never drops.
+    """
+    if resource is None:
+        return None
+
+    # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return scale * max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+
+
+def cpu_time():
+    """CPU seconds used by this process and its terminated children (e.g., pool workers)."""
+    if resource is None:
+        return time.process_time()
+
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time() + children.ru_utime + children.ru_stime
+
+
+class StageRecorder:
+    """Record wall time, CPU time, peak RSS and item counts for named stages of a model run.
+
+    A stage's 'peak_rss' is the process peak so far, which includes every earlier stage;
+    'peak_rss_increase' is how much the stage itself raised it.
+    """
+
+    def __init__(self):
+        """init."""
+        self.stages = OrderedDict()
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block as stage `name`.
+
+        Yields the stage record; set its 'items' key to record how many items the stage handled.
+        """
+        record = {'items': None}
+        start_wall = time.perf_counter()
+        start_cpu = cpu_time()
+        start_peak = peak_rss()
+        try:
+            yield record
+        finally:
+            peak = peak_rss()
+            record.update({
+                'seconds': time.perf_counter() - start_wall,
+                'cpu_seconds': cpu_time() - start_cpu,
+                'peak_rss': peak,
+                'peak_rss_increase': None if peak is None else peak - start_peak,
+            })
+            self.stages[name] = record
+
+    @property
+    def seconds(self):
+        """Total wall time across all recorded stages."""
+        return sum(stage['seconds'] for stage in self.stages.values())
+
+    def report(self):
+        """Summarize the recorded stages as a JSON-serializable dict."""
+        return {
+            'pid': os.getpid(),
+            'stages': [{'name': name, **stage} for name, stage in self.stages.items()],
+            'seconds': self.seconds,
+            'cpu_seconds': sum(stage['cpu_seconds'] for stage in self.stages.values()),
+            'peak_rss': peak_rss(),
+        }
+
+    def save(self, filename):
+        """Write the report to a JSON file."""
+        with open(filename, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+    def to_string(self):
+        """Format the recorded stages as a table."""
+        lines = [
+            'Stage\tseconds\tcpu seconds\tprocess peak RSS so far (MB)\tpeak increase (MB)\titems'
+        ]
+        for name, stage in self.stages.items():
+            lines.append('{0}\t{1:.3f}\t{2:.3f}\t{3}\t{4}\t{5}'.format(
+                name,
+                stage['seconds'],
+                stage['cpu_seconds'],
+                _megabytes(stage['peak_rss']),
+                _megabytes(stage['peak_rss_increase']),
+                '-' if stage['items'] is None else stage['items'],
+            ))
+        return '\n'.join(lines)
+
+
+def _megabytes(n_bytes):
+    """Format a byte count in MB ('-' if unavailable)."""
+    return '-' if n_bytes is None else '{0:.1f}'.format(n_bytes / 2 ** 20)
@@ -7,12 +7,40 @@ import numpy as np
 logger = logging.getLogger(__name__)
 
 
+class cached_property:  # noqa: N801
+    """Property computed at most once per fitted state of a prototype.
+
+    Values are stored in the instance's _cache dict, which _SharedPrototype invalidates whenever
+    an input attribute changes (e.g., on fit).
+    """
+
+    def __init__(self, func):
+        """init."""
+        self.func = func
+        self.name = func.__name__
+        self.__doc__ = func.__doc__
+
+    def __get__(self, instance, owner):
+        """Return the cached value, computing it if needed."""
+        if instance is None:
+            return self
+
+        cache = instance.__dict__.setdefault('_cache', {})
+        try:
+            return cache[self.name]
+        except KeyError:
+            value = cache[self.name] = self.func(instance)
+            return value
+
+
 class _SharedPrototype:
     """Shared base class."""
 
     _INCOME_ATTRIBUTE = None
     _PARKING_ATTRIBUTE = None
     LIMITING_FACTOR = None
+    # Cached properties that depend on LIMITING_FACTOR
+    _LIMITING_FACTOR_DEPENDENTS = ('net_redev_rate', 'n_sf', 'n_units')
 
     def __init__(self, *args, **kwargs):
         """init."""
@@ -27,7 +55,20 @@ class _SharedPrototype:
     def __str__(self):
         return '{0}: {1}'.format(self.__class__.__name__, self.name)
 
-    @property
+    def __setattr__(self, name, value):
+        """Invalidate cached properties when an input attribute changes."""
+        super().__setattr__(name, value)
+        cache = self.__dict__.get('_cache')
+        if not cache:
+            return
+
+        if name == 'LIMITING_FACTOR':
+            for key in self._LIMITING_FACTOR_DEPENDENTS:
+                cache.pop(key, None)
+        elif not name.startswith('_'):
+            cache.clear()
+
+    @cached_property
     def rmv_rpv_ratio(self):
         """Real market value to residual property value ratio."""
         rmv = self.parcel.rmv_per_sf
@@ -37,7 +78,7 @@ class _SharedPrototype:
             return None
         return rmv / rpv
 
-    @property
+    @cached_property
     def redevelopment_rate(self):
         """Redevelopment rate."""
         ratio = self.rmv_rpv_ratio
@@ -46,12 +87,12 @@ class _SharedPrototype:
 
         return self.conversion_rates.get(self.parcel.conversion_rate_region, ratio)
 
-    @property
+    @cached_property
     def net_redev_rate(self):
         """Redevelopment rate, adjusted for limiting factor."""
         return self.redevelopment_rate * self.LIMITING_FACTOR
 
-    @property
+    @cached_property
     def max_sf(self):
         """Maximum square feet allowable on prototype."""
         if isinstance(self, (ResidentialOwnershipPrototype, ResidentialRentalPrototype)):
@@ -59,7 +100,7 @@ class _SharedPrototype:
             return 0
         return self.far * self.parcel.net_no_row
 
-    @property
+    @cached_property
     def n_sf(self):
         """Determine the number of yielded square feet."""
         if isinstance(self, (ResidentialOwnershipPrototype, ResidentialRentalPrototype)):
@@ -69,7 +110,7 @@ class _SharedPrototype:
         sf_lost = self.parcel.sf * self.redevelopment_rate
         return sf_gained - sf_lost
 
-    @property
+    @cached_property
     def max_units(self):
         """Maximum number of units allowable on prototype."""
         if not isinstance(self, (ResidentialOwnershipPrototype, ResidentialRentalPrototype)):
@@ -77,7 +118,7 @@ class _SharedPrototype:
             return 0
         return self.density / 43560 * self.parcel.net_no_row
 
-    @property
+    @cached_property
     def n_units(self):
         """Determine the number of yielded units."""
         if not isinstance(self, (ResidentialOwnershipPrototype, ResidentialRentalPrototype)):
@@ -134,7 +175,7 @@ class Prototype(_SharedPrototype):
         self.base_operating_expenses = base_operating_expenses
         self.operating_adjustment_factor = operating_adjustment_factor
         self.base_capitalization_rate = base_capitalization_rate
-        self.capitalization_adjustment_factor = capitalization_adjustment_factor,
+        self.capitalization_adjustment_factor = capitalization_adjustment_factor
         self.threshold_return_on_cost = threshold_return_on_cost
 
         super().__init__(*args, **kwargs)
@@ -160,87 +201,87 @@ class Prototype(_SharedPrototype):
         self._is_fit = True
 
     # Property Assumptions
-    @property
+    @cached_property
     def far(self):
         """Floor area ratio."""
         return self.building_sf / self.site_size
 
-    @property
+    @cached_property
     def leasable_area(self):
         """Leasable square feet."""
         return self.building_sf * self.efficiency_ratio
 
-    @property
+    @cached_property
     def parking_spaces(self):
         """Number of parking spaces."""
         parking_per_sf = self.parking_ratio_per_1000_sf / 1000
         n_spaces = self.leasable_area * parking_per_sf
         return np.floor(n_spaces)
 
-    @property
+    @cached_property
     def parking_spaces_surface(self):
         """Number of surface parking spaces."""
         pct_surface = 1 - self.pct_structured_parking
         return self.parking_spaces * pct_surface
 
-    @property
+    @cached_property
     def parking_spaces_structured(self):
         """Number of structured parking spaces."""
         return self.parking_spaces * self.pct_structured_parking
 
     # Cost Assumptions
-    @property
+    @cached_property
     def construction_cost_per_sf(self):
         """Construction cost per square foot."""
         unadjusted = self.base_construction_cost_per_sf + self.tenant_improvement_allowance
         return unadjusted * (1 + self.construction_adjustment_factor)
 
-    @property
+    @cached_property
     def structured_parking_cost_per_space(self):
         """Structured parking cost per space."""
         return self.base_parking_cost_per_space * (1 + self.parking_adjustment_factor)
 
     # Income Assumptions
-    @property
+    @cached_property
     def achievable_pricing(self):
         """Achievable Pricing."""
         return self.base_income_per_sf_per_year * (1 + self.income_adjustment_factor)
 
     # Expense Assumptions
-    @property
+    @cached_property
     def operating_expenses(self):
         """Operating expenses."""
         return self.base_operating_expenses * (1 + self.operating_adjustment_factor)
 
     # Valuation Assumptions
-    @property
+    @cached_property
     def capitalization_rate(self):
         """Capitalization rate."""
         return self.base_capitalization_rate * (1 + self.capitalization_adjustment_factor)
 
     # Cost
-    @property
+    @cached_property
     def cost_per_construct_without_parking(self):
         """Cost (excluding parking)."""
         return self.building_sf * self.construction_cost_per_sf
 
-    @property
+    @cached_property
     def parking_costs(self):
         """Cost of parking."""
         return self.parking_spaces_structured * self.structured_parking_cost_per_space
 
-    @property
+    @cached_property
     def project_cost(self):
         """Estimated project cost."""
         return self.cost_per_construct_without_parking + self.parking_costs
 
     # Income
-    @property
+    @cached_property
     def annual_base_income(self):
         """Annual base income."""
         return self.leasable_area * self.achievable_pricing
 
-    @property
+    @cached_property
     def annual_parking_income(self):
         """Annual income from parking."""
         monthly_parking_income = (
@@ -249,33 +290,33 @@ class Prototype(_SharedPrototype):
         )
         return monthly_parking_income * 12
 
-    @property
+    @cached_property
     def gross_annual_income(self):
         """Gross annual income."""
         return self.annual_base_income + self.annual_parking_income
 
-    @property
+    @cached_property
     def effective_gross_income(self):
         """Gross annual income, less vacancy and collection loss."""
         return self.gross_annual_income * (1 - self.vacancy_collection_loss)
 
-    @property
+    @cached_property
     def annual_noi(self):
         """Annual net operating income (Effective gross income, less operating expenses)."""
         return self.effective_gross_income * (1 - self.operating_expenses)
 
     # Property Valuation
-    @property
+    @cached_property
     def return_on_cost(self):
         """Return on cost."""
         return self.annual_noi / self.project_cost
 
-    @property
+    @cached_property
     def residual_property_value(self):
         """Residual property value."""
         return (self.annual_noi / self.threshold_return_on_cost) - self.project_cost
 
-    @property
+    @cached_property
     def rpv_per_sf(self):
         """Residual property value per square foot."""
         return self.residual_property_value / self.site_size
@@ -407,91 +448,91 @@ class ResidentialRentalPrototype(_SharedPrototype):
         self._is_fit = True
 
     # Property Assumptions
-    @property
+    @cached_property
     def unit_count(self):
         """Unit count."""
         count = self.site_size / 43560 * self.density
         return np.floor(count)
 
-    @property
+    @cached_property
     def building_sf(self):
         """Building square feet."""
         return self.unit_count * self.avg_unit_size / self.efficiency_ratio
 
-    @property
+    @cached_property
     def far(self):
         """Floor area ratio."""
         return self.building_sf / self.site_size
 
-    @property
+    @cached_property
     def parking_spaces(self):
         """Number of parking spaces."""
         n_spaces = self.unit_count * self.parking_ratio_per_unit
         return np.ceil(n_spaces)
 
-    @property
+    @cached_property
     def parking_spaces_surface(self):
         """Number of surface parking spaces."""
         pct_surface = 1 - self.pct_structured_parking
         return self.parking_spaces * pct_surface
 
-    @property
+    @cached_property
     def parking_spaces_structured(self):
         """Number of structured parking spaces."""
         return self.parking_spaces * self.pct_structured_parking
 
     # Cost Assumptions
-    @property
+    @cached_property
     def construction_cost_per_sf(self):
         """Construction cost per square foot."""
         return self.base_construction_cost_per_sf * (1 + self.construction_adjustment_factor)
 
-    @property
+    @cached_property
     def structured_parking_cost_per_space(self):
         """Structured parking cost per space."""
         return self.base_parking_cost_per_space * (1 + self.parking_adjustment_factor)
 
     # Income Assumptions
-    @property
+    @cached_property
     def achievable_pricing(self):
         """Achievable Pricing."""
         return self.base_income_per_sf_per_month * (1 + self.income_adjustment_factor)
 
     # Expense Assumptions
-    @property
+    @cached_property
     def operating_expenses(self):
         """Operating expenses."""
         return self.base_operating_expenses * (1 + self.operating_adjustment_factor)
 
     # Valuation Assumptions
-    @property
+    @cached_property
     def capitalization_rate(self):
         """Capitalization rate."""
         return self.base_capitalization_rate * (1 + self.capitalization_adjustment_factor)
 
     # Cost
-    @property
+    @cached_property
     def cost_per_construct_without_parking(self):
         """Cost (excluding parking)."""
         return self.building_sf * self.construction_cost_per_sf
 
-    @property
+    @cached_property
     def parking_costs(self):
         """Cost of parking."""
         return self.parking_spaces_structured * self.structured_parking_cost_per_space
 
-    @property
+    @cached_property
     def project_cost(self):
         """Estimated project cost."""
         return self.cost_per_construct_without_parking + self.parking_costs
 
     # Income
-    @property
+    @cached_property
     def annual_base_income(self):
         """Annual base income."""
         return self.building_sf * self.achievable_pricing * self.efficiency_ratio * 12
 
-    @property
+    @cached_property
     def annual_parking_income(self):
         """Annual income from parking."""
         monthly_parking_income = (
@@ -500,33 +541,33 @@ class ResidentialRentalPrototype(_SharedPrototype):
         )
         return monthly_parking_income * 12
 
-    @property
+    @cached_property
     def gross_annual_income(self):
         """Gross annual income."""
         return self.annual_base_income + self.annual_parking_income
 
-    @property
+    @cached_property
     def effective_gross_income(self):
         """Gross annual income, less vacancy and collection loss."""
         return self.gross_annual_income * (1 - self.vacancy_collection_loss)
 
-    @property
+    @cached_property
     def annual_noi(self):
         """Annual net operating income (Effective gross income, less operating expenses)."""
         return self.effective_gross_income * (1 - self.operating_expenses)
 
     # Property Valuation
-    @property
+    @cached_property
     def return_on_cost(self):
         """Return on cost."""
         return self.annual_noi / self.project_cost
 
-    @property
+    @cached_property
     def residual_property_value(self):
         """Residual property value."""
         return (self.annual_noi / self.threshold_return_on_cost) - self.project_cost
 
-    @property
+    @cached_property
     def rpv_per_sf(self):
         """Residual property value per square foot."""
         return self.residual_property_value / self.site_size
@@ -597,105 +638,105 @@ class ResidentialOwnershipPrototype(_SharedPrototype):
         self._is_fit = True
 
     # Property Assumptions
-    @property
+    @cached_property
     def unit_count(self):
         """Unit count."""
         count = self.site_size / 43560 * self.density
         return np.floor(count)
 
-    @property
+    @cached_property
     def building_sf(self):
         """Building square feet."""
         return self.unit_count * self.avg_unit_size / self.efficiency_ratio
 
-    @property
+    @cached_property
     def far(self):
         """Floor area ratio."""
         return self.building_sf / self.site_size
 
-    @property
+    @cached_property
     def parking_spaces(self):
         """Number of parking spaces."""
         n_spaces = self.unit_count * self.parking_ratio_per_unit
         return np.ceil(n_spaces)
 
-    @property
+    @cached_property
     def parking_spaces_surface(self):
         """Number of surface parking spaces."""
         pct_surface = 1 - self.pct_structured_parking
         return self.parking_spaces * pct_surface
 
-    @property
+    @cached_property
     def parking_spaces_structured(self):
         """Number of structured parking spaces."""
         return self.parking_spaces * self.pct_structured_parking
 
     # Cost Assumptions
-    @property
+    @cached_property
     def construction_cost_per_sf(self):
         """Construction cost per square foot."""
         return self.base_construction_cost_per_sf * (1 + self.construction_adjustment_factor)
 
-    @property
+    @cached_property
     def structured_parking_cost_per_space(self):
         """Structured parking cost per space."""
         return self.base_parking_cost_per_space * (1 + self.parking_adjustment_factor)
 
     # Income Assumptions
-    @property
+    @cached_property
     def achievable_pricing(self):
         """Achievable Pricing."""
         return self.base_sale_price_per_sf * (1 + self.income_adjustment_factor)
 
     # Cost
-    @property
+    @cached_property
     def cost_per_construct_without_parking(self):
         """Cost (excluding parking)."""
         return self.building_sf * self.construction_cost_per_sf
 
-    @property
+    @cached_property
     def parking_costs(self):
         """Cost of parking."""
         return self.parking_spaces_structured * self.structured_parking_cost_per_space
 
-    @property
+    @cached_property
     def project_cost(self):
         """Estimated project cost."""
         return self.cost_per_construct_without_parking + self.parking_costs
 
     # Income
-    @property
+    @cached_property
     def gross_income_units(self):
         """Gross income from units."""
         return self.building_sf * self.achievable_pricing * 0.9
 
-    @property
+    @cached_property
     def gross_income_parking(self):
         """Gross income from parking."""
         return self.parking_spaces_structured * self.parking_charges_per_space
 
-    @property
+    @cached_property
     def gross_sales_income(self):
         """Total gross income."""
         return self.gross_income_units + self.gross_income_parking
 
-    @property
+    @cached_property
     def commission(self):  # noqa: D401
         """Sales commission."""
         return self.gross_sales_income * self.sales_commission
 
-    @property
+    @cached_property
     def effective_gross_income(self):
         """Effective gross income."""
         return self.gross_sales_income - self.commission
 
     # Property Valuation
-    @property
+    @cached_property
     def return_on_cost(self):
         """Return on cost."""
         return (self.effective_gross_income - self.project_cost) / self.project_cost
 
-    @property
+    @cached_property
     def residual_property_value(self):
         """Residual property value."""
         return (
@@ -703,7 +744,7 @@ class ResidentialOwnershipPrototype(_SharedPrototype):
             - self.project_cost
         )
 
-    @property
+    @cached_property
     def rpv_per_sf(self):
         """Residual property value per square foot."""
         return self.residual_property_value / self.site_size
@@ -0,0 +1,150 @@
+"""Compact model results: integer keys and numeric columns, with attributes joined on export."""
+from collections import OrderedDict
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+
+from .run import ModelRun
+
+
+# Columns of ModelRun.to_df() taken from the parcel dimension and stored per row
+PARCEL_ATTRIBUTES = ModelRun.COLUMNS[5:13]
+VALUES = ModelRun.COLUMNS[13:]
+# Columns of ModelRun.to_df() holding a few distinct values, returned as categoricals
+PARCEL_CATEGORICAL = ('code', 'code_general', 'tract', 'ezone', 'design_type', 'jurisdiction')
+CATEGORICAL = ('prototype', 'prototype_class') + PARCEL_CATEGORICAL
+
+PRECISIONS = ('float64', 'float32')
+
+
+def parcel_dimension(parcels):
+    """Parcel dimension table: the reference and output attributes of every parcel, by index.
+
+    The PARCEL_CATEGORICAL columns are categoricals over their sorted distinct values.
+    """
+    columns = OrderedDict()
+    for name in ('reference',) + PARCEL_ATTRIBUTES:
+        values = [getattr(parcel, name) for parcel in parcels]
+        # Other columns get the dtype pandas infers for their values (tuples are kept as objects)
+        columns[name] = pd.Categorical(values) if name in PARCEL_CATEGORICAL else pd.Series(values)
+    return pd.DataFrame(columns)
+
+
+def prototype_dimension(catalog):
+    """Prototype dimension table: the name and class name of every prototype, by id.
+
+    Both are categoricals in catalog order, so a prototype's category code is its id.
+    """
+    return pd.DataFrame(OrderedDict([
+        ('prototype', pd.Categorical.from_codes(np.arange(len(catalog)), catalog.names)),
+        ('prototype_class', pd.Categorical.from_codes(catalog.class_index, catalog.class_names)),
+    ]))
+
+
+def categories(*dimensions):
+    """Map the categorical columns of dimension tables to their categories."""
+    return OrderedDict(
+        (name, column.cat.categories)
+        for dimension in dimensions
+        for name, column in dimension.items()
+        if column.dtype.name == 'category'
+    )
+
+
+def categorize(df, categories):
+    """Convert columns of a DataFrame in place to categoricals with the given categories."""
+    for name, values in categories.items():
+        column = df[name]
+        if column.dtype.name != 'category' or not column.cat.categories.equals(values):
+            df[name] = pd.Categorical(column, categories=values)
+    return df
+
+
+def align_categories(frames):
+    """Give the categorical columns of DataFrames the union of their categories, in place.
+
+    DataFrames whose categoricals differ in categories (e.g., the partial results of shards) then
+    concatenate to categoricals rather than to object columns.
+    """
+    frames = list(frames)
+    union = OrderedDict()
+    for name in CATEGORICAL:
+        columns = [df[name] for df in frames if name in df and df[name].dtype.name == 'category']
+        if columns:
+            union[name] = reduce(
+                lambda a, b: a if a.equals(b) else a.union(b),
+                (column.cat.categories for column in columns),
+            )
+    return [categorize(df, union) for df in frames]
+
+
+class CompactResults:
+    """Model results as integer keys and numeric columns.
+
+    Every row holds an int32 parcel index, int8 iteration and HBU numbers, an int16 prototype id
+    and the yields and rates (ModelRun.COLUMNS from n_sf on) as float64 or float32 (`precision`).
+    Parcel and prototype attributes are kept once, in the `parcels` and `prototypes` dimension
+    tables, and joined by to_df(), which returns the CATEGORICAL columns as categoricals.
+    """
+
+    def __init__(self, parcel, iteration, hbu, prototype, values, parcels, prototypes,
+                 precision='float64'):
+        """init.
+
+        `values` maps every name in VALUES to an array with one value per row; `parcels` and
+        `prototypes` are the dimension tables (see parcel_dimension and prototype_dimension).
+        """
+        if precision not in PRECISIONS:
+            raise ValueError('Precision must be one of {0}: {1}'.format(PRECISIONS, precision))
+        for name, dtype, limit in (
+            ('parcel', np.int32, len(parcels)),
+            ('iteration', np.int8, np.max(iteration) if len(iteration) else 0),
+            ('prototype', np.int16, len(prototypes)),
+        ):
+            if limit > np.iinfo(dtype).max:
+                raise ValueError('Too many values of {0} for {1}: {2}'.format(
+                    name, np.dtype(dtype).name, limit
+                ))
+
+        self.parcel = np.asarray(parcel, dtype=np.int32)
+        self.iteration = np.asarray(iteration, dtype=np.int8)
+        self.hbu = np.asarray(hbu, dtype=np.int8)
+        self.prototype = np.asarray(prototype, dtype=np.int16)
+        self.values = OrderedDict(
+            (name, np.asarray(values[name], dtype=precision)) for name in VALUES
+        )
+        self.parcels = parcels
+        self.prototypes = prototypes
+        self.precision = precision
+
+    def __len__(self):
+        return len(self.parcel)
+
+    @property
+    def nbytes(self):
+        """Bytes held by the rows (the dimension tables are not counted)."""
+        return sum(
+            array.nbytes
+            for array in [self.parcel, self.iteration, self.hbu, self.prototype]
+            + list(self.values.values())
+        )
+
+    def to_df(self):
+        """Join the dimension tables, returning a DataFrame like ModelRun.to_df()."""
+        data = OrderedDict()
+        data['reference'] = self.parcels['reference'].values[self.parcel]
+        data['iteration'] = self.iteration.astype(np.int64)
+        data['hbu'] = self.hbu.astype(np.int64)
+        for name in ('prototype', 'prototype_class'):
+            data[name] = self.prototypes[name].values[self.prototype]
+        for name in PARCEL_ATTRIBUTES:
+            data[name] = self.parcels[name].values[self.parcel]
+        data.update(self.values)
+
+        return (
+            pd
+            .DataFrame(data, columns=ModelRun.COLUMNS)
+            .set_index(['reference', 'iteration', 'hbu'])
+            .sort_index()
+        )
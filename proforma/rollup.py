@@ -0,0 +1,100 @@
+"""Rollup cube: model yields aggregated over every combination of the output dimensions.
+
+The cube holds one row per combination of dimension values for every grouping set (every subset of
+DIMENSIONS, as in SQL's GROUP BY CUBE), so subtotals and the grand total are rows of the cube too.
+Dimensions a row is aggregated over hold TOTAL. A parcel with no value for a dimension (e.g., no
+tract) is kept in a group of its own, with an empty value, rather than dropped.
+"""
+from collections import OrderedDict
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+
+DIMENSIONS = ('tract', 'jurisdiction', 'prototype_class', 'iteration')
+MEASURES = ('n_sf', 'n_units', 'max_sf', 'max_units')
+
+# Value of the dimensions a row of the cube is aggregated over
+TOTAL = 'All'
+
+# Dimensions that can take several values for the same parcel (the others are parcel attributes),
+# so that parcels must be counted distinct across them
+_ROW_DIMENSIONS = ('prototype_class', 'iteration')
+
+
+def grouping_sets(dimensions=DIMENSIONS):
+    """Every subset of the dimensions, from the finest grouping to the grand total."""
+    return [
+        subset
+        for size in range(len(dimensions), -1, -1)
+        for subset in combinations(dimensions, size)
+    ]
+
+
+def _factorize(values):
+    """Integer codes (-1 for missing values) and labels of a column or index level."""
+    if values.dtype.name == 'category':
+        return np.asarray(values.cat.codes), np.asarray(values.cat.categories, dtype=object)
+    codes, labels = pd.factorize(values, sort=True)
+    return codes, np.asarray(labels, dtype=object)
+
+
+def _column(df, name):
+    """A column of a model output DataFrame, or a level of its index."""
+    if name in df.columns:
+        return df[name]
+    return pd.Series(df.index.get_level_values(name))
+
+
+def cube(df, dimensions=DIMENSIONS, measures=MEASURES):
+    """Aggregate a model output DataFrame (as returned by ModelRun.to_df) into a rollup cube.
+
+    Returns a DataFrame with the dimensions, the number of distinct parcels (n_parcels) and the sum
+    of each measure, with one row per group of every grouping set.
+    """
+    labels = OrderedDict()
+    keys = OrderedDict()
+    for name in ('reference',) + tuple(dimensions):
+        keys[name], labels[name] = _factorize(_column(df, name))
+    for name in measures:
+        keys[name] = df[name].values
+    # Missing dimension values become a group of their own (groupby drops missing keys)
+    frame = pd.DataFrame(keys)
+
+    # Sums roll up from the finest grouping, which is much smaller than the rows
+    finest = list(dimensions)
+    sums = frame.groupby(finest)[list(measures)].sum().reset_index() if finest else None
+
+    # A parcel counts once per group: parcel attributes are fixed per parcel, so only the
+    # dimensions that vary within a parcel need de-duplicating
+    distinct = {}
+
+    def parcels(subset):
+        within = tuple(name for name in _ROW_DIMENSIONS if name in subset)
+        if within not in distinct:
+            distinct[within] = frame.drop_duplicates(['reference'] + list(within))
+        return distinct[within]
+
+    tables = []
+    for subset in grouping_sets(dimensions):
+        subset = list(subset)
+        if subset:
+            table = sums.groupby(subset)[list(measures)].sum()
+            table.insert(0, 'n_parcels', parcels(subset).groupby(subset).size())
+            table = table.reset_index()
+        else:
+            table = pd.DataFrame(OrderedDict(
+                [('n_parcels', [len(parcels(subset))])]
+                + [(name, [frame[name].sum()]) for name in measures]
+            ))
+        for name in dimensions:
+            if name in subset:
+                # Code -1 (missing) picks the NaN appended to the labels
+                table[name] = np.append(labels[name], np.nan)[table[name].values]
+            else:
+                table[name] = TOTAL
+        tables.append(table)
+
+    columns = list(dimensions) + ['n_parcels'] + list(measures)
+    return pd.concat(tables, ignore_index=True)[columns]
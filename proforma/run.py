@@ -1,13 +1,136 @@
 """Run classes."""
+from collections import Counter, namedtuple
 from copy import deepcopy
-from multiprocessing import Pool
+from multiprocessing import cpu_count, Pool
+import time
 
 import pandas as pd
 
+from . import counters, dominance, explain, selection
+from .catalog import PrototypeCatalog
+from .checkpoint import parcels_digest
+
+
+# Upper bound on the number of parcels per chunk (progress is reported once per chunk)
+MAX_CHUNKSIZE = 1000
+
+
+def chunked(items, size):
+    """Split a list into consecutive chunks of at most size items."""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class Progress(namedtuple('Progress', ['done', 'total', 'elapsed', 'busy', 'workers', 'resumed'])):
+    """Progress of a ModelRun, reported after every completed chunk.
+
+    `busy` is the total time workers spent running parcels, in seconds, and `resumed` the number of
+    parcels loaded from a checkpoint rather than run.
+    """
+
+    __slots__ = ()
+
+    @property
+    def rate(self):
+        """Parcels per second."""
+        return (self.done - self.resumed) / self.elapsed if self.elapsed else 0
+
+    @property
+    def eta(self):
+        """Estimated seconds remaining (None until the rate is known)."""
+        return (self.total - self.done) / self.rate if self.rate else None
+
+    @property
+    def utilization(self):
+        """Fraction of the available worker time spent running parcels."""
+        return min(1, self.busy / (self.elapsed * self.workers)) if self.elapsed else 0
+
+
+# Static inputs of the ExecutionContext a pool worker belongs to (set by the pool initializer)
+_worker_context = {}
+
+
+def _init_worker_context(screened, conversion_rates):
+    """Pool initializer: keep the static inputs of an ExecutionContext in the worker."""
+    _worker_context.update(screened=screened, conversion_rates=conversion_rates)
+
+
+def as_catalog(prototypes):
+    """Return a PrototypeCatalog or catalog (copies of) a list of prototypes."""
+    if isinstance(prototypes, PrototypeCatalog):
+        return prototypes
+    return PrototypeCatalog(prototypes)
+
+
+def screen_prototypes(prototypes, screen):
+    """Map each zone code to the prototypes that pass the entitlement screen.
+
+    `prototypes` is a PrototypeCatalog or a list of prototypes (which is cataloged first).
+    """
+    return as_catalog(prototypes).screened(screen)
+
+
+class ExecutionContext:
+    """Long-lived worker pool with the static inputs of a model run preloaded.
+
+    Pass it to successive ModelRuns (or use ExecutionContext.model_run) so that only the parcels are
+    shipped to the workers; the pool is started, and the prototypes, screen and compounded
+    conversion rates are sent, once for the lifetime of the context. Close it when done, or use it
+    as a context manager.
+    """
+
+    def __init__(self, prototypes, conversion_rates, screen, iteration_length, processes=None):
+        """init."""
+        self.prototypes = prototypes
+        self.base_conversion_rates = conversion_rates
+        self.conversion_rates = conversion_rates.compound(iteration_length)
+        self.screen = screen
+        self.catalog = as_catalog(prototypes)
+        self.screened = self.catalog.screened(screen)
+        self.iteration_length = iteration_length
+        self.processes = processes or cpu_count()
+        self.pool = Pool(
+            self.processes,
+            initializer=_init_worker_context,
+            initargs=(self.screened, self.conversion_rates),
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Shut down the worker pool."""
+        self.pool.close()
+        self.pool.join()
+
+    def model_run(self, parcels, n_iterations, **kwargs):
+        """Run the model on parcels using this context."""
+        return ModelRun(
+            parcels,
+            self.prototypes,
+            self.base_conversion_rates,
+            self.screen,
+            n_iterations,
+            self.iteration_length,
+            context=self,
+            **kwargs
+        )
+
 
 class ModelRun:
     """Model run."""
 
+    # Columns of to_df(), in order
+    COLUMNS = (
+        'reference', 'iteration', 'hbu', 'prototype', 'prototype_class', 'code', 'code_general',
+        'tract', 'ezone', 'design_type', 'vac_dev', 'sfr_infill', 'jurisdiction', 'n_sf',
+        'n_units', 'n_sf_start', 'n_units_start', 'max_sf', 'max_units', 'redevelopment_rate',
+        'net_redev_rate',
+    )
+
     def __init__(
         self,
         parcels,
@@ -16,26 +139,135 @@ class ModelRun:
         screen,
         n_iterations,
         iteration_length,
-        parallel=True
+        parallel=True,
+        count=False,
+        processes=None,
+        chunksize=None,
+        progress=None,
+        checkpoint=None,
+        context=None,
+        prune=True,
+        verify_pruning=False,
+        explain=None,
     ):
-        """init."""
+        """init.
+
+        If count is True, hot-path counters (property evaluations, ConversionRates.get calls and
+        deepcopies) are recorded for every parcel; see ModelRun.counts and ModelRun.parcel_counts.
+
+        Parcels are run in chunks of `chunksize` (defaults to a few chunks per worker, at most
+        MAX_CHUNKSIZE). If given, `progress` is called with a Progress after every chunk.
+
+        If given a Checkpoint, every completed chunk is saved to its directory and chunks completed
+        by a previous (interrupted) run with the same inputs and parameters are skipped.
+
+        If given an ExecutionContext created for the same inputs, parallel runs use its warm worker
+        pool instead of starting a new one.
+
+        `prototypes` is a PrototypeCatalog or a list of prototypes, which is cataloged without
+        modifying it (see PrototypeCatalog): prototypes are grouped by class, in order of first
+        appearance, keeping their order within a class. Ties between high and best uses follow this
+        catalog order rather than the list order. The entitlement screen is applied once per zone
+        code rather than once per parcel.
+
+        If prune is True, prototypes that cannot be a high and best use for any parcel of a chunk
+        are dropped before evaluation (see proforma.dominance); verify_pruning (for debugging) also
+        runs every parcel unpruned and raises ValueError if the high and best uses differ.
+
+        `explain` lists parcel references to record explain traces for (see ModelRun.traces); other
+        parcels run as usual.
+        """
+        if context is not None and not (
+            context.prototypes is prototypes
+            and context.base_conversion_rates is conversion_rates
+            and context.screen is screen
+            and context.iteration_length == iteration_length
+        ):
+            raise ValueError('The ExecutionContext was created for different inputs.')
+        context = context if parallel else None
+
         # Compound
-        self.conversion_rates = conversion_rates.compound(iteration_length)
+        if context is not None:
+            self.conversion_rates = context.conversion_rates
+            self.catalog = context.catalog
+            screened = context.screened
+        else:
+            self.conversion_rates = conversion_rates.compound(iteration_length)
+            self.catalog = as_catalog(prototypes)
+            screened = self.catalog.screened(screen)
+        self.count = count
+        explain = frozenset(explain or ())
+        if context is not None:
+            self.processes = context.processes
+        else:
+            self.processes = (processes or cpu_count()) if parallel else 1
+        if chunksize is None:
+            chunksize = min(MAX_CHUNKSIZE, max(1, -(-len(parcels) // (4 * self.processes))))
 
-        if parallel:
-            with Pool() as p:
-                self.runs = p.map(
-                    ParcelRun.init_parallel,
-                    [
-                        (parcel, prototypes, self.conversion_rates, screen, n_iterations)
-                        for parcel in parcels
-                    ]
-                )
+        completed = {}
+        if checkpoint is not None:
+            parameters = {
+                'n_parcels': len(parcels),
+                'parcels': parcels_digest(parcels),
+                'n_iterations': n_iterations,
+                'iteration_length': iteration_length,
+                'count': count,
+            }
+            if explain:
+                parameters['explain'] = sorted(explain)
+            chunksize = checkpoint.open(parameters, chunksize)
+            completed = {index: checkpoint.load(index) for index in checkpoint.completed()}
+
+        was_counting = counters.enabled()
+        if count:
+            counters.enable()
+
+        chunks = list(chunked(parcels, chunksize))
+        pending = [index for index in range(len(chunks)) if index not in completed]
+        tasks = (
+            (chunks[index], screened, self.conversion_rates, n_iterations, count, prune,
+             verify_pruning, explain)
+            for index in pending
+        )
+        if context is not None:
+            # The static inputs are already in the workers
+            tasks = (
+                (chunks[index], n_iterations, count, prune, verify_pruning, explain)
+                for index in pending
+            )
+            results = zip(pending, context.pool.imap(ParcelRun.run_context_chunk, tasks))
+            self.runs = self._collect(results, completed, len(parcels), progress, checkpoint)
+        elif parallel:
+            with Pool(self.processes) as p:
+                results = zip(pending, p.imap(ParcelRun.run_chunk, tasks))
+                self.runs = self._collect(results, completed, len(parcels), progress, checkpoint)
         else:
-            self.runs = [
-                ParcelRun(parcel, prototypes, self.conversion_rates, screen, n_iterations)
-                for parcel in parcels
-            ]
+            results = zip(pending, map(ParcelRun.run_chunk, tasks))
+            self.runs = self._collect(results, completed, len(parcels), progress, checkpoint)
+
+        if count and not was_counting:
+            counters.disable()
+
+    def _collect(self, results, completed, total, progress, checkpoint):
+        """Gather parcel runs from chunk results, checkpointing and reporting after each chunk.
+
+        `completed` maps the indices of chunks loaded from a checkpoint to their parcel runs.
+        """
+        start = time.perf_counter()
+        chunks = dict(completed)
+        resumed = done = sum(len(runs) for runs in completed.values())
+        busy = 0
+        for index, (runs, chunk_busy) in results:
+            if checkpoint is not None:
+                checkpoint.save(index, runs)
+            chunks[index] = runs
+            done += len(runs)
+            busy += chunk_busy
+            if progress is not None:
+                progress(Progress(
+                    done, total, time.perf_counter() - start, busy, self.processes, resumed
+                ))
+        return [run for index in sorted(chunks) for run in chunks[index]]
 
     @property
     def n_sf(self):
@@ -47,74 +279,206 @@ class ModelRun:
         """Total number of units yielded across all model runs."""
         return sum(run.n_units for run in self.runs)
 
+    @property
+    def counts(self):
+        """Hot-path counts summed across all parcel runs (requires count=True)."""
+        if not self.count:
+            raise ValueError(
+                'Counts are only recorded when the ModelRun is created with count=True.'
+            )
+        return sum((run.counts for run in self.runs), Counter())
+
+    @property
+    def parcel_counts(self):
+        """Hot-path counts per parcel as a DataFrame indexed by reference (requires count=True)."""
+        if not self.count:
+            raise ValueError(
+                'Counts are only recorded when the ModelRun is created with count=True.'
+            )
+        return (
+            pd
+            .DataFrame([{'reference': run.reference, **run.counts} for run in self.runs])
+            .set_index('reference')
+            .fillna(0)
+            .astype(int)
+        )
+
+    @property
+    def traces(self):
+        """Explain traces of the parcels listed in `explain`, as one DataFrame."""
+        return explain.combine(
+            run.trace for run in self.runs if getattr(run, 'trace', None) is not None
+        )
+
     def _df_rows(self):
         """Yield rows used by to_df()."""
         for run in self.runs:
-            for iter_num, iteration in enumerate(run.iterations, start=1):
-                for hbu_num, hbu in enumerate(iteration.hbus, start=1):
-                    yield {
-                        'reference': run.reference,
-                        'iteration': iter_num,
-                        'hbu': hbu_num,
-                        'prototype': hbu.name,
-                        'prototype_class': hbu.__class__.__name__,
-                        'code': hbu.parcel.code,
-                        'code_general': hbu.parcel.code_general,
-                        'tract': hbu.parcel.tract,
-                        'ezone': hbu.parcel.ezone,
-                        'design_type': hbu.parcel.design_type,
-                        'vac_dev': hbu.parcel.vac_dev,
-                        'sfr_infill': hbu.parcel.sfr_infill,
-                        'jurisdiction': hbu.parcel.jurisdiction,
-                        'n_sf': hbu.n_sf,
-                        'n_units': hbu.n_units,
-                        'n_sf_start': hbu.parcel.sf,
-                        'n_units_start': hbu.parcel.units,
-                        'max_sf': hbu.max_sf,
-                        'max_units': hbu.max_units,
-                        'redevelopment_rate': hbu.redevelopment_rate,
-                        'net_redev_rate': hbu.net_redev_rate,
-                    }
+            yield from run.rows()
+
+    def to_compact(self, precision='float64'):
+        """Reformat the ModelRun data into CompactResults."""
+        # Imported here since proforma.results builds on ModelRun
+        from . import results
+
+        parcel, iteration, hbu_number, prototype = [], [], [], []
+        values = {name: [] for name in results.VALUES}
+        for index, run in enumerate(self.runs):
+            hbus = [hbu for parcel_iteration in run.iterations for hbu in parcel_iteration.hbus]
+            for row, hbu in zip(run.rows(), hbus):
+                parcel.append(index)
+                iteration.append(row['iteration'])
+                hbu_number.append(row['hbu'])
+                prototype.append(hbu.id)
+                for name in results.VALUES:
+                    values[name].append(row[name])
+
+        return results.CompactResults(
+            parcel,
+            iteration,
+            hbu_number,
+            prototype,
+            values,
+            results.parcel_dimension([run._parcel for run in self.runs]),
+            results.prototype_dimension(self.catalog),
+            precision,
+        )
 
     def to_df(self):
-        """Reformat the ModelRun data into a DataFrame."""
-        return (
-            pd
-            .DataFrame(self._df_rows())
-            .set_index(['reference', 'iteration', 'hbu'])
-            .sort_index()
+        """Reformat the ModelRun data into a DataFrame.
+
+        Prototype, class and zoning columns are categoricals (see results.CATEGORICAL), with the
+        same categories whichever chunk or worker a row came from.
+        """
+        # Imported here since proforma.results builds on ModelRun
+        from . import results
+
+        df = results.categorize(
+            pd.DataFrame(list(self._df_rows()), columns=self.COLUMNS),
+            results.categories(
+                results.prototype_dimension(self.catalog),
+                results.parcel_dimension([run._parcel for run in self.runs]),
+            ),
         )
+        return df.set_index(['reference', 'iteration', 'hbu']).sort_index()
 
 
 class ParcelRun:
     """Parcel run."""
 
-    def __init__(self, parcel, prototypes, conversion_rates, screen, n_iterations):
-        """init."""
+    def __init__(self, parcel, prototypes, conversion_rates, screen, n_iterations, count=False):
+        """init.
+
+        If screen is None, `prototypes` are taken to have been screened for the parcel's zone code.
+        """
         # Keep only prototypes that pass the entitlement screen
         self._parcel = parcel
         self.reference = parcel.reference
-        allowed_prototypes = screen.loc[parcel.code].loc[lambda s: s.eq(1)].index.values
-        self.prototypes = [p for p in prototypes if p.name in allowed_prototypes]
+        if screen is None:
+            self.prototypes = list(prototypes)
+        else:
+            allowed_prototypes = screen.loc[parcel.code].loc[lambda s: s.eq(1)].index.values
+            self.prototypes = [p for p in prototypes if p.name in allowed_prototypes]
 
-        self.iterations = list(self._iterations(n_iterations, conversion_rates))
+        # Workers do not inherit the counters when processes are spawned rather than forked, and
+        # warm workers (see ExecutionContext) must not keep counting after this run
+        with counters.counting(count):
+            before = counters.snapshot() if count else None
+            self.iterations = list(self._iterations(n_iterations, conversion_rates))
+        self.counts = counters.since(before) if count else None
+        # Explain trace, set by run_chunk for the parcels to explain
+        self.trace = None
 
     @classmethod
-    def init_parallel(cls, args):
-        """Initialize when running in parallel."""
-        return cls(*args)
+    def run_chunk(cls, args):
+        """Run a chunk of parcels against prototypes screened by zone code.
+
+        Returns the list of parcel runs and the seconds spent running them.
+        """
+        parcels, screened, conversion_rates, n_iterations, count, prune, verify, references = args
+        start = time.perf_counter()
+        candidates = dominance.prune(screened, parcels) if prune else screened
+        runs = [
+            cls(parcel, candidates[parcel.code], conversion_rates, None, n_iterations, count)
+            for parcel in parcels
+        ]
+        if prune and verify:
+            for run, parcel in zip(runs, parcels):
+                unpruned = cls(parcel, screened[parcel.code], conversion_rates, None, n_iterations)
+                if run.hbu_names != unpruned.hbu_names:
+                    raise ValueError(
+                        'Pruning changed the high and best uses of parcel {0}: {1} != {2}'.format(
+                            parcel.reference, run.hbu_names, unpruned.hbu_names
+                        )
+                    )
+        if references:
+            for run, parcel in zip(runs, parcels):
+                if parcel.reference in references:
+                    run.trace = explain.trace(run, screened[parcel.code], conversion_rates)
+        return runs, time.perf_counter() - start
+
+    @classmethod
+    def run_context_chunk(cls, args):
+        """Run a chunk of parcels in an ExecutionContext worker."""
+        parcels, n_iterations, count, prune, verify, references = args
+        return cls.run_chunk((
+            parcels,
+            _worker_context['screened'],
+            _worker_context['conversion_rates'],
+            n_iterations,
+            count,
+            prune,
+            verify,
+            references,
+        ))
 
     def _iterations(self, n_iterations, conversion_rates):
         """Run the model for N iterations."""
         parcel = self._parcel
+        prototypes = self.prototypes
         for _ in range(n_iterations):
-            iteration = ParcelIteration(parcel, self.prototypes, conversion_rates)
+            iteration = ParcelIteration(parcel, prototypes, conversion_rates)
             yield iteration
+            # rpv_per_sf depends on neither sf nor units, so the HBUs stay the same and later
+            # iterations only need to refit them
+            prototypes = iteration.hbu_sources
             # Set up for next iteration
             parcel = deepcopy(parcel)
             parcel.sf += iteration.n_sf
             parcel.units += iteration.n_units
 
+    def rows(self):
+        """Yield one row per iteration and high and best use (see ModelRun.to_df)."""
+        for iter_num, iteration in enumerate(self.iterations, start=1):
+            for hbu_num, hbu in enumerate(iteration.hbus, start=1):
+                yield {
+                    'reference': self.reference,
+                    'iteration': iter_num,
+                    'hbu': hbu_num,
+                    'prototype': hbu.name,
+                    'prototype_class': hbu.__class__.__name__,
+                    'code': hbu.parcel.code,
+                    'code_general': hbu.parcel.code_general,
+                    'tract': hbu.parcel.tract,
+                    'ezone': hbu.parcel.ezone,
+                    'design_type': hbu.parcel.design_type,
+                    'vac_dev': hbu.parcel.vac_dev,
+                    'sfr_infill': hbu.parcel.sfr_infill,
+                    'jurisdiction': hbu.parcel.jurisdiction,
+                    'n_sf': hbu.n_sf,
+                    'n_units': hbu.n_units,
+                    'n_sf_start': hbu.parcel.sf,
+                    'n_units_start': hbu.parcel.units,
+                    'max_sf': hbu.max_sf,
+                    'max_units': hbu.max_units,
+                    'redevelopment_rate': hbu.redevelopment_rate,
+                    'net_redev_rate': hbu.net_redev_rate,
+                }
+
+    @property
+    def hbu_names(self):
+        """Names of the high and best uses of every iteration."""
+        return [[hbu.name for hbu in iteration.hbus] for iteration in self.iterations]
+
     @property
     def n_sf(self):
         """Return the number of square feet yielded by parcel run."""
@@ -136,32 +500,12 @@ class ParcelIteration:
         self.prototypes = deepcopy(prototypes)
         for p in self.prototypes:
             p.fit(parcel, conversion_rates)
-        self.hbus = list(self._hbus())
-
-    def _hbus(self):
-        # Three iterations
-        prototypes = self.prototypes
-        prev_limiting_factor = 1
-        for _ in range(3):
-            # import pdb; pdb.set_trace()
-            if not prototypes:
-                # If the list is empty, break
-                break
-            hbu = max(prototypes, key=lambda x: x.rpv_per_sf)
-            yield hbu
-            # Set up next iteration
-            prev_limiting_factor *= hbu.LIMITING_FACTOR
-            prototypes = [
-                self._update(p, prev_limiting_factor)
-                for p in prototypes
-                if not isinstance(p, type(hbu))
-            ]
-
-    def _update(self, prototype, limiting_factor):
-        """Update prototype with new limiting factor."""
-        prototype = deepcopy(prototype)
-        prototype.LIMITING_FACTOR *= limiting_factor
-        return prototype
+        self.hbus = selection.top_hbus(self.prototypes)
+        # The unfitted prototypes the HBUs were copied from, in their original order
+        positions = sorted(
+            next(i for i, p in enumerate(self.prototypes) if p is hbu) for hbu in self.hbus
+        )
+        self.hbu_sources = [prototypes[i] for i in positions]
 
     @property
     def n_sf(self):
@@ -0,0 +1,102 @@
+"""Selection of high and best uses: the top prototypes by rpv_per_sf, at most one per class.
+
+The best prototype overall is the first HBU, the best prototype of any other class the second, and
+so on. Ties go to the prototype that comes first in the list (for a catalog, the lowest id). Each
+HBU's LIMITING_FACTOR is compounded with those of the HBUs chosen before it (see compound).
+"""
+import numpy as np
+
+
+# Number of high and best uses per parcel iteration
+N_HBUS = 3
+
+
+def compound(limiting_factors):
+    """Compound the limiting factors of HBUs, in order of selection.
+
+    Works on scalars or (element-wise) on arrays, multiplying in the same order as the original
+    round-by-round update so that results match bit for bit.
+    """
+    compounded = []
+    previous = []
+    running = 1
+    for limiting_factor in limiting_factors:
+        for factor in previous:
+            limiting_factor = limiting_factor * factor
+        compounded.append(limiting_factor)
+        running = running * limiting_factor
+        previous.append(running)
+    return compounded
+
+
+def top_hbus(prototypes, k=N_HBUS):
+    """Select up to k HBUs from fitted prototypes, updating their LIMITING_FACTOR in place.
+
+    Only the best prototype of each class is considered, so losers are neither copied nor updated.
+    """
+    best = {}
+    for position, prototype in enumerate(prototypes):
+        cls = type(prototype)
+        if cls not in best or prototype.rpv_per_sf > best[cls][1].rpv_per_sf:
+            best[cls] = (position, prototype)
+
+    # Sorting is stable (also in reverse), so ties keep list order
+    candidates = [prototype for _, prototype in sorted(best.values(), key=lambda x: x[0])]
+    hbus = sorted(candidates, key=lambda p: p.rpv_per_sf, reverse=True)[:k]
+
+    limiting_factors = compound([hbu.LIMITING_FACTOR for hbu in hbus])
+    for hbu, limiting_factor in list(zip(hbus, limiting_factors))[1:]:
+        # The first HBU keeps its class LIMITING_FACTOR
+        hbu.LIMITING_FACTOR = limiting_factor
+    return hbus
+
+
+def top_hbus_batch(rpv_per_sf, allowed, class_starts, k=N_HBUS):
+    """Select up to k HBUs per row of an rpv_per_sf matrix.
+
+    `rpv_per_sf` and `allowed` are (parcels x prototypes) arrays with the prototypes' columns in
+    catalog order (each class a contiguous block starting at the matching `class_starts` entry).
+    Returns (ids, classes): (parcels x k) arrays of the selected prototype ids and class indices,
+    in order of selection, with -1 where a parcel has fewer than k allowed classes.
+    """
+    n_rows, n_classes = len(rpv_per_sf), len(class_starts)
+    k = min(k, n_classes)
+    rows = np.arange(n_rows)[:, np.newaxis]
+    masked = np.where(allowed, rpv_per_sf, -np.inf)
+
+    # Best prototype of each class (argmax keeps the first of ties)
+    class_max = np.maximum.reduceat(masked, class_starts, axis=1)
+    class_has = np.logical_or.reduceat(allowed, class_starts, axis=1)
+    ends = np.append(class_starts[1:], masked.shape[1])
+    class_best = np.stack([
+        start + np.argmax(masked[:, start:end], axis=1)
+        for start, end in zip(class_starts, ends)
+    ], axis=1) if n_rows else np.empty((0, n_classes), dtype=np.int64)
+
+    # Sort key: empty classes last, then by rpv_per_sf descending (ties keep class order)
+    key = np.where(class_has, -class_max, np.inf)
+    if k < n_classes:
+        top = np.argpartition(key, k - 1, axis=1)[:, :k]
+        top = top[rows, np.argsort(key[rows, top], axis=1, kind='mergesort')]
+        # Ties with the k-th class (or among the selected) need the stable full sort
+        selected = np.zeros(key.shape, dtype=bool)
+        selected[rows, top] = True
+        top_key = key[rows, top]
+        ties = (
+            ((key == top_key[:, -1:]) & ~selected).any(axis=1)
+            | (top_key[:, 1:] == top_key[:, :-1]).any(axis=1)
+        )
+        if ties.any():
+            top[ties] = np.argsort(key[ties], axis=1, kind='mergesort')[:, :k]
+    else:
+        top = np.argsort(key, axis=1, kind='mergesort')
+
+    ids = class_best[rows, top]
+    present = class_has[rows, top]
+    return np.where(present, ids, -1), np.where(present, top, -1)
+
+
+def batch_limiting_factors(classes, limiting_factors):
+    """Compounded LIMITING_FACTORs of the HBUs selected by top_hbus_batch (NaN where none)."""
+    base = np.where(classes >= 0, limiting_factors[classes], np.nan)
+    return np.stack(compound(base.T), axis=1) if base.size else base.astype(float)
@@ -0,0 +1,309 @@
+"""Long-running local model server for on-demand parcel evaluation.
+
+Inputs are loaded once; clients POST parcel records to /evaluate and receive the HBU rows (the same
+columns as ModelRun.to_df). Concurrent requests are micro-batched into a single vector engine run.
+"""
+from concurrent.futures import Future
+import http.server
+import json
+import logging
+import math
+import os
+import queue
+import socketserver
+import threading
+import time
+
+from . import results
+from .engine import VectorEngine
+from .parcels import FIELDS as PARCEL_FIELDS, Parcel
+from .validators.parcels import ParcelReader
+
+
+logger = logging.getLogger(__name__)
+
+
+class RequestError(ValueError):
+    """Invalid evaluate request (reported to the client as HTTP 400)."""
+
+
+def _to_float(value):
+    """Float of a JSON number or numeric string (not of booleans, missing values or NaN)."""
+    if value is None or isinstance(value, bool):
+        raise ValueError(value)
+    value = float(value)
+    if math.isnan(value):
+        raise ValueError(value)
+    return value
+
+
+def _to_bool(value):
+    """Boolean of a JSON boolean, 0 or 1."""
+    if value not in (True, False):
+        raise ValueError(value)
+    return bool(value)
+
+
+def _to_str(value):
+    """String of a JSON string or number."""
+    if value is None or isinstance(value, (bool, dict, list)):
+        raise ValueError(value)
+    return str(value)
+
+
+# Converters of the ParcelReader dtypes (others are read as strings)
+_CONVERTERS = {float: _to_float, bool: _to_bool}
+
+
+def coerce(fields):
+    """Convert the values of a parcel record to the ParcelReader dtypes, raising RequestError."""
+    coerced = {}
+    for name, dtype in ParcelReader.DTYPES.items():
+        value = fields[name]
+        if name == 'design_type' and value is None:
+            # As read from parcels.csv (see validators.parcels.clean_design_type)
+            value = 'None'
+        converter = _CONVERTERS.get(dtype, _to_str)
+        try:
+            coerced[name] = converter(value)
+        except (ValueError, TypeError):
+            raise RequestError('Parcel {0}: invalid {1} {2!r} (expected {3})'.format(
+                fields.get('reference'), name, value, converter.__name__[len('_to_'):]
+            ))
+    return coerced
+
+
+class ModelServer:
+    """Evaluate parcels against preloaded prototypes, screen and conversion rates.
+
+    Requests submitted from different threads within `batch_window` seconds of each other (up to
+    `max_batch` parcels) are evaluated together in one VectorEngine run. The engine is built once,
+    so the rates are compounded and the screen applied at startup rather than per batch.
+    """
+
+    def __init__(
+        self,
+        prototypes,
+        conversion_rates,
+        screen,
+        iteration_length,
+        n_iterations=1,
+        batch_window=0.005,
+        max_batch=1000,
+    ):
+        """init."""
+        self.prototypes = prototypes
+        self.conversion_rates = conversion_rates
+        self.screen = screen
+        self.iteration_length = iteration_length
+        self.n_iterations = n_iterations
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        # Batches are small, so one thread avoids starting a thread pool per batch
+        self.engine = VectorEngine(
+            prototypes, conversion_rates, screen, iteration_length, threads=1
+        )
+
+        self._queue = queue.Queue()
+        self._batcher = threading.Thread(target=self._batch_loop, daemon=True)
+        self._batcher.start()
+
+    def parse(self, request):
+        """Convert a request body into (parcels, n_iterations).
+
+        The body holds a list of parcel records under 'parcels' (or a single record under
+        'parcel'), optional 'overrides' applied to every record and an optional 'n_iterations'.
+        Record values are checked against the ParcelReader dtypes, so that a malformed record fails
+        its own request rather than the batch it would be evaluated in.
+        """
+        if not isinstance(request, dict):
+            raise RequestError('Request body must be a JSON object.')
+        records = request.get('parcels', [request['parcel']] if 'parcel' in request else None)
+        if not isinstance(records, list) or not records:
+            raise RequestError('Request must contain a non-empty "parcels" list.')
+        overrides = request.get('overrides', {})
+        n_iterations = request.get('n_iterations', self.n_iterations)
+        if not isinstance(n_iterations, int) or n_iterations < 1:
+            raise RequestError('"n_iterations" must be a positive integer.')
+
+        parcels = []
+        for record in records:
+            fields = {**record, **overrides}
+            missing = [field for field in PARCEL_FIELDS if field not in fields]
+            unknown = [field for field in fields if field not in PARCEL_FIELDS]
+            if missing or unknown:
+                raise RequestError(
+                    'Parcel {0}: missing fields {1}, unknown fields {2}'.format(
+                        fields.get('reference'), missing, unknown
+                    )
+                )
+            fields = coerce(fields)
+            if fields['code'] not in self.screen.index:
+                raise RequestError('Parcel {0}: unknown zone code {1}'.format(
+                    fields['reference'], fields['code']
+                ))
+            parcels.append(Parcel(**fields))
+        return parcels, n_iterations
+
+    def evaluate(self, parcels, n_iterations=None):
+        """Evaluate parcels (blocking), returning one list of HBU rows per parcel."""
+        future = Future()
+        self._queue.put((parcels, n_iterations or self.n_iterations, future))
+        return future.result()
+
+    def _batch_loop(self):
+        """Collect requests into batches and evaluate them."""
+        while True:
+            batch = [self._queue.get()]
+            size = len(batch[0][0])
+            deadline = time.perf_counter() + self.batch_window
+            while size < self.max_batch:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                size += len(item[0])
+
+            by_iterations = {}
+            for item in batch:
+                by_iterations.setdefault(item[1], []).append(item)
+            for n_iterations, items in by_iterations.items():
+                self._evaluate_batch(n_iterations, items)
+
+    def _evaluate_batch(self, n_iterations, items):
+        """Evaluate the parcels of several requests in one run and hand back each request's rows.
+
+        If the run fails, the requests are evaluated one by one, so that only the failing ones get
+        the error.
+        """
+        parcels = [parcel for item in items for parcel in item[0]]
+        try:
+            rows = self._rows(parcels, self.engine.run_compact(parcels, n_iterations))
+        except Exception as e:
+            if len(items) == 1:
+                logger.exception('Evaluation failed')
+                items[0][2].set_exception(e)
+                return
+            rows = None
+        if rows is None:
+            logger.warning('Batch evaluation failed; evaluating its requests one by one')
+            for item in items:
+                self._evaluate_batch(n_iterations, [item])
+            return
+
+        start = 0
+        for item_parcels, _, future in items:
+            future.set_result(rows[start:start + len(item_parcels)])
+            start += len(item_parcels)
+
+    def _rows(self, parcels, compact):
+        """HBU rows of every parcel (as ParcelRun.rows yields them) from CompactResults."""
+        rows = [[] for _ in parcels]
+        values = [compact.values[name].tolist() for name in results.VALUES]
+        for index, iteration, hbu, prototype_id, *row_values in zip(
+            compact.parcel.tolist(),
+            compact.iteration.tolist(),
+            compact.hbu.tolist(),
+            compact.prototype.tolist(),
+            *values
+        ):
+            parcel, prototype = parcels[index], self.engine.catalog[prototype_id]
+            row = {
+                'reference': parcel.reference,
+                'iteration': iteration,
+                'hbu': hbu,
+                'prototype': prototype.name,
+                'prototype_class': type(prototype).__name__,
+            }
+            row.update((name, getattr(parcel, name)) for name in results.PARCEL_ATTRIBUTES)
+            row.update(zip(results.VALUES, row_values))
+            rows[index].append(row)
+        return rows
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    """HTTP request handler (the ModelServer is attached to the server as `model`)."""
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def _respond(self, status, body):
+        payload = json.dumps(body, default=_to_json).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):  # noqa: N802
+        """Health check."""
+        if self.path != '/health':
+            return self._respond(404, {'error': 'Not found'})
+        model = self.server.model
+        return self._respond(200, {
+            'status': 'ok',
+            'prototypes': len(model.prototypes),
+            'zone_codes': len(model.screen),
+        })
+
+    def do_POST(self):  # noqa: N802
+        """Evaluate parcels."""
+        if self.path != '/evaluate':
+            return self._respond(404, {'error': 'Not found'})
+        model = self.server.model
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length).decode() or 'null')
+            parcels, n_iterations = model.parse(request)
+        except (ValueError, KeyError, TypeError) as e:
+            return self._respond(400, {'error': str(e)})
+
+        try:
+            results = model.evaluate(parcels, n_iterations)
+        except Exception as e:
+            return self._respond(500, {'error': str(e)})
+        return self._respond(200, {
+            'results': [
+                {'reference': parcel.reference, 'hbus': rows}
+                for parcel, rows in zip(parcels, results)
+            ]
+        })
+
+
+def _to_json(value):
+    """Convert values json cannot serialize (e.g., NumPy scalars)."""
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError('{0!r} is not JSON serializable'.format(value))
+
+
+# Pending connections the listening socket queues (the socketserver default of 5 resets the
+# connections of concurrent clients that micro-batching is meant to serve)
+REQUEST_QUEUE_SIZE = 128
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+    request_queue_size = REQUEST_QUEUE_SIZE
+
+
+class _ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = REQUEST_QUEUE_SIZE
+
+
+def make_server(model, host='127.0.0.1', port=8000, socket_path=None):
+    """Create an HTTP server for a ModelServer on a TCP port or, if given, a Unix socket."""
+    if socket_path is not None:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = _ThreadingUnixHTTPServer(socket_path, _Handler)
+    else:
+        server = _ThreadingHTTPServer((host, port), _Handler)
+    server.model = model
+    return server
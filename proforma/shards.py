@@ -0,0 +1,107 @@
+"""Sharded execution: deterministic parcel partitioning and merging of partial results."""
+import pickle
+import zlib
+
+import pandas as pd
+
+from . import results
+
+
+def parse_shard(value):
+    """Parse a shard specification 'i/N' (1 <= i <= N) into (i, N)."""
+    try:
+        index, n_shards = (int(x) for x in value.split('/'))
+    except ValueError:
+        raise ValueError('Shard must be given as i/N, e.g. 1/4: {0}'.format(value))
+    if not 1 <= index <= n_shards:
+        raise ValueError('Shard index must be between 1 and N: {0}'.format(value))
+    return index, n_shards
+
+
+def shard_of(reference, n_shards):
+    """Shard (1 to n_shards) of a parcel reference.
+
+    Uses CRC-32 rather than hash(), which is salted per process for strings.
+    """
+    return zlib.crc32(str(reference).encode()) % n_shards + 1
+
+
+def select(parcels, index, n_shards):
+    """Keep the parcels that belong to shard `index` of `n_shards`."""
+    return [parcel for parcel in parcels if shard_of(parcel.reference, n_shards) == index]
+
+
+def summarize(df, n_parcels):
+    """Summary reducers of a result set (all of them can be merged by addition)."""
+    return {
+        'n_parcels': n_parcels,
+        'n_sf': df.n_sf.sum(),
+        'n_units': df.n_units.sum(),
+        'n_sf_by_prototype': _sum_by_prototype(df, 'n_sf'),
+        'n_units_by_prototype': _sum_by_prototype(df, 'n_units'),
+    }
+
+
+def _sum_by_prototype(df, column):
+    """Sum a column by prototype, over the prototypes present, indexed by name."""
+    sums = df.groupby('prototype')[column].sum()
+    # Categorical groups may include every category, whether present or not
+    sums = sums[sums.index.isin(df.prototype.unique())]
+    sums.index = sums.index.astype(object)
+    return sums.sort_index()
+
+
+def merge_summaries(summaries):
+    """Merge summary reducers."""
+    summaries = list(summaries)
+    merged = {
+        key: sum(summary[key] for summary in summaries)
+        for key in ('n_parcels', 'n_sf', 'n_units')
+    }
+    for key in ('n_sf_by_prototype', 'n_units_by_prototype'):
+        merged[key] = pd.concat([summary[key] for summary in summaries]).groupby(level=0).sum()
+    return merged
+
+
+def partial_filename(index, n_shards):
+    """Default file name of a partial result set."""
+    return 'shard-{0:04d}-of-{1:04d}.pkl'.format(index, n_shards)
+
+
+def write_partial(filename, df, summary, index, n_shards):
+    """Write a partial result set."""
+    with open(filename, 'wb') as f:
+        pickle.dump(
+            {'shard': (index, n_shards), 'df': df, 'summary': summary},
+            f,
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+
+
+def read_partial(filename):
+    """Read a partial result set."""
+    with open(filename, 'rb') as f:
+        return pickle.load(f)
+
+
+def merge(filenames):
+    """Merge partial result sets into the output of a single-node run.
+
+    Returns the DataFrame and the merged summary. Raises ValueError unless every shard of the same
+    partitioning is present exactly once.
+    """
+    partials = [read_partial(filename) for filename in filenames]
+    shards = sorted(tuple(partial['shard']) for partial in partials)
+    n_shards = shards[0][1] if shards else 0
+    if not shards or shards != [(i, n_shards) for i in range(1, n_shards + 1)]:
+        raise ValueError('Expected exactly one partial per shard, got: {0}'.format(
+            ', '.join('{0}/{1}'.format(*shard) for shard in shards)
+        ))
+
+    # Empty shards are skipped since their object-dtype columns would upcast the others
+    frames = results.align_categories(partial['df'] for partial in partials if len(partial['df']))
+    df = (
+        pd.concat(frames or [partials[0]['df']])
+        .sort_index()
+    )
+    return df, merge_summaries(partial['summary'] for partial in partials)
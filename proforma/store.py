@@ -0,0 +1,173 @@
+"""Result store: model output in an SQLite file indexed by reference, tract and jurisdiction.
+
+Looking up the rows of one parcel or area reads a few index pages instead of the whole output.
+"""
+from contextlib import closing
+import os
+import sqlite3
+from urllib.request import pathname2url
+
+import pandas as pd
+
+
+VERSION = 1
+TABLE = 'results'
+INDEX = ['reference', 'iteration', 'hbu']
+# Columns indexed for lookups (reference leads the primary key)
+INDEXED = ('tract', 'jurisdiction')
+
+# Rows inserted per executemany call
+BATCH_SIZE = 100000
+
+
+def _sql_type(dtype):
+    """SQLite column type of a pandas dtype."""
+    if dtype.kind == 'f':
+        return 'REAL'
+    if dtype.kind in 'iub':
+        return 'INTEGER'
+    return 'TEXT'
+
+
+def _sql_values(column):
+    """Values of a column as Python objects SQLite accepts (others, e.g. tuples, as strings)."""
+    return [
+        value if value is None or isinstance(value, (str, int, float)) else str(value)
+        for value in column.tolist()
+    ]
+
+
+def write_store(filename, df):
+    """Write a model output DataFrame (as returned by ModelRun.to_df) to a result store.
+
+    The store is written next to `filename` and then moved into place, so readers see either the
+    previous run or this one, never a partial store.
+    """
+    df = df.reset_index()
+    dtypes = [(name, dtype.name) for name, dtype in df.dtypes.items()]
+    tmp = filename + '.tmp'
+    if os.path.exists(tmp):
+        os.remove(tmp)
+
+    with closing(sqlite3.connect(tmp)) as conn:
+        # The file is moved into place only once complete, so it needs no journal
+        conn.execute('PRAGMA journal_mode = OFF')
+        conn.execute('PRAGMA synchronous = OFF')
+        with conn:
+            conn.execute('CREATE TABLE meta (key TEXT PRIMARY KEY, value)')
+            conn.execute("INSERT INTO meta VALUES ('version', ?)", (VERSION,))
+            conn.execute(
+                'CREATE TABLE columns (position INTEGER PRIMARY KEY, name TEXT, dtype TEXT)'
+            )
+            conn.executemany('INSERT INTO columns VALUES (?, ?, ?)', [
+                (position, name, dtype) for position, (name, dtype) in enumerate(dtypes)
+            ])
+            conn.execute('CREATE TABLE {0} ({1}, PRIMARY KEY ({2})) WITHOUT ROWID'.format(
+                TABLE,
+                ', '.join(
+                    '"{0}" {1}'.format(name, _sql_type(df[name].dtype)) for name, _ in dtypes
+                ),
+                ', '.join(INDEX),
+            ))
+
+            insert = 'INSERT INTO {0} VALUES ({1})'.format(TABLE, ', '.join('?' * len(dtypes)))
+            for start in range(0, len(df), BATCH_SIZE):
+                batch = df.iloc[start:start + BATCH_SIZE]
+                conn.executemany(insert, zip(*(_sql_values(batch[name]) for name, _ in dtypes)))
+
+            for name in INDEXED:
+                conn.execute('CREATE INDEX {0}_{1} ON {0} ({1})'.format(TABLE, name))
+            conn.execute('ANALYZE')
+    os.replace(tmp, filename)
+
+
+class ResultStore:
+    """Read access to a result store written by write_store.
+
+    Queries return DataFrames laid out like ModelRun.to_df (without categorical columns). Use it as
+    a context manager, or close it when done.
+    """
+
+    def __init__(self, filename):
+        """init."""
+        if not os.path.exists(filename):
+            raise ValueError('Result store not found: {0}'.format(filename))
+        self.filename = filename
+        uri = 'file:{0}?mode=ro'.format(pathname2url(os.path.abspath(filename)))
+        self.conn = sqlite3.connect(uri, uri=True)
+        try:
+            version = self.conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        except sqlite3.DatabaseError:
+            version = None
+        if version is None or version[0] != VERSION:
+            self.conn.close()
+            raise ValueError('{0} is not a result store of version {1}.'.format(filename, VERSION))
+        self.dtypes = self.conn.execute(
+            'SELECT name, dtype FROM columns ORDER BY position'
+        ).fetchall()
+
+    def close(self):
+        """Close the store."""
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM {0}'.format(TABLE)).fetchone()[0]
+
+    def _restore_dtypes(self, df):
+        """Restore integer and boolean columns, which come back as int64 (or float if empty)."""
+        for name, dtype in self.dtypes:
+            if dtype == 'bool' or dtype.startswith(('int', 'uint')):
+                df[name] = df[name].astype(dtype)
+        return df
+
+    def _query(self, where='', params=()):
+        """Rows matching a WHERE clause, as a DataFrame."""
+        df = pd.read_sql_query(
+            'SELECT * FROM {0} {1} ORDER BY {2}'.format(TABLE, where, ', '.join(INDEX)),
+            self.conn,
+            params=params,
+        )
+        return self._restore_dtypes(df).set_index(INDEX)
+
+    def chunks(self, chunksize, columns=None):
+        """Yield all rows in (reference, iteration, hbu) order, chunksize rows at a time.
+
+        Chunks are DataFrames with the index columns as ordinary columns; `columns` selects the
+        other columns (all by default). Rows are read in primary key order, so nothing is sorted.
+        """
+        if columns is None:
+            columns = [name for name, _ in self.dtypes if name not in INDEX]
+        names = INDEX + list(columns)
+        chunks = pd.read_sql_query(
+            'SELECT {0} FROM {1} ORDER BY {2}'.format(
+                ', '.join('"{0}"'.format(name) for name in names), TABLE, ', '.join(INDEX)
+            ),
+            self.conn,
+            chunksize=chunksize,
+        )
+        for chunk in chunks:
+            yield chunk
+
+    def parcel(self, reference):
+        """Rows of one parcel."""
+        return self._query('WHERE reference = ?', (reference,))
+
+    def area(self, tract=None, jurisdiction=None):
+        """Rows of the parcels in a tract, a jurisdiction, or both."""
+        conditions = [
+            ('"{0}" = ?'.format(name), value)
+            for name, value in (('tract', tract), ('jurisdiction', jurisdiction))
+            if value is not None
+        ]
+        if not conditions:
+            raise ValueError('An area needs a tract, a jurisdiction or both.')
+        return self._query(
+            'WHERE ' + ' AND '.join(condition for condition, _ in conditions),
+            [value for _, value in conditions],
+        )
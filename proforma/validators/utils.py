@@ -1,5 +1,6 @@
 """Utility module for validators."""
 import os
+import time
 
 import numpy as np
 import pandas as pd
@@ -84,13 +85,41 @@ class Reader(object):
         """Customizable post-processing of df. Defaults to no changes."""
         return df
 
-    def read(self, filename):
-        """Read data from filename."""
+    def parse(self, filename):
+        """Parse and post-process data from filename, without running the checks."""
         dtypes = self.get_dtypes()
         parser = get_parser(filename)
-        df = parser(filename, dtypes).pipe(self.postprocess)
+        return parser(filename, dtypes).pipe(self.postprocess)
 
+    def validate(self, df):
+        """Run the checks on df."""
         for check in self.get_checks():
             check(df)
 
         return df
+
+    def read(self, filename):
+        """Read data from filename."""
+        return self.validate(self.parse(filename))
+
+
+class InputErrors(Exception):
+    """Errors raised while reading several input files, keyed by file name."""
+
+    def __init__(self, errors):
+        """init."""
+        self.errors = errors
+        super().__init__('\n'.join(
+            '{0}: {1}: {2}'.format(filename, type(error).__name__, error)
+            for filename, error in sorted(errors.items())
+        ))
+
+
+def timed_read(reader, filename, validate=True):
+    """Read (or, if validate is False, only parse) filename with reader.
+
+    Returns the DataFrame and the seconds it took. Module-level so it can run in a process pool.
+    """
+    start = time.perf_counter()
+    df = reader.read(filename) if validate else reader.parse(filename)
+    return df, time.perf_counter() - start
@@ -0,0 +1,138 @@
+"""Synthetic model inputs shared by the tests."""
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from proforma import prototypes as ptypes
+from proforma.catalog import PrototypeCatalog, _fields
+from proforma.conversions import ConversionRates
+from proforma.parcels import Parcel
+
+
+CLASSES = (
+    ptypes.FlexPrototype,
+    ptypes.OfficePrototype,
+    ptypes.ResidentialOwnershipPrototype,
+    ptypes.ResidentialRentalPrototype,
+    ptypes.RetailPrototype,
+    ptypes.WDPrototype,
+)
+# Commercial classes without parking income, whose pro formas are identical given equal inputs
+UNPARKED = (ptypes.FlexPrototype, ptypes.RetailPrototype, ptypes.WDPrototype)
+RATE_COLUMNS = [column for _, column in ConversionRates.RATIO_LOOKUP]
+
+
+def _value(rng, field):
+    """Random but plausible value of a prototype constructor argument."""
+    if field == 'site_size':
+        return float(rng.choice([10000, 20000, 43560]))
+    if field == 'building_sf':
+        return rng.uniform(5000, 80000)
+    if field == 'density':
+        return rng.uniform(5, 80)
+    if field == 'avg_unit_size':
+        return rng.uniform(600, 1500)
+    if field == 'stories':
+        return float(rng.randint(1, 6))
+    if field == 'efficiency_ratio':
+        return rng.uniform(0.7, 0.95)
+    if field.startswith('parking_ratio'):
+        return rng.uniform(0.5, 3)
+    if field == 'base_parking_cost_per_space':
+        return rng.uniform(10000, 30000)
+    if field in ('base_construction_cost_per_sf', 'tenant_improvement_allowance'):
+        return rng.uniform(50, 300)
+    if field.startswith('threshold_return'):
+        return rng.uniform(0.05, 0.2)
+    return rng.uniform(0, 0.3)
+
+
+def build_inputs(n_parcels=200, seed=0, per_class=4, n_codes=5, ties=False, empty_codes=()):
+    """Build (parcels, catalog, screen, conversion rates).
+
+    With ties, every class gets a duplicate of its first prototype, the unparked classes share the
+    same assumptions, and half the parcels have equal, high unparked rents, so HBUs tie within and
+    across classes. Zone codes in `empty_codes` allow no prototype.
+    """
+    rng = random.Random(seed)
+    shared = {}
+    prototypes = []
+    for cls in CLASSES:
+        fields = [field for field in _fields(cls) if field != 'name']
+        for i in range(per_class):
+            if ties and cls in UNPARKED:
+                values = shared.setdefault(i, {field: _value(rng, field) for field in fields})
+                values = [values[field] for field in fields]
+            else:
+                values = [_value(rng, field) for field in fields]
+            prototypes.append(cls('{0}_{1}'.format(cls.__name__, i), *values))
+            if ties and i == 0:
+                prototypes.append(cls('{0}_copy'.format(cls.__name__), *values))
+    catalog = PrototypeCatalog(prototypes)
+
+    codes = ['Z{0}'.format(i) for i in range(n_codes)] + list(empty_codes)
+    screen = pd.DataFrame(
+        {
+            name: [int(code not in empty_codes and rng.random() < 0.6) for code in codes]
+            for name in catalog.names
+        },
+        index=pd.Index(codes, name='Zone Class'),
+        columns=list(catalog.names),
+    )
+
+    regions = ['A', 'B']
+    rates = pd.DataFrame(
+        {column: [rng.uniform(0, 0.02) for _ in regions] for column in RATE_COLUMNS},
+        index=pd.Index(regions, name='region'),
+        columns=RATE_COLUMNS,
+    )
+
+    parcels = []
+    for i in range(n_parcels):
+        rents = {name: rng.uniform(5, 40) for name in ('ret_rent', 'wd_rent', 'flex_rent')}
+        if ties and i % 2:
+            # High enough for the tied prototypes to be selected
+            rents = dict.fromkeys(rents, rng.uniform(60, 120))
+        parcels.append(Parcel(
+            reference='R{0:06d}'.format(i),
+            code=rng.choice(codes),
+            code_general='G',
+            tract='{0:06d}'.format(rng.randint(1, 20)),
+            ezone='E',
+            design_type='None',
+            vac_dev=rng.choice(['vac', 'dev']),
+            sfr_infill=rng.random() < 0.2,
+            jurisdiction=rng.choice(['J1', 'J2', 'J3']),
+            rmv=rng.uniform(1e4, 5e6),
+            sf=rng.uniform(500, 50000),
+            net_no_row=rng.uniform(2000, 100000),
+            units=float(rng.randint(0, 20)),
+            res_rent=rng.uniform(1, 3),
+            res_price=rng.uniform(150, 500),
+            off_mkt=rng.uniform(0, 1),
+            off_rent=rng.uniform(10, 40),
+            ret_mkt=rng.uniform(0, 1),
+            wd_mkt=rng.uniform(0, 1),
+            flex_mkt=rng.uniform(0, 1),
+            park_rent=rng.uniform(0, 150),
+            park_own=rng.uniform(0, 30000),
+            park_off=rng.uniform(0, 200),
+            conversion_rate_region=rng.choice(regions),
+            **rents
+        ))
+    return parcels, catalog, screen, ConversionRates(rates)
+
+
+@pytest.fixture
+def inputs():
+    """Factory of synthetic model inputs (see build_inputs)."""
+    return build_inputs
+
+
+@pytest.fixture(autouse=True)
+def _numpy_errors():
+    """Keep floating-point warnings quiet, as in model runs."""
+    with np.errstate(all='ignore'):
+        yield
@@ -0,0 +1,70 @@
+"""Regression comparison of benchmark results."""
+import pytest
+
+from proforma import benchmark
+
+
+def _results(model_seconds, tiny_seconds, parcels_per_second, peak_rss):
+    return {
+        'stages': {'ModelRun': model_seconds, 'read_inputs': tiny_seconds},
+        'parcels_per_second': parcels_per_second,
+        'peak_rss': peak_rss,
+    }
+
+
+def test_permutation_pvalue():
+    assert benchmark.permutation_pvalue([1, 2, 3], [4, 5, 6]) == pytest.approx(1 / 20)
+    assert benchmark.permutation_pvalue([4, 5, 6], [1, 2, 3]) == 1
+    # Two of the 20 splits are at least as extreme as the observed one
+    assert benchmark.permutation_pvalue([1, 2, 4], [3, 5, 6]) == pytest.approx(2 / 20)
+    # Estimated from random splits when there are more splits than resamples
+    pvalue = benchmark.permutation_pvalue(range(10), range(10, 20), n_resamples=1000)
+    assert pvalue < 0.01
+
+
+def test_min_pvalue():
+    assert benchmark.min_pvalue(3, 3) == pytest.approx(0.05)
+    assert benchmark.min_pvalue(5, 5) == pytest.approx(1 / 252)
+
+
+def test_compare_flags_significant_slowdowns():
+    baseline = _results(
+        [1.0, 1.01, 0.99, 1.02, 0.98], [0.001] * 5, [100, 101, 99, 100, 100], [1e9] * 5
+    )
+    # 25% slower everywhere, including a stage below the noise floor
+    current = _results(
+        [1.25, 1.26, 1.24, 1.27, 1.23], [0.00125] * 5, [80, 81, 79, 80, 80], [1e9] * 5
+    )
+    comparison = benchmark.compare(baseline, current)
+
+    assert comparison['min_pvalue'] == pytest.approx(1 / 252)
+    model_run = comparison['stages']['ModelRun']
+    assert model_run['change'] == pytest.approx(0.25)
+    assert model_run['regression'] and not model_run['negligible']
+    tiny = comparison['stages']['read_inputs']
+    assert tiny['negligible'] and not tiny['regression']
+    # Compared as seconds per parcel
+    assert comparison['parcels_per_second']['change'] == pytest.approx(0.25, rel=1e-3)
+    assert benchmark.regressions(comparison) == ['ModelRun', 'parcels_per_second']
+    assert 'negligible' in benchmark.format_comparison(comparison)
+
+
+def test_compare_ignores_small_or_insignificant_changes():
+    baseline = _results([1.0, 1.1, 0.9], [0.1] * 3, [100, 90, 110], [1e9] * 3)
+    small = _results([1.04, 1.14, 0.94], [0.1] * 3, [97, 88, 106], [1e9] * 3)
+    assert benchmark.regressions(benchmark.compare(baseline, small)) == []
+
+    # 3 against 3 repetitions cannot reach p < 0.05, however large the slowdown
+    slow = _results([2.0, 2.1, 1.9], [0.2] * 3, [50, 45, 55], [1e9] * 3)
+    comparison = benchmark.compare(baseline, slow)
+    assert comparison['min_pvalue'] >= 0.05
+    assert benchmark.regressions(comparison) == []
+
+
+def test_compare_peak_rss_as_maxima():
+    baseline = _results([1.0] * 5, [0.1] * 5, [100] * 5, [1e9, 1.1e9, 1.1e9, 1.1e9, 1.1e9])
+    current = _results([1.0] * 5, [0.1] * 5, [100] * 5, [1.3e9] * 5)
+    peak = benchmark.compare(baseline, current)['peak_rss']
+    assert peak['pvalue'] is None
+    assert (peak['baseline'], peak['current']) == (1.1e9, 1.3e9)
+    assert peak['regression']
@@ -0,0 +1,58 @@
+"""Compiled model bundles."""
+import pandas as pd
+import pytest
+
+from proforma import bundle
+from proforma.run import ModelRun
+
+
+@pytest.fixture
+def compiled(inputs, tmpdir):
+    """Inputs and the filename of a bundle compiled from them."""
+    parcels, catalog, screen, rates = inputs(n_parcels=80, seed=11, ties=True)
+    filename = str(tmpdir.join('model.bundle'))
+    bundle.write_bundle(filename, catalog, screen, rates, {'prototypes.csv': 'digest'})
+    return (parcels, catalog, screen, rates), filename
+
+
+def test_round_trip(compiled):
+    (parcels, catalog, screen, rates), filename = compiled
+    loaded = bundle.read_bundle(filename)
+    assert loaded['inputs'] == {'prototypes.csv': 'digest'}
+    assert list(loaded['prototypes'].names) == list(catalog.names)
+    pd.testing.assert_frame_equal(loaded['screen'], screen)
+
+    expected = ModelRun(parcels, catalog, rates, screen, 3, 5, parallel=False).to_df()
+    result = ModelRun(
+        parcels, loaded['prototypes'], loaded['conversion_rates'], loaded['screen'], 3, 5,
+        parallel=False,
+    ).to_df()
+    pd.testing.assert_frame_equal(result, expected, check_exact=True)
+
+
+def test_not_a_bundle(compiled, tmpdir):
+    _, filename = compiled
+    with open(filename, 'rb') as f:
+        data = f.read()
+    corrupt = str(tmpdir.join('corrupt.bundle'))
+    with open(corrupt, 'wb') as f:
+        f.write(b'X' + data[1:])
+    with pytest.raises(ValueError, match='not a DSP model bundle'):
+        bundle.read_bundle(corrupt)
+
+
+def test_version(compiled, tmpdir, monkeypatch):
+    (_, catalog, screen, rates), _ = compiled
+    filename = str(tmpdir.join('future.bundle'))
+    monkeypatch.setattr(bundle, 'VERSION', bundle.VERSION + 1)
+    bundle.write_bundle(filename, catalog, screen, rates)
+    monkeypatch.undo()
+    with pytest.raises(ValueError, match='bundle version {0}'.format(bundle.VERSION + 1)):
+        bundle.read_bundle(filename)
+
+
+def test_check_codes(compiled):
+    (parcels, _, screen, _), _ = compiled
+    bundle.check_codes(screen, parcels)
+    with pytest.raises(ValueError, match='missing from the entitlement screen: Z0'):
+        bundle.check_codes(screen.drop('Z0'), parcels)
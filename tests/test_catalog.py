@@ -0,0 +1,37 @@
+"""Prototype catalog."""
+import pandas as pd
+
+from proforma.catalog import PrototypeCatalog, _fields
+from proforma.run import ModelRun
+
+
+def _fresh(prototype):
+    """A new prototype with the same arguments."""
+    cls = type(prototype)
+    return cls(*[getattr(prototype, field) for field in _fields(cls)])
+
+
+def test_order_and_copies(inputs):
+    parcels, catalog, screen, rates = inputs(n_parcels=20, seed=13, per_class=2)
+    # The second prototype of every class, then the first ones
+    prototypes = [_fresh(p) for p in list(catalog)[1::2] + list(catalog)[::2]]
+    names = [p.name for p in prototypes]
+
+    first = PrototypeCatalog(prototypes)
+    # Grouped by class in order of first appearance, in list order within a class
+    assert list(first.names) == [
+        name for pair in zip(names[:len(names) // 2], names[len(names) // 2:]) for name in pair
+    ]
+    assert [p.id for p in first] == list(range(len(first)))
+    assert not any(p is q for p in first for q in prototypes)
+    assert not any(hasattr(p, 'id') for p in prototypes)
+
+    # Another catalog of the same prototypes leaves the first one's ids alone
+    PrototypeCatalog(prototypes[::-1])
+    assert [p.id for p in first] == list(range(len(first)))
+
+    expected = ModelRun(parcels, first, rates, screen, 2, 5, parallel=False).to_df()
+    result = ModelRun(parcels, prototypes, rates, screen, 2, 5, parallel=False).to_df()
+    pd.testing.assert_frame_equal(result, expected, check_exact=True)
+    assert [p.name for p in prototypes] == names
+    assert not any(hasattr(p, 'id') for p in prototypes)
@@ -0,0 +1,72 @@
+"""Checkpointed runs and resuming them."""
+import os
+
+import pandas as pd
+import pytest
+
+from proforma.checkpoint import Checkpoint
+from proforma.run import ModelRun
+
+
+def _run(inputs, directory, resume=False, n_iterations=2, **kwargs):
+    parcels, catalog, screen, rates = inputs
+    checkpoint = Checkpoint(str(directory), {'data': 'digest'}, resume)
+    return ModelRun(
+        parcels, catalog, rates, screen, n_iterations, 5, checkpoint=checkpoint, **kwargs
+    ).to_df()
+
+
+def _chunks(directory):
+    """Modification times of the chunk files, by name."""
+    return {
+        name: os.stat(str(directory.join(name))).st_mtime_ns
+        for name in os.listdir(str(directory))
+        if name.startswith('chunk-')
+    }
+
+
+@pytest.fixture
+def checkpointed(inputs, tmpdir):
+    """Inputs, the output of a checkpointed run in chunks of 10 parcels and its directory."""
+    model_inputs = inputs(n_parcels=45, seed=9)
+    df = _run(model_inputs, tmpdir, parallel=False, chunksize=10)
+    return model_inputs, df, tmpdir
+
+
+def test_resume_skips_completed_chunks(checkpointed):
+    model_inputs, df, directory = checkpointed
+    chunks = _chunks(directory)
+    assert sorted(chunks) == ['chunk-{0:06d}.pkl'.format(i) for i in range(5)]
+    for name in ('chunk-000001.pkl', 'chunk-000004.pkl'):
+        os.remove(str(directory.join(name)))
+        del chunks[name]
+
+    resumed = _run(model_inputs, directory, resume=True, parallel=False, chunksize=10)
+    pd.testing.assert_frame_equal(resumed, df, check_exact=True)
+    after = _chunks(directory)
+    assert len(after) == 5
+    # Chunks on disk were loaded, not rerun
+    assert all(after[name] == mtime for name, mtime in chunks.items())
+    assert not [name for name in os.listdir(str(directory)) if name.endswith('.tmp')]
+
+
+def test_resume_keeps_chunksize(checkpointed):
+    model_inputs, df, directory = checkpointed
+    os.remove(str(directory.join('chunk-000002.pkl')))
+
+    resumed = _run(model_inputs, directory, resume=True, processes=2, chunksize=7)
+    pd.testing.assert_frame_equal(resumed, df, check_exact=True)
+    assert sorted(_chunks(directory)) == ['chunk-{0:06d}.pkl'.format(i) for i in range(5)]
+
+
+def test_resume_with_changed_parameters(checkpointed):
+    model_inputs, _, directory = checkpointed
+    with pytest.raises(ValueError, match='n_iterations'):
+        _run(model_inputs, directory, resume=True, n_iterations=3, parallel=False)
+
+
+def test_no_resume_clears_chunks(checkpointed):
+    directory = checkpointed[2]
+    checkpoint = Checkpoint(str(directory), {'data': 'digest'})
+    assert checkpoint.open({}, 10) == 10
+    assert checkpoint.completed() == []
@@ -0,0 +1,16 @@
+"""Hot-path counters."""
+from proforma import counters
+from proforma.run import ExecutionContext
+
+
+def test_warm_workers_stop_counting(inputs):
+    parcels, catalog, screen, rates = inputs(n_parcels=20, seed=6)
+    with ExecutionContext(catalog, rates, screen, 5, processes=1) as context:
+        counted = context.model_run(parcels, 2, count=True)
+        assert sum(counted.counts.values())
+        assert not context.pool.apply(counters.enabled)
+        assert not counters.enabled()
+
+        uncounted = context.model_run(parcels, 2)
+        assert all(run.counts is None for run in uncounted.runs)
+        assert not context.pool.apply(counters.enabled)
@@ -0,0 +1,94 @@
+"""Chunked run-to-run diff."""
+import pandas as pd
+import pytest
+
+from proforma import diff
+from proforma.store import write_store
+
+
+ROWS = ['reference', 'iteration', 'hbu', 'prototype', 'prototype_class', 'n_sf', 'n_units']
+OLD = [
+    ('R1', 1, 0, 'ret', 'Retail', 100.0, 0),
+    ('R1', 2, 0, 'ret', 'Retail', 100.0, 0),
+    # A tie: two HBUs in one iteration
+    ('R2', 1, 0, 'off', 'Office', 200.0, 0),
+    ('R2', 1, 1, 'apt', 'Rental', 0.0, 5),
+    ('R3', 1, 0, 'ret', 'Retail', 50.0, 0),
+    ('R5', 1, 0, 'off', 'Office', 300.0, 0),
+    ('R5', 2, 0, 'off', 'Office', 300.0, 0),
+]
+NEW = [
+    ('R1', 1, 0, 'ret', 'Retail', 100.0, 0),
+    ('R1', 2, 0, 'ret', 'Retail', 100.0, 0),
+    ('R2', 1, 0, 'apt', 'Rental', 0.0, 5),
+    ('R2', 1, 1, 'apt', 'Rental', 0.0, 5),
+    ('R4', 1, 0, 'ret', 'Retail', 80.0, 0),
+    ('R4', 2, 0, 'ret', 'Retail', 80.0, 0),
+    ('R5', 1, 0, 'off', 'Office', 300.0, 0),
+    ('R5', 2, 0, 'off', 'Office', 310.0, 0),
+]
+CHANGES = [
+    ('R2', 1, 0, 'hbu,n_sf,n_units'),
+    ('R3', 1, 0, 'removed'),
+    ('R4', 1, 0, 'added'),
+    ('R4', 2, 0, 'added'),
+    ('R5', 2, 0, 'n_sf'),
+]
+
+
+def _write(directory, name, rows, kind):
+    """Write rows as an output CSV or a result store, as dsp.py does."""
+    df = pd.DataFrame(rows, columns=ROWS)
+    # Stores index parcels by area
+    df['tract'] = '000001'
+    df['jurisdiction'] = 'J1'
+    df = df.set_index(diff.KEY)
+    filename = str(directory.join('{0}.{1}'.format(name, kind)))
+    if kind == 'csv':
+        df.to_csv(filename)
+    else:
+        write_store(filename, df)
+    return filename
+
+
+@pytest.mark.parametrize('chunksize', [1, 2, 3])
+@pytest.mark.parametrize('kinds', [('csv', 'csv'), ('db', 'db'), ('csv', 'db')])
+def test_diff(tmpdir, kinds, chunksize):
+    old = _write(tmpdir, 'old', OLD, kinds[0])
+    new = _write(tmpdir, 'new', NEW, kinds[1])
+    summary = diff.DiffSummary()
+    changes = pd.concat(list(diff.diff(old, new, summary, chunksize=chunksize)))
+
+    assert list(changes.columns) == diff.change_columns()
+    assert list(changes[diff.KEY + ['change']].itertuples(index=False, name=None)) == CHANGES
+    assert changes['n_sf_delta'].tolist()[-1] == 10.0
+    assert summary.counts['parcels'] == 5
+    assert summary.counts['parcels_changed'] == 4
+    assert summary.counts['rows_removed'] == 1 and summary.counts['rows_added'] == 2
+    assert summary.counts['hbus_changed'] == 1
+    assert summary.transitions == {('off', 'apt'): 1}
+    assert summary.totals['n_sf'] == [1050.0, 970.0]
+
+
+@pytest.mark.parametrize('chunksize', [1, 2, 3])
+def test_aligned_keeps_parcels_whole(tmpdir, chunksize):
+    old = _write(tmpdir, 'old', OLD, 'csv')
+    new = _write(tmpdir, 'new', NEW, 'db')
+    seen = []
+    for left, right in diff.aligned(
+        diff.read_chunks(old, chunksize=chunksize), diff.read_chunks(new, chunksize=chunksize)
+    ):
+        references = set(left['reference']) | set(right['reference'])
+        assert not references & set(seen)
+        seen += sorted(references)
+        # Each pair holds all rows of its parcels on both sides
+        for rows, chunk in ((OLD, left), (NEW, right)):
+            assert len(chunk) == sum(row[0] in references for row in rows)
+    assert seen == ['R1', 'R2', 'R3', 'R4', 'R5']
+
+
+def test_unsorted(tmpdir):
+    old = _write(tmpdir, 'old', OLD[::-1], 'csv')
+    new = _write(tmpdir, 'new', NEW, 'csv')
+    with pytest.raises(ValueError, match='not sorted'):
+        list(diff.diff(old, new, diff.DiffSummary(), chunksize=2))
@@ -0,0 +1,53 @@
+"""Dominance pruning leaves the high and best uses unchanged."""
+import numpy as np
+import pandas as pd
+
+from proforma import dominance
+from proforma.catalog import PrototypeCatalog, _fields
+from proforma.prototypes import RetailPrototype
+from proforma.run import ModelRun
+
+
+def _retail(name, **changes):
+    values = {field: 0.1 for field in _fields(RetailPrototype) if field != 'name'}
+    values.update(
+        site_size=20000.0, building_sf=30000.0, stories=2.0, efficiency_ratio=0.9,
+        parking_ratio_per_1000_sf=0.0, base_construction_cost_per_sf=150.0,
+        tenant_improvement_allowance=20.0, threshold_return_on_cost=0.1,
+    )
+    values.update(changes)
+    return RetailPrototype(name, *[values[field] for field in _fields(RetailPrototype)[1:]])
+
+
+def test_prune_is_exact(inputs):
+    base = _retail('base')
+    # Equal to base at rent 0 (where income adjustments vanish) and better at any positive rent
+    higher = _retail('higher', income_adjustment_factor=0.3)
+    # Dearer to build but earning more: better than base and higher at high rents only
+    crossing = _retail(
+        'crossing', income_adjustment_factor=1.0, base_construction_cost_per_sf=200.0
+    )
+    dominated = _retail('dominated', base_construction_cost_per_sf=160.0)
+    catalog = PrototypeCatalog([base, higher, crossing, dominated])
+    screen = pd.DataFrame(1, index=pd.Index(['R'], name='Zone Class'), columns=catalog.names)
+
+    parcels, _, _, rates = inputs(n_parcels=41, seed=11)
+    for parcel, rent in zip(parcels, np.linspace(0, 40, len(parcels))):
+        parcel.code, parcel.ret_rent = 'R', rent
+
+    bounds = dominance.ranges(parcels, ['ret_rent'])['R']
+    corners = [dominance.corner_values(p, bounds) for p in catalog]
+    assert corners[0][0] == corners[1][0] and corners[0][1] < corners[1][1]
+    assert corners[2][0] < corners[1][0] and corners[2][1] > corners[1][1]
+    assert [p.name for p in dominance.undominated(list(catalog), bounds)] == [
+        'base', 'higher', 'crossing'
+    ]
+
+    pruned, unpruned = (
+        ModelRun(parcels, catalog, rates, screen, 2, 5, parallel=False, prune=prune).to_df()
+        for prune in (True, False)
+    )
+    pd.testing.assert_frame_equal(pruned, unpruned, check_exact=True)
+    # The tie at rent 0 goes to the first prototype, which pruning must keep
+    assert pruned.loc[(parcels[0].reference, 1, 1), 'prototype'] == 'base'
+    assert set(pruned.prototype) == {'base', 'higher', 'crossing'}
@@ -0,0 +1,49 @@
+"""The vector engine against the object model."""
+import pandas as pd
+import pytest
+
+from proforma.engine import VectorEngine
+from proforma.run import ModelRun
+
+
+def _object_run(parcels, catalog, screen, rates, n_iterations):
+    return ModelRun(parcels, catalog, rates, screen, n_iterations, 5, parallel=False).to_df()
+
+
+@pytest.mark.parametrize('prune', [True, False])
+@pytest.mark.parametrize('options', [
+    dict(n_parcels=300, seed=1, per_class=6, n_codes=8),
+    dict(n_parcels=200, seed=2, per_class=3, n_codes=3, ties=True, empty_codes=('EMPTY',)),
+    dict(n_parcels=100, seed=3, per_class=2, n_codes=20),
+])
+def test_matches_model_run(inputs, options, prune):
+    parcels, catalog, screen, rates = inputs(**options)
+    expected = _object_run(parcels, catalog, screen, rates, 3)
+    result = VectorEngine(catalog, rates, screen, 5, prune=prune).run(parcels, 3)
+    pd.testing.assert_frame_equal(result, expected, check_exact=True)
+
+
+@pytest.mark.parametrize('tile_size', [1, 7, 2 ** 16])
+def test_zone_allowing_nothing(inputs, tile_size):
+    parcels, catalog, screen, rates = inputs(n_parcels=60, seed=4, empty_codes=('EMPTY',))
+    # Parcels of the empty zone at the end make a trailing tile without pairs
+    empty = [parcel for parcel in parcels if parcel.code == 'EMPTY']
+    parcels = [parcel for parcel in parcels if parcel.code != 'EMPTY'] + empty
+    assert empty
+
+    engine = VectorEngine(catalog, rates, screen, 5, tile_size=tile_size)
+    for run_parcels in (parcels, empty):
+        expected = _object_run(run_parcels, catalog, screen, rates, 2)
+        # An empty object run has no values to infer dtypes from
+        typed = bool(len(expected))
+        pd.testing.assert_frame_equal(
+            engine.run(run_parcels, 2), expected, check_exact=True, check_dtype=typed,
+            check_index_type=typed,
+        )
+
+
+def test_threads(inputs):
+    parcels, catalog, screen, rates = inputs(n_parcels=150, seed=5)
+    expected = VectorEngine(catalog, rates, screen, 5).run(parcels, 2)
+    result = VectorEngine(catalog, rates, screen, 5, tile_size=64, threads=3).run(parcels, 2)
+    pd.testing.assert_frame_equal(result, expected, check_exact=True)
@@ -0,0 +1,61 @@
+"""Explain traces."""
+import pandas as pd
+import pytest
+
+from proforma.run import ModelRun
+
+
+@pytest.fixture
+def traced(inputs):
+    """Inputs, the references traced, and traced model runs with and without pruning."""
+    parcels, catalog, screen, rates = inputs(n_parcels=100, seed=10, per_class=6)
+    explain = [parcel.reference for parcel in parcels[::3]]
+    runs = {
+        prune: ModelRun(
+            parcels, catalog, rates, screen, 3, 5, parallel=False, prune=prune, explain=explain
+        )
+        for prune in (True, False)
+    }
+    return (parcels, catalog, screen, rates), explain, runs
+
+
+def test_hbus_match_output(traced):
+    _, explain, runs = traced
+    df = runs[True].to_df().reset_index()
+    traces = runs[True].traces
+    assert set(traces['reference']) == set(explain)
+
+    hbus = traces[traces['status'] == 'hbu'].sort_values(['reference', 'iteration', 'hbu'])
+    expected = df[df['reference'].isin(explain)]
+    assert len(hbus) == len(expected)
+    for name in ('reference', 'iteration', 'hbu', 'n_sf', 'n_units', 'max_sf', 'max_units'):
+        assert hbus[name].tolist() == expected[name].tolist(), name
+    for name in ('prototype', 'prototype_class'):
+        assert hbus[name].tolist() == expected[name].astype(object).tolist(), name
+
+
+def test_statuses(traced):
+    (parcels, catalog, screen, rates), explain, runs = traced
+    traces = runs[True].traces
+    screened = catalog.screened(screen)
+    codes = {parcel.reference: parcel.code for parcel in parcels}
+    for (reference, iteration), rows in traces.groupby(['reference', 'iteration']):
+        # Every allowed prototype, in catalog order
+        assert rows['prototype'].tolist() == [p.name for p in screened[codes[reference]]]
+        statuses = set(rows['status'])
+        if iteration == 1:
+            assert statuses <= {'hbu', 'evaluated', 'pruned'}
+        else:
+            assert statuses <= {'hbu', 'skipped'}
+    assert (traces['status'] == 'pruned').any()
+
+    # Pruned prototypes are those the unpruned run evaluates but does not select, and their
+    # values, evaluated for the trace only, match that run's
+    unpruned = runs[False].traces
+    assert not (unpruned['status'] == 'pruned').any()
+    pruned = traces['status'] == 'pruned'
+    assert (unpruned['status'][pruned] == 'evaluated').all()
+    pd.testing.assert_frame_equal(
+        traces.drop('status', axis=1), unpruned.drop('status', axis=1), check_exact=True
+    )
+    pd.testing.assert_series_equal(traces['status'][~pruned], unpruned['status'][~pruned])
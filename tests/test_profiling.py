@@ -0,0 +1,37 @@
+"""Stage instrumentation."""
+import pytest
+
+from proforma import profiling
+from proforma.profiling import StageRecorder
+
+
+def test_stage_recorder(monkeypatch):
+    peaks = iter([100, 100, 100, 300, 300, 300])
+    monkeypatch.setattr(profiling, 'peak_rss', lambda: next(peaks))
+    recorder = StageRecorder()
+    with recorder.stage('small') as stage:
+        stage['items'] = 3
+    with recorder.stage('large'):
+        pass
+    with recorder.stage('after'):
+        pass
+
+    assert list(recorder.stages) == ['small', 'large', 'after']
+    assert [stage['peak_rss'] for stage in recorder.stages.values()] == [100, 300, 300]
+    # Only the stage that raised the peak shows an increase
+    assert [stage['peak_rss_increase'] for stage in recorder.stages.values()] == [0, 200, 0]
+    assert recorder.stages['small']['items'] == 3
+    assert recorder.stages['large']['items'] is None
+    assert recorder.seconds == pytest.approx(
+        sum(stage['seconds'] for stage in recorder.stages.values())
+    )
+    assert 'peak RSS so far' in recorder.to_string().splitlines()[0]
+
+
+def test_stage_recorder_records_failed_stages():
+    recorder = StageRecorder()
+    with pytest.raises(RuntimeError):
+        with recorder.stage('failing'):
+            raise RuntimeError
+    assert recorder.stages['failing']['seconds'] >= 0
+    assert recorder.report()['stages'][0]['name'] == 'failing'
@@ -0,0 +1,57 @@
+"""Cached pro forma properties of prototypes."""
+from copy import deepcopy
+
+import pytest
+
+from proforma import explain
+from proforma.catalog import _fields
+
+from conftest import CLASSES
+
+
+def _fitted(prototype, parcel, rates):
+    prototype = deepcopy(prototype)
+    prototype.fit(parcel, rates)
+    return prototype
+
+
+def _evaluate(prototype):
+    """Values of every cached property of a fitted prototype."""
+    return {name: getattr(prototype, name) for name in explain.properties(type(prototype))}
+
+
+def test_refit_recomputes(inputs):
+    parcels, catalog, _, rates = inputs(n_parcels=2, seed=10)
+    rates = rates.compound(5)
+    for prototype in catalog:
+        fresh = _evaluate(_fitted(prototype, parcels[1], rates))
+        refitted = _fitted(prototype, parcels[0], rates)
+        first = _evaluate(refitted)
+        refitted.fit(parcels[1], rates)
+        assert _evaluate(refitted) == fresh
+        assert refitted.rpv_per_sf != first['rpv_per_sf']
+
+
+def test_limiting_factor_drops_dependents(inputs):
+    parcels, catalog, _, rates = inputs(n_parcels=1, seed=10)
+    rates = rates.compound(5)
+    for prototype in catalog:
+        fitted = _fitted(prototype, parcels[0], rates)
+        values = _evaluate(fitted)
+        fitted.LIMITING_FACTOR = fitted.LIMITING_FACTOR * 0.5
+
+        dependents = set(fitted._LIMITING_FACTOR_DEPENDENTS)
+        assert dependents == {'net_redev_rate', 'n_sf', 'n_units'}
+        assert set(fitted._cache) == set(values) - dependents
+        assert fitted.net_redev_rate == values['redevelopment_rate'] * fitted.LIMITING_FACTOR
+        assert {name: getattr(fitted, name) for name in values if name not in dependents} == {
+            name: value for name, value in values.items() if name not in dependents
+        }
+
+
+@pytest.mark.parametrize('cls', CLASSES)
+def test_constructor_stores_arguments(cls):
+    # e.g. a trailing comma once stored capitalization_adjustment_factor as a 1-tuple
+    fields = [field for field in _fields(cls) if field != 'name']
+    prototype = cls('name', *[float(i) for i in range(len(fields))])
+    assert [getattr(prototype, field) for field in fields] == [float(i) for i in range(len(fields))]
@@ -0,0 +1,100 @@
+"""Compact results."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from proforma import results
+from proforma.engine import VectorEngine
+from proforma.run import ModelRun
+
+
+@pytest.fixture
+def run(inputs):
+    """Inputs and a model run over them."""
+    parcels, catalog, screen, rates = inputs(n_parcels=80, seed=9, ties=True)
+    return (parcels, catalog, screen, rates), ModelRun(
+        parcels, catalog, rates, screen, 3, 5, parallel=False
+    )
+
+
+def _compact(n_parcels=1, iteration=1, n_prototypes=1, precision='float64'):
+    """Compact results of one row, with dimension tables of the given lengths."""
+    values = {name: [0.0] for name in results.VALUES}
+    # The limits only need the lengths of the dimension tables
+    return results.CompactResults(
+        [0], [iteration], [1], [0], values, range(n_parcels), range(n_prototypes), precision
+    )
+
+
+@pytest.mark.parametrize('name, dtype, largest', [
+    ('parcel', 'int32', dict(n_parcels=2 ** 31 - 1)),
+    ('iteration', 'int8', dict(iteration=127)),
+    ('prototype', 'int16', dict(n_prototypes=2 ** 15 - 1)),
+])
+def test_limits(name, dtype, largest):
+    _compact(**largest)
+    with pytest.raises(ValueError, match='{0} for {1}'.format(name, dtype)):
+        _compact(**{key: value + 1 for key, value in largest.items()})
+
+
+def test_precision():
+    with pytest.raises(ValueError, match='Precision'):
+        _compact(precision='float16')
+
+
+def test_round_trip(run):
+    _, run = run
+    expected = run.to_df()
+    compact = run.to_compact()
+    assert len(compact) == len(expected)
+    pd.testing.assert_frame_equal(compact.to_df(), expected, check_exact=True)
+
+    compact = run.to_compact('float32')
+    assert compact.nbytes < run.to_compact().nbytes
+    result = compact.to_df()
+    pd.testing.assert_frame_equal(
+        result.drop(list(results.VALUES), axis=1),
+        expected.drop(list(results.VALUES), axis=1),
+        check_exact=True,
+    )
+    for name in results.VALUES:
+        assert result[name].dtype == np.float32
+        # Values are rounded to float32, nothing more
+        np.testing.assert_array_equal(result[name].values, expected[name].values.astype('float32'))
+
+
+@pytest.mark.parametrize('precision', results.PRECISIONS)
+def test_engine_matches(run, precision):
+    (parcels, catalog, screen, rates), run = run
+    engine = VectorEngine(catalog, rates, screen, 5)
+    pd.testing.assert_frame_equal(
+        engine.run_compact(parcels, 3, precision).to_df(),
+        run.to_compact(precision).to_df(),
+        check_exact=True,
+    )
+
+
+def test_align_categories(run):
+    (parcels, catalog, screen, rates), run = run
+    expected = run.to_df()
+    # Partial results of parcels in different tracts, as of shards
+    tracts = sorted({parcel.tract for parcel in parcels})
+    partials = [
+        ModelRun(
+            [parcel for parcel in parcels if (parcel.tract < tracts[len(tracts) // 2]) == low],
+            catalog, rates, screen, 3, 5, parallel=False,
+        ).to_df()
+        for low in (True, False)
+    ]
+    assert not partials[0]['tract'].cat.categories.equals(partials[1]['tract'].cat.categories)
+
+    df = pd.concat(results.align_categories(partials)).sort_index()
+    for name in results.CATEGORICAL:
+        assert df[name].dtype.name == 'category', name
+        union = partials[0][name].cat.categories.union(partials[1][name].cat.categories)
+        assert df[name].cat.categories.equals(union), name
+    pd.testing.assert_frame_equal(
+        df.astype({name: object for name in results.CATEGORICAL}),
+        expected.astype({name: object for name in results.CATEGORICAL}),
+        check_exact=True,
+    )
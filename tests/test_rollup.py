@@ -0,0 +1,78 @@
+"""Rollup cube."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from proforma import rollup
+from proforma.rollup import TOTAL
+
+
+COLUMNS = ['reference', 'iteration', 'hbu', 'tract', 'jurisdiction', 'prototype_class', 'n_sf']
+ROWS = [
+    # Two HBUs in iteration 1
+    ('P1', 1, 0, 'T1', 'J1', 'Retail', 10.0),
+    ('P1', 1, 1, 'T1', 'J1', 'Office', 20.0),
+    ('P1', 2, 0, 'T1', 'J1', 'Retail', 30.0),
+    ('P2', 1, 0, 'T1', 'J2', 'Retail', 5.0),
+    ('P2', 2, 0, 'T1', 'J2', 'Retail', 5.0),
+    ('P3', 1, 0, 'T2', 'J1', 'Office', 7.0),
+    ('P3', 2, 0, 'T2', 'J1', 'Office', 7.0),
+    # No tract
+    ('P4', 1, 0, None, 'J2', 'Rental', 0.0),
+    ('P4', 2, 0, None, 'J2', 'Rental', 0.0),
+]
+# (tract, jurisdiction, prototype_class, iteration): (n_parcels, n_sf)
+EXPECTED = {
+    (TOTAL, TOTAL, TOTAL, TOTAL): (4, 84.0),
+    (TOTAL, TOTAL, 'Retail', TOTAL): (2, 50.0),
+    (TOTAL, TOTAL, 'Office', TOTAL): (2, 34.0),
+    (TOTAL, TOTAL, TOTAL, 1): (4, 42.0),
+    (TOTAL, TOTAL, TOTAL, 2): (4, 42.0),
+    (TOTAL, TOTAL, 'Retail', 1): (2, 15.0),
+    (TOTAL, TOTAL, 'Office', 1): (2, 27.0),
+    ('T1', TOTAL, TOTAL, TOTAL): (2, 70.0),
+    ('T1', TOTAL, 'Retail', TOTAL): (2, 50.0),
+    (TOTAL, 'J1', TOTAL, TOTAL): (2, 74.0),
+    (TOTAL, 'J2', TOTAL, 1): (2, 5.0),
+    ('T1', 'J1', 'Retail', 1): (1, 10.0),
+    ('T1', 'J1', 'Office', 1): (1, 20.0),
+    (None, TOTAL, TOTAL, TOTAL): (1, 0.0),
+    (None, 'J2', 'Rental', 2): (1, 0.0),
+}
+
+
+@pytest.fixture
+def cube():
+    """Cube of ROWS, with categorical attributes as in ModelRun.to_df."""
+    df = pd.DataFrame(ROWS, columns=COLUMNS).set_index(['reference', 'iteration', 'hbu'])
+    for name in ('tract', 'jurisdiction', 'prototype_class'):
+        df[name] = df[name].astype('category')
+    return rollup.cube(df, measures=('n_sf',))
+
+
+def _row(cube, key):
+    """The cube row of a combination of dimension values (None for a missing value)."""
+    selected = np.ones(len(cube), dtype=bool)
+    for name, value in zip(rollup.DIMENSIONS, key):
+        column = cube[name]
+        selected &= column.isnull().values if value is None else (column == value).values
+    assert selected.sum() == 1, key
+    return cube[selected].iloc[0]
+
+
+def test_hand_computed(cube):
+    for key, (n_parcels, n_sf) in EXPECTED.items():
+        row = _row(cube, key)
+        assert (row['n_parcels'], row['n_sf']) == (n_parcels, n_sf), key
+
+
+def test_grouping_sets(cube):
+    totals = cube[list(rollup.DIMENSIONS)] == TOTAL
+    sets = totals.apply(tuple, axis=1)
+    # Every subset of the dimensions, and each adds up to the grand total
+    assert sets.nunique() == 2 ** len(rollup.DIMENSIONS)
+    for _, group in cube.groupby(sets):
+        assert group['n_sf'].sum() == 84.0
+        assert group['n_parcels'].sum() >= 4
+    # No two rows share all dimension values
+    assert (~totals.any(axis=1)).sum() == len(ROWS)
@@ -0,0 +1,111 @@
+"""Model server request handling, without sockets."""
+import threading
+
+import pytest
+
+pytest.importorskip('engarde')
+
+from proforma import server  # noqa: E402
+from proforma.parcels import FIELDS  # noqa: E402
+from proforma.run import ModelRun  # noqa: E402
+
+
+def _record(parcel):
+    """Request record of a parcel."""
+    record = {name: getattr(parcel, name) for name in FIELDS}
+    # Parcel keeps vac_dev as a 1-tuple
+    record['vac_dev'] = parcel.vac_dev[0]
+    return record
+
+
+@pytest.fixture
+def model(inputs):
+    """Server inputs and a ModelServer over them."""
+    parcels, catalog, screen, rates = inputs(n_parcels=30, seed=12)
+    model = server.ModelServer(catalog, rates, screen, 5, n_iterations=2, batch_window=0.2)
+    return parcels, catalog, screen, rates, model
+
+
+def test_coerce():
+    record = {name: '1' for name in FIELDS}
+    record.update(sfr_infill=0, design_type=None, units=2, reference=17)
+    coerced = server.coerce(record)
+    assert coerced['rmv'] == 1.0 and coerced['units'] == 2.0
+    assert coerced['sfr_infill'] is False
+    assert coerced['design_type'] == 'None'
+    assert coerced['reference'] == '17'
+
+    for name, value in [
+        ('res_rent', 'abc'), ('res_rent', None), ('res_rent', True), ('res_rent', float('nan')),
+        ('sfr_infill', 'yes'), ('sfr_infill', 2), ('code', None), ('tract', [1]),
+    ]:
+        with pytest.raises(server.RequestError, match=name):
+            server.coerce(dict(record, **{name: value}))
+
+
+def test_parse(model):
+    parcels, _, _, _, model = model
+    records = [_record(parcel) for parcel in parcels[:3]]
+    parsed, n_iterations = model.parse({'parcels': records, 'overrides': {'off_rent': '30'}})
+    assert n_iterations == 2
+    assert [p.reference for p in parsed] == [p.reference for p in parcels[:3]]
+    assert all(p.off_rent == 30.0 for p in parsed)
+    assert model.parse({'parcel': records[0], 'n_iterations': 4})[1] == 4
+
+    # RequestErrors are ValueErrors, which the handler answers with status 400
+    assert issubclass(server.RequestError, ValueError)
+    for request in [
+        None,
+        {'parcels': []},
+        {'parcel': records[0], 'n_iterations': 0},
+        {'parcel': dict(records[0], res_rent='abc')},
+        {'parcel': dict(records[0], unknown=1)},
+        {'parcel': {name: records[0][name] for name in FIELDS if name != 'rmv'}},
+        {'parcel': dict(records[0], code='nowhere')},
+    ]:
+        with pytest.raises(server.RequestError):
+            model.parse(request)
+
+
+def test_evaluate_matches_model_run(model):
+    parcels, catalog, screen, rates, model = model
+    parsed, _ = model.parse({'parcels': [_record(parcel) for parcel in parcels]})
+    expected = ModelRun(parcels, catalog, rates, screen, 2, 5, parallel=False)
+    assert model.evaluate(parsed) == [list(run.rows()) for run in expected.runs]
+
+
+def test_failing_request_is_isolated(model):
+    parcels, _, _, _, model = model
+    calls = []
+    run_compact = model.engine.run_compact
+
+    def recorded(batch, n_iterations):
+        calls.append(len(batch))
+        return run_compact(batch, n_iterations)
+
+    model.engine.run_compact = recorded
+    requests = [[_record(parcel) for parcel in parcels[i:i + 5]] for i in range(0, 15, 5)]
+    # Valid as a record, but fails in the engine
+    requests.append([dict(_record(parcels[20]), conversion_rate_region='nowhere')])
+
+    outcomes = {}
+
+    def submit(index, records):
+        try:
+            outcomes[index] = len(model.evaluate(model.parse({'parcels': records})[0]))
+        except ValueError as e:
+            outcomes[index] = e
+
+    threads = [
+        threading.Thread(target=submit, args=(index, records))
+        for index, records in enumerate(requests)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert outcomes[0] == outcomes[1] == outcomes[2] == 5
+    assert 'Conversion rate regions' in str(outcomes[3])
+    # One batch of all requests, then each request on its own
+    assert calls[0] == 16 and sorted(calls[1:]) == [1, 5, 5, 5]
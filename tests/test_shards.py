@@ -0,0 +1,62 @@
+"""Sharded runs merged against a single-node run."""
+import pandas as pd
+import pytest
+
+from proforma import shards
+from proforma.run import ModelRun
+
+
+N_SHARDS = 3
+
+
+def _run(parcels, catalog, screen, rates):
+    return ModelRun(parcels, catalog, rates, screen, 2, 5, parallel=False).to_df()
+
+
+@pytest.fixture
+def partials(inputs, tmpdir):
+    """Single-node output and summary, and the partial files of every shard."""
+    parcels, catalog, screen, rates = inputs(n_parcels=90, seed=8)
+    df = _run(parcels, catalog, screen, rates)
+    filenames = []
+    for index in range(1, N_SHARDS + 1):
+        shard = shards.select(parcels, index, N_SHARDS)
+        shard_df = _run(shard, catalog, screen, rates)
+        filename = str(tmpdir.join(shards.partial_filename(index, N_SHARDS)))
+        shards.write_partial(
+            filename, shard_df, shards.summarize(shard_df, len(shard)), index, N_SHARDS
+        )
+        filenames.append(filename)
+    return df, shards.summarize(df, len(parcels)), filenames
+
+
+def test_shards_partition_parcels(inputs):
+    parcels = inputs(n_parcels=90, seed=8)[0]
+    selected = [shards.select(parcels, index, N_SHARDS) for index in range(1, N_SHARDS + 1)]
+    assert all(selected)
+    assert sorted(p.reference for shard in selected for p in shard) == [
+        p.reference for p in parcels
+    ]
+
+
+def test_merge_matches_single_run(partials):
+    df, summary, filenames = partials
+    merged, merged_summary = shards.merge(reversed(filenames))
+
+    pd.testing.assert_frame_equal(merged, df, check_exact=True)
+    assert merged_summary['n_parcels'] == summary['n_parcels']
+    for key in ('n_sf', 'n_units'):
+        assert merged_summary[key] == pytest.approx(summary[key])
+    for key in ('n_sf_by_prototype', 'n_units_by_prototype'):
+        pd.testing.assert_series_equal(
+            merged_summary[key], summary[key], check_names=False, check_index_type=False
+        )
+
+
+@pytest.mark.parametrize('select', [
+    lambda filenames: filenames[:-1],
+    lambda filenames: filenames + filenames[:1],
+])
+def test_merge_needs_every_shard_once(partials, select):
+    with pytest.raises(ValueError):
+        shards.merge(select(partials[2]))
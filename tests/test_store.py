@@ -0,0 +1,74 @@
+"""Result store round trip."""
+import pandas as pd
+import pytest
+
+from proforma.run import ModelRun
+from proforma.store import INDEX, ResultStore, write_store
+
+
+@pytest.fixture
+def stored(inputs, tmpdir):
+    """Model output and a result store of it."""
+    parcels, catalog, screen, rates = inputs(n_parcels=60, seed=8)
+    df = ModelRun(parcels, catalog, rates, screen, 3, 5, parallel=False).to_df()
+    filename = str(tmpdir.join('results.db'))
+    write_store(filename, df)
+    # Stores hold categories as their values and other objects (vac_dev tuples) as strings
+    expected = df.astype({
+        name: object for name, dtype in df.dtypes.items() if dtype.name == 'category'
+    })
+    expected['vac_dev'] = expected['vac_dev'].map(str)
+    with ResultStore(filename) as store:
+        yield expected, store
+
+
+def _check(result, expected):
+    pd.testing.assert_frame_equal(result, expected, check_exact=True, check_dtype=False)
+    assert result['sfr_infill'].dtype == bool
+    assert all(level.dtype.kind == 'i' for level in result.index.levels[1:])
+
+
+def test_parcel(stored):
+    expected, store = stored
+    assert len(store) == len(expected)
+    for reference in expected.index.get_level_values('reference').unique()[:10]:
+        _check(store.parcel(reference), expected.loc[[reference]])
+    assert not len(store.parcel('missing'))
+
+
+def test_area(stored):
+    expected, store = stored
+    tract, jurisdiction = expected[['tract', 'jurisdiction']].iloc[0]
+    for query, selected in [
+        (dict(tract=tract), expected['tract'] == tract),
+        (dict(jurisdiction=jurisdiction), expected['jurisdiction'] == jurisdiction),
+        (
+            dict(tract=tract, jurisdiction=jurisdiction),
+            (expected['tract'] == tract) & (expected['jurisdiction'] == jurisdiction),
+        ),
+    ]:
+        assert selected.any()
+        _check(store.area(**query), expected[selected])
+    with pytest.raises(ValueError):
+        store.area()
+
+
+@pytest.mark.parametrize('chunksize', [1, 7, 10000])
+def test_chunks(stored, chunksize):
+    expected, store = stored
+    chunks = list(store.chunks(chunksize, ['prototype', 'n_sf']))
+    assert max(len(chunk) for chunk in chunks) <= chunksize
+    result = pd.concat(chunks).set_index(INDEX)
+    pd.testing.assert_frame_equal(
+        result, expected[['prototype', 'n_sf']], check_exact=True, check_dtype=False
+    )
+
+
+def test_not_a_store(tmpdir):
+    filename = str(tmpdir.join('results.csv'))
+    with open(filename, 'w') as f:
+        f.write('reference,iteration\n')
+    with pytest.raises(ValueError, match='not a result store'):
+        ResultStore(filename)
+    with pytest.raises(ValueError, match='not found'):
+        ResultStore(str(tmpdir.join('missing.db')))